@@ -0,0 +1,86 @@
+import json
+import string
+import typing as tp
+
+import numpy as np
+
+from ..lib import operations as ops
+
+
+DEFAULT_VOCABULARY_SIZE = 50_000
+DEFAULT_ZIPF_SKEW = 1.1
+DEFAULT_DOC_LENGTH = 100
+DEFAULT_SEED = 1
+# Documents generated at once
+_CHUNK_DOCS = 1024
+# Share of words written capitalized and followed by punctuation, so that text needs normalization
+_CAPITALIZED_SHARE = 0.1
+_PUNCTUATED_SHARE = 0.1
+
+
+class Corpus:
+    """
+    Deterministic synthetic corpus: documents of words drawn from vocabulary by Zipf law (rank r has probability
+    proportional to 1 / r ** skew). Documents are generated lazily, the same for the same parameters
+    """
+    def __init__(self, doc_count: int, doc_length: int = DEFAULT_DOC_LENGTH,
+                 vocabulary_size: int = DEFAULT_VOCABULARY_SIZE, skew: float = DEFAULT_ZIPF_SKEW,
+                 seed: int = DEFAULT_SEED) -> None:
+        """
+        :param doc_count: number of documents
+        :param doc_length: number of words in every document
+        :param vocabulary_size: number of distinct words
+        :param skew: exponent of Zipf law, 0 means uniform distribution
+        :param seed: seed of random generator
+        """
+        self.doc_count = doc_count
+        self.doc_length = doc_length
+        self.vocabulary_size = vocabulary_size
+        self.skew = skew
+        self.seed = seed
+
+    @staticmethod
+    def with_words(words: int, **kwargs: tp.Any) -> 'Corpus':
+        """Corpus of about given total number of words, see __init__ for the rest of parameters"""
+        doc_length = kwargs.pop('doc_length', DEFAULT_DOC_LENGTH)
+        return Corpus(max(words // doc_length, 1), doc_length=doc_length, **kwargs)
+
+    @property
+    def words(self) -> int:
+        return self.doc_count * self.doc_length
+
+    def vocabulary(self) -> tp.List[str]:
+        """Words by rank: distinct lowercase letter strings, the most frequent are the shortest"""
+        letters = string.ascii_lowercase
+        words = []
+        for rank in range(self.vocabulary_size):
+            word = ''
+            rank += 1
+            while rank:
+                rank, letter = divmod(rank - 1, len(letters))
+                word += letters[letter]
+            words.append(word)
+        return words
+
+    def docs(self) -> ops.TRowsGenerator:
+        """Yield documents as rows of doc_id and text"""
+        vocabulary = np.array(self.vocabulary(), dtype=object)
+        capitalized = np.array([word.capitalize() for word in vocabulary], dtype=object)
+        probabilities = 1 / np.arange(1, self.vocabulary_size + 1) ** self.skew
+        probabilities /= probabilities.sum()
+        generator = np.random.default_rng(self.seed)
+        for start in range(0, self.doc_count, _CHUNK_DOCS):
+            count = min(_CHUNK_DOCS, self.doc_count - start)
+            shape = (count, self.doc_length)
+            ranks = generator.choice(self.vocabulary_size, size=shape, p=probabilities)
+            words = np.where(generator.random(shape) < _CAPITALIZED_SHARE, capitalized[ranks], vocabulary[ranks])
+            punctuated = generator.random(shape) < _PUNCTUATED_SHARE
+            words[punctuated] = words[punctuated] + ','
+            for offset, doc_words in enumerate(words.tolist()):
+                yield {'doc_id': start + offset, 'text': ' '.join(doc_words)}
+
+    def write(self, filename: str) -> None:
+        """Write documents to file as JSON object per line"""
+        with open(filename, 'w') as file:
+            for doc in self.docs():
+                file.write(json.dumps(doc) + '\n')
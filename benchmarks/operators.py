@@ -0,0 +1,248 @@
+"""
+Microbenchmarks of building blocks of lib: every mapper, reducer and joiner of lib/operations.py,
+groupby_with_precheck, Join with different key multiplicities and ExternalSort with different row widths.
+
+Every case is timed without tracing (rows per second, the best of repeated runs), then run once more under
+tracemalloc, with output kept, to measure allocations per input row: number of memory blocks held by output (growth
+of sys.getallocatedblocks) and peak of traced memory.
+Cases may be run against another checkout of the package, and two checkouts may be compared:
+
+    python -m comp_graph.benchmarks.operators
+    python -m comp_graph.benchmarks.operators --cases Split Join --compare /path/to/old/checkout
+"""
+import argparse
+import gc
+import importlib
+import importlib.util
+import os
+import random
+import sys
+import time
+import tracemalloc
+import typing as tp
+
+from collections import deque
+from types import ModuleType
+
+from .. import lib
+from ..lib import parallel
+
+
+DEFAULT_ROWS = 100_000
+DEFAULT_REPEAT = 3
+# Rows with equal key for reducers
+DEFAULT_GROUP_SIZE = 10
+
+_WORDS = ['hello', 'World', 'little', 'my', 'Hell', 'nice', 'day', 'big', 'data', 'graph']
+
+# Case gets modules of checkout (operations and external_sort) and number of rows, prepares input and returns
+# function running the case, which is timed, and number of input rows
+TRun = tp.Callable[[], tp.Iterable[tp.Any]]
+TCase = tp.Callable[[ModuleType, ModuleType, int], tp.Tuple[TRun, int]]
+TResult = tp.Dict[str, tp.Any]
+
+
+def _make_rows(count: int, width: int = 0, group_size: int = 1, seed: int = 1) -> tp.List[tp.Dict[str, tp.Any]]:
+    """Rows of text, numbers and width extra columns; key is the same for group_size consecutive rows"""
+    generator = random.Random(seed)
+    rows = []
+    for index in range(count):
+        row = {'key': index // group_size, 'doc_id': index, 'count': generator.randint(1, 100),
+               'score': generator.random(),
+               'text': ' '.join(generator.choice(_WORDS) + generator.choice(('', ',', '!')) for _ in range(8))}
+        for column in range(width):
+            row['extra_{}'.format(column)] = generator.random()
+        rows.append(row)
+    return rows
+
+
+def _map_case(make_mapper: tp.Callable[[ModuleType], tp.Any]) -> TCase:
+    def prepare(ops: ModuleType, sort: ModuleType, count: int) -> tp.Tuple[TRun, int]:
+        rows = _make_rows(count)
+        operation = ops.Map(make_mapper(ops))
+        return lambda: operation(rows), count
+    return prepare
+
+
+def _reduce_case(make_reducer: tp.Callable[[ModuleType], tp.Any]) -> TCase:
+    def prepare(ops: ModuleType, sort: ModuleType, count: int) -> tp.Tuple[TRun, int]:
+        rows = _make_rows(count, group_size=DEFAULT_GROUP_SIZE)
+        operation = ops.Reduce(make_reducer(ops), ['key'])
+        return lambda: operation(rows), count
+    return prepare
+
+
+def _join_case(joiner: str, left_multiplicity: int, right_multiplicity: int) -> TCase:
+    """Join of rows where every key has left_multiplicity rows on the left and right_multiplicity on the right"""
+    def prepare(ops: ModuleType, sort: ModuleType, count: int) -> tp.Tuple[TRun, int]:
+        keys = max(count // (left_multiplicity + right_multiplicity), 1)
+        left = _make_rows(keys * left_multiplicity, group_size=left_multiplicity, seed=1)
+        right = _make_rows(keys * right_multiplicity, group_size=right_multiplicity, seed=2)
+        operation = ops.Join(getattr(ops, joiner)(), ['key'])
+        return lambda: operation(left, right), len(left) + len(right)
+    return prepare
+
+
+def _groupby_case(ops: ModuleType, sort: ModuleType, count: int) -> tp.Tuple[TRun, int]:
+    rows = _make_rows(count, group_size=DEFAULT_GROUP_SIZE)
+
+    def run() -> tp.Iterable[tp.Any]:
+        for _, group in ops.groupby_with_precheck(rows, lambda row: row['key']):
+            yield from group
+    return run, count
+
+
+def _sort_case(width: int) -> TCase:
+    def prepare(ops: ModuleType, sort: ModuleType, count: int) -> tp.Tuple[TRun, int]:
+        rows = _make_rows(count, width=width)
+        random.Random(3).shuffle(rows)
+        operation = sort.ExternalSort(['score'])
+        return lambda: operation(rows), count
+    return prepare
+
+
+CASES: tp.Dict[str, TCase] = {
+    'DummyMapper': _map_case(lambda ops: ops.DummyMapper()),
+    'FilterPunctuation': _map_case(lambda ops: ops.FilterPunctuation('text')),
+    'LowerCase': _map_case(lambda ops: ops.LowerCase('text')),
+    'Split': _map_case(lambda ops: ops.Split('text')),
+    'Apply': _map_case(lambda ops: ops.Apply(lambda count: count * 2, ['count'], 'double')),
+    'Filter': _map_case(lambda ops: ops.Filter(lambda row: row['count'] > 50)),
+    'Project': _map_case(lambda ops: ops.Project(['doc_id', 'text'])),
+    'IDF': _map_case(lambda ops: ops.IDF('count', 'score')),
+    'TF_IDF': _map_case(lambda ops: ops.TF_IDF('score', 'count')),
+    'FirstReducer': _reduce_case(lambda ops: ops.FirstReducer()),
+    'FilterGroup': _reduce_case(lambda ops: ops.FilterGroup(lambda *counts: sum(counts) > 500, 'count')),
+    'TopN': _reduce_case(lambda ops: ops.TopN('score', 3)),
+    'TF': _reduce_case(lambda ops: ops.TF('text')),
+    'Mean': _reduce_case(lambda ops: ops.Mean('score')),
+    'Count': _reduce_case(lambda ops: ops.Count('count')),
+    'Sum': _reduce_case(lambda ops: ops.Sum('count')),
+    'groupby_with_precheck': _groupby_case,
+}
+for _joiner in ('InnerJoiner', 'OuterJoiner', 'LeftJoiner', 'RightJoiner'):
+    for _left, _right in ((1, 1), (1, 10), (10, 1), (10, 10)):
+        CASES['Join-{}-{}:{}'.format(_joiner, _left, _right)] = _join_case(_joiner, _left, _right)
+for _width in (0, 10, 50):
+    CASES['ExternalSort-width-{}'.format(_width)] = _sort_case(_width)
+
+
+def load_checkout(root: str) -> tp.Tuple[ModuleType, ModuleType]:
+    """Import operations and external_sort modules of package checked out into root directory"""
+    root = os.path.abspath(root)
+    name = '_checkout_{}'.format(abs(hash(root)))
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(root, '__init__.py'),
+                                                      submodule_search_locations=[root])
+        assert spec is not None
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[name] = package
+        tp.cast(tp.Any, spec.loader).exec_module(package)
+    return importlib.import_module(name + '.lib.operations'), importlib.import_module(name + '.lib.external_sort')
+
+
+def measure(name: str, ops: ModuleType, sort: ModuleType, rows: int, repeat: int) -> TResult:
+    """Rows per second (the best of repeat runs), blocks allocated for output and peak traced bytes per row of case"""
+    seconds = []
+    for _ in range(repeat):
+        run, count = CASES[name](ops, sort, rows)
+        start = time.perf_counter()
+        deque(run(), maxlen=0)
+        seconds.append(time.perf_counter() - start)
+    run, count = CASES[name](ops, sort, rows)
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        output = list(run())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+    del output
+    return {'case': name, 'rows': count, 'rows_per_second': count / min(seconds),
+            'allocations_per_row': blocks / count, 'bytes_per_row': peak / count}
+
+
+def _measure_checkout(connection: tp.Any, root: tp.Optional[str], names: tp.Sequence[str], rows: int,
+                      repeat: int) -> None:
+    if root is None:
+        ops, sort = lib.operations, lib.external_sort
+    else:
+        ops, sort = load_checkout(root)
+    for name in names:
+        try:
+            connection.send(measure(name, ops, sort, rows, repeat))
+        except Exception as error:
+            # Building blocks may be missing or differ in the other checkout
+            connection.send({'case': name, 'error': '{}: {}'.format(type(error).__name__, error)})
+    connection.close()
+
+
+def run_cases(names: tp.Sequence[str], rows: int = DEFAULT_ROWS, repeat: int = DEFAULT_REPEAT,
+              root: tp.Optional[str] = None) -> tp.List[TResult]:
+    """
+    Measure cases in a separate process
+    :param root: directory of checkout of package to measure, this one if None
+    """
+    local_end, remote_end = parallel.MP_CONTEXT.Pipe(duplex=False)
+    process = parallel.MP_CONTEXT.Process(target=_measure_checkout, args=(remote_end, root, names, rows, repeat))
+    process.start()
+    remote_end.close()
+    results = []
+    try:
+        for _ in names:
+            results.append(local_end.recv())
+    except EOFError:
+        raise RuntimeError('Benchmark process failed, exit code {}'.format(process.exitcode))
+    finally:
+        local_end.close()
+        process.join()
+    return results
+
+
+def format_results(results: tp.Sequence[TResult], baseline: tp.Optional[tp.Sequence[TResult]] = None) -> str:
+    """Table of results, with speedup and allocations change relative to baseline if given"""
+    previous = {result['case']: result for result in baseline or ()}
+    header = '{:<32} {:>14} {:>12} {:>12}'.format('case', 'rows/s', 'allocs/row', 'bytes/row')
+    if baseline is not None:
+        header += ' {:>10} {:>12} {:>12}'.format('speedup', 'allocs ratio', 'bytes ratio')
+    lines = [header]
+    for result in results:
+        if 'error' in result:
+            lines.append('{:<32} {}'.format(result['case'], result['error']))
+            continue
+        line = '{:<32} {:>14.0f} {:>12.2f} {:>12.1f}'.format(result['case'], result['rows_per_second'],
+                                                             result['allocations_per_row'], result['bytes_per_row'])
+        old = previous.get(result['case'])
+        if old is not None and 'error' not in old:
+            line += ' {:>9.2f}x {:>11.2f}x {:>11.2f}x'.format(
+                result['rows_per_second'] / old['rows_per_second'],
+                result['allocations_per_row'] / max(old['allocations_per_row'], 1e-9),
+                result['bytes_per_row'] / max(old['bytes_per_row'], 1e-9))
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv: tp.Optional[tp.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Microbenchmarks of lib building blocks')
+    parser.add_argument('--cases', nargs='+', default=[],
+                        help='names or name prefixes of cases to run, all by default: ' + ', '.join(CASES))
+    parser.add_argument('--rows', type=lambda rows: int(float(rows)), default=DEFAULT_ROWS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--root', help='checkout of package to measure, this one by default')
+    parser.add_argument('--compare', help='checkout of package to compare with, e.g. before the change')
+    args = parser.parse_args(argv)
+
+    names = [name for name in CASES if not args.cases or any(name.startswith(case) for case in args.cases)]
+    if not names:
+        parser.error('no cases match {}'.format(' '.join(args.cases)))
+    baseline = run_cases(names, args.rows, args.repeat, args.compare) if args.compare else None
+    results = run_cases(names, args.rows, args.repeat, args.root)
+    print(format_results(results, baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
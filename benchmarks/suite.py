@@ -0,0 +1,211 @@
+"""
+End-to-end benchmarks of graphs.py pipelines over synthetic corpora (see corpus.Corpus).
+
+Every benchmark runs in a process of its own and its throughput (words of corpus per second) and peak memory
+(resident set size of the process and its children, e.g. sorting process) are measured. Results are compared
+with baseline saved by an earlier run, exit status is 1 if any of them is worse by more than threshold:
+
+    python -m comp_graph.benchmarks.suite --output baseline.json
+    python -m comp_graph.benchmarks.suite --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import typing as tp
+
+import psutil
+
+from ..graphs import inverted_index_graph, word_count_graph, word_count_graph_from_file
+from ..lib import parallel
+from . import corpus as corpus_module
+
+
+DEFAULT_SIZES = (10 ** 4, 10 ** 5, 10 ** 6)
+DEFAULT_THRESHOLD = 0.2
+# Interval of sampling memory of benchmark process, in seconds
+MEMORY_SAMPLING_INTERVAL = 0.01
+
+# Benchmark gets corpus and directory for its files; it prepares what it needs and returns the measured run
+TBenchmark = tp.Callable[[corpus_module.Corpus, str], tp.Callable[[], tp.Any]]
+TResult = tp.Dict[str, tp.Any]
+
+
+def _word_count(corpus: corpus_module.Corpus, directory: str) -> tp.Callable[[], tp.Any]:
+    docs = list(corpus.docs())
+    graph = word_count_graph('docs')
+    return lambda: graph.run(docs=lambda: iter(docs))
+
+
+def _word_count_from_file(corpus: corpus_module.Corpus, directory: str) -> tp.Callable[[], tp.Any]:
+    filename = os.path.join(directory, 'corpus.txt')
+    corpus.write(filename)
+    graph = word_count_graph_from_file(lambda root: filename, json.loads)
+    return graph.run
+
+
+def _inverted_index(corpus: corpus_module.Corpus, directory: str) -> tp.Callable[[], tp.Any]:
+    docs = list(corpus.docs())
+    graph = inverted_index_graph('docs')
+    return lambda: graph.run(docs=lambda: iter(docs))
+
+
+BENCHMARKS: tp.Dict[str, TBenchmark] = {
+    'word_count': _word_count,
+    'word_count_from_file': _word_count_from_file,
+    'inverted_index': _inverted_index,
+}
+
+
+class MemorySampler:
+    """Background sampler of peak resident set size of the process and all of its children"""
+    def __init__(self) -> None:
+        self.peak_rss = 0
+        self._process = psutil.Process()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> 'MemorySampler':
+        self._measure()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        self._stopped.set()
+        self._thread.join()
+        self._measure()
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(MEMORY_SAMPLING_INTERVAL):
+            self._measure()
+
+    def _measure(self) -> None:
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        self.peak_rss = max(self.peak_rss, rss)
+
+
+def _measure(name: str, corpus: corpus_module.Corpus) -> TResult:
+    with tempfile.TemporaryDirectory(prefix='comp_graph_benchmark_') as directory:
+        run = BENCHMARKS[name](corpus, directory)
+        with MemorySampler() as sampler:
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+    return {'benchmark': name, 'words': corpus.words, 'docs': corpus.doc_count, 'seconds': seconds,
+            'words_per_second': corpus.words / seconds, 'peak_rss_mb': sampler.peak_rss / 2 ** 20}
+
+
+def _measure_in_child(connection: tp.Any, name: str, corpus: corpus_module.Corpus) -> None:
+    connection.send(_measure(name, corpus))
+    connection.close()
+
+
+def run_benchmark(name: str, corpus: corpus_module.Corpus) -> TResult:
+    """Run benchmark in fresh process, so that memory left by previous benchmarks does not count"""
+    local_end, remote_end = parallel.MP_CONTEXT.Pipe(duplex=False)
+    process = parallel.MP_CONTEXT.Process(target=_measure_in_child, args=(remote_end, name, corpus))
+    process.start()
+    remote_end.close()
+    result: tp.Optional[TResult] = None
+    try:
+        result = local_end.recv()
+    except EOFError:
+        pass
+    finally:
+        local_end.close()
+        process.join()
+    if result is None:
+        raise RuntimeError('Benchmark {} failed, exit code {}'.format(name, process.exitcode))
+    return result
+
+
+def run_suite(names: tp.Sequence[str], sizes: tp.Sequence[int], repeat: int = 1,
+              **corpus_parameters: tp.Any) -> tp.List[TResult]:
+    """
+    Run every benchmark for corpus of every size, the best of repeated runs is kept
+    :param names: names of benchmarks, see BENCHMARKS
+    :param sizes: total numbers of words of corpora
+    :param repeat: number of runs of every benchmark
+    :param corpus_parameters: parameters of corpora, see corpus.Corpus
+    """
+    results = []
+    for size in sizes:
+        corpus = corpus_module.Corpus.with_words(size, **corpus_parameters)
+        for name in names:
+            runs = [run_benchmark(name, corpus) for _ in range(repeat)]
+            results.append(min(runs, key=lambda result: result['seconds']))
+    return results
+
+
+def find_regressions(results: tp.Sequence[TResult], baseline: tp.Sequence[TResult],
+                     threshold: float) -> tp.List[str]:
+    """
+    Describe results whose throughput is lower or peak memory is higher than in baseline by more than threshold
+    :param threshold: allowed relative change, e.g. 0.2 for 20%
+    """
+    baseline_results = {(result['benchmark'], result['words']): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_results.get((result['benchmark'], result['words']))
+        if previous is None:
+            continue
+        if result['words_per_second'] < previous['words_per_second'] * (1 - threshold):
+            regressions.append('{} at {} words: throughput {:.0f} words/s, was {:.0f}'.format(
+                result['benchmark'], result['words'], result['words_per_second'], previous['words_per_second']))
+        if result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + threshold):
+            regressions.append('{} at {} words: peak memory {:.1f}MB, was {:.1f}MB'.format(
+                result['benchmark'], result['words'], result['peak_rss_mb'], previous['peak_rss_mb']))
+    return regressions
+
+
+def format_results(results: tp.Sequence[TResult]) -> str:
+    lines = ['{:<22} {:>10} {:>10} {:>14} {:>12}'.format('benchmark', 'words', 'seconds', 'words/s', 'peak MB')]
+    for result in results:
+        lines.append('{:<22} {:>10} {:>10.2f} {:>14.0f} {:>12.1f}'.format(
+            result['benchmark'], result['words'], result['seconds'], result['words_per_second'],
+            result['peak_rss_mb']))
+    return '\n'.join(lines)
+
+
+def main(argv: tp.Optional[tp.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks of graphs.py pipelines over synthetic corpora')
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--sizes', nargs='+', type=lambda size: int(float(size)), default=list(DEFAULT_SIZES),
+                        help='total numbers of words of corpora, e.g. 1e4 1e7')
+    parser.add_argument('--vocabulary-size', type=int, default=corpus_module.DEFAULT_VOCABULARY_SIZE)
+    parser.add_argument('--skew', type=float, default=corpus_module.DEFAULT_ZIPF_SKEW, help='Zipf law exponent')
+    parser.add_argument('--doc-length', type=int, default=corpus_module.DEFAULT_DOC_LENGTH)
+    parser.add_argument('--seed', type=int, default=corpus_module.DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=1, help='runs of every benchmark, the best one is kept')
+    parser.add_argument('--output', help='file to save results to, e.g. to be used as baseline later')
+    parser.add_argument('--baseline', help='file with results of earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative loss of throughput or growth of peak memory')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.benchmarks, args.sizes, repeat=args.repeat, vocabulary_size=args.vocabulary_size,
+                        skew=args.skew, doc_length=args.doc_length, seed=args.seed)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
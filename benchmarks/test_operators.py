@@ -0,0 +1,23 @@
+import os
+
+from . import operators
+
+
+def test_operator_cases_run() -> None:
+    names = ['Split', 'Count', 'groupby_with_precheck', 'Join-OuterJoiner-10:1', 'ExternalSort-width-10']
+
+    results = operators.run_cases(names, rows=200, repeat=1)
+
+    assert names == [result['case'] for result in results]
+    assert all(result['rows_per_second'] > 0 and result['bytes_per_row'] > 0 for result in results)
+    # Every input row gives several output rows
+    assert results[0]['allocations_per_row'] > 1
+
+
+def test_operator_cases_compare_checkouts() -> None:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    baseline = operators.run_cases(['Split'], rows=100, repeat=1, root=root)
+    table = operators.format_results(operators.run_cases(['Split'], rows=100, repeat=1), baseline)
+
+    assert 'speedup' in table and 'x' in table.splitlines()[1]
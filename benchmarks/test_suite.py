@@ -0,0 +1,27 @@
+from collections import Counter
+
+from . import suite
+from .corpus import Corpus
+
+
+def test_corpus_is_deterministic_and_skewed() -> None:
+    corpus = Corpus(doc_count=50, doc_length=20, vocabulary_size=1000, skew=1.5)
+
+    docs = list(corpus.docs())
+
+    assert docs == list(Corpus(doc_count=50, doc_length=20, vocabulary_size=1000, skew=1.5).docs())
+    assert docs != list(Corpus(doc_count=50, doc_length=20, vocabulary_size=1000, skew=1.5, seed=2).docs())
+    assert list(range(50)) == [doc['doc_id'] for doc in docs]
+    words = Counter(word.strip(',').lower() for doc in docs for word in doc['text'].split())
+    assert 1000 == corpus.words == sum(words.values())
+    assert 'a' == words.most_common(1)[0][0]
+
+
+def test_suite_detects_regressions() -> None:
+    results = suite.run_suite(['word_count', 'inverted_index'], [1000], vocabulary_size=100)
+
+    assert [('word_count', 1000), ('inverted_index', 1000)] == [(r['benchmark'], r['words']) for r in results]
+    assert all(result['words_per_second'] > 0 and result['peak_rss_mb'] > 0 for result in results)
+    assert [] == suite.find_regressions(results, results, 0.1)
+    faster = [dict(result, words_per_second=result['words_per_second'] * 2) for result in results]
+    assert 2 == len(suite.find_regressions(results, faster, 0.1))
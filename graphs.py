@@ -1,16 +1,18 @@
-from .lib import Graph, operations
+from .lib import Graph, incremental, operations
 import pathlib
 import typing as tp
 
 
+def _split_words(graph: Graph, text_column: str) -> Graph:
+    return graph.map(operations.FilterPunctuation(text_column)) \
+                .map(operations.LowerCase(text_column)) \
+                .map(operations.Split(text_column))
+
+
 def word_count_graph(input_stream_name: str, text_column: str = 'text', count_column: str = 'count') -> Graph:
     """Constructs graph which counts words in text_column of all rows passed"""
-    return Graph.graph_from_iter(name=input_stream_name) \
-        .map(operations.FilterPunctuation(text_column)) \
-        .map(operations.LowerCase(text_column)) \
-        .map(operations.Split(text_column)) \
-        .sort([text_column]) \
-        .reduce(operations.Count(count_column), [text_column]) \
+    return _split_words(Graph.graph_from_iter(name=input_stream_name), text_column) \
+        .reduce(operations.Count(count_column), [text_column], strategy='hash') \
         .sort([count_column, text_column])
 
 
@@ -20,41 +22,90 @@ def word_count_graph_from_file(input_file_path: tp.Callable[[str], str],
     """Constructs graph which counts words in text_column of all rows passed"""
     path = pathlib.Path(__file__).parent
     input_file_name = input_file_path(str(path))
-    return Graph.graph_from_file(filename=input_file_name, parser=parser) \
-        .map(operations.FilterPunctuation(text_column)) \
-        .map(operations.LowerCase(text_column)) \
-        .map(operations.Split(text_column)) \
-        .sort([text_column]) \
-        .reduce(operations.Count(count_column), [text_column]) \
+    return _split_words(Graph.graph_from_file(filename=input_file_name, parser=parser), text_column) \
+        .reduce(operations.Count(count_column), [text_column], strategy='hash') \
         .sort([count_column, text_column])
 
+
 def inverted_index_graph(input_stream_name: str, doc_column: str = 'doc_id', text_column: str = 'text',
-                         result_column: str = 'tf_idf') -> Graph:
-    """Constructs graph which calculates td-idf for every word/document pair"""
+                         result_column: str = 'tf_idf', checkpoints: bool = False) -> Graph:
+    """Constructs graph which calculates td-idf for every word/document pair
+    :param checkpoints: save rows after sorts and reduces as checkpoints (see Graph.checkpoint), so that run with
+        checkpoint_directory which is restarted does not read and sort the documents again
+    """
+
+    def stage(graph: Graph, name: str) -> Graph:
+        return graph.checkpoint(name) if checkpoints else graph
 
     docs_count_column = "total_docs"
-    split_words = Graph.graph_from_iter(name=input_stream_name) \
-                       .map(operations.FilterPunctuation(text_column)) \
-                       .map(operations.LowerCase(text_column)) \
-                       .map(operations.Split(text_column))
-    count_docs = Graph.graph_from_iter(name=input_stream_name) \
-                      .sort([doc_column]) \
-                      .reduce(operations.Count(docs_count_column), [])
+    docs = Graph.graph_from_iter(name=input_stream_name)
+    split_words = _split_words(docs, text_column)
+    count_docs = stage(docs.reduce(operations.Count(docs_count_column), []), 'count_docs')
+    # Words sorted by document and text are good both for distinct (document, word) pairs and for TF by document
+    sorted_words = stage(split_words.sort([doc_column, text_column]), 'sorted_words')
     term_occ_count_column = "term_occ"
-    count_idf = split_words.sort([doc_column, text_column])  \
-                           .reduce(operations.FirstReducer(), (doc_column, text_column)) \
+    term_occ = sorted_words.reduce(operations.FirstReducer(), (doc_column, text_column)) \
                            .sort([text_column]) \
-                           .reduce(operations.Count(term_occ_count_column), [text_column]) \
-                           .join(operations.InnerJoiner(suffix_a="", suffix_b=""), count_docs, []) \
-                           .map(operations.IDF(docs_count_column, term_occ_count_column)) \
-                           .sort([text_column])
-
-    count_tf = split_words.sort([doc_column]) \
-                          .reduce(operations.TF(text_column), [doc_column]) \
-                          .sort([text_column])
-    result = count_idf.join(operations.InnerJoiner(suffix_a="", suffix_b=""), count_tf, [text_column]) \
+                           .reduce(operations.Count(term_occ_count_column), [text_column])
+    count_idf = stage(term_occ, 'term_occ') \
+        .join(operations.InnerJoiner(suffix_a="", suffix_b=""), count_docs, [], strategy='broadcast') \
+        .map(operations.IDF(docs_count_column, term_occ_count_column))
+
+    count_tf = stage(sorted_words.reduce(operations.TF(text_column), [doc_column]), 'tf')
+    tf_idf = count_idf.join(operations.InnerJoiner(suffix_a="", suffix_b=""), count_tf, [text_column],
+                            strategy='hash') \
                       .map(operations.TF_IDF(result_column=result_column)) \
                       .map(operations.Project((doc_column, text_column, result_column))) \
-                      .sort([text_column]) \
-                      .reduce(operations.TopN(result_column, n=3), [text_column])
-    return result
\ No newline at end of file
+                      .sort([text_column])
+    result = stage(tf_idf, 'tf_idf').reduce(operations.TopN(result_column, n=3), [text_column])
+    return result
+
+
+def word_count_incremental_graph(input_stream_name: str, state_directory: str, text_column: str = 'text',
+                                 count_column: str = 'count') -> incremental.IncrementalGraph:
+    """Constructs graph which counts words in text_column of all rows passed to all its runs so far,
+    counts of words are kept in state_directory between runs"""
+    counts_state = "word_counts"
+    new_counts = _split_words(Graph.graph_from_iter(name=input_stream_name), text_column) \
+        .reduce(operations.Count(count_column), [text_column], strategy='hash')
+    counts = new_counts.concat(Graph.graph_from_iter(name=counts_state)) \
+        .reduce(operations.Sum(count_column), [text_column], strategy='hash')
+    result = Graph.graph_from_iter(name=counts_state).sort([count_column, text_column])
+    return incremental.IncrementalGraph({counts_state: counts}, result, state_directory)
+
+
+def inverted_index_incremental_graph(input_stream_name: str, state_directory: str, doc_column: str = 'doc_id',
+                                     text_column: str = 'text', result_column: str = 'tf_idf',
+                                     top: int = 3) -> incremental.IncrementalGraph:
+    """Constructs graph which calculates tf-idf for top documents of every word over all rows passed to all its runs
+    so far. Rows of every run must be new documents. Kept between runs are total number of documents, number of
+    documents of every word and top documents of every word by tf: idf is the same for all documents of word,
+    so top documents by tf-idf are top documents by tf"""
+    docs_count_column = "total_docs"
+    term_occ_count_column = "term_occ"
+    tf_column = "tf"
+    docs_count_state, term_occ_state, top_tf_state = "total_docs", "term_occ", "top_tf"
+
+    docs = Graph.graph_from_iter(name=input_stream_name)
+    sorted_words = _split_words(docs, text_column).sort([doc_column, text_column])
+    docs_count = docs.reduce(operations.Count(docs_count_column), []) \
+        .concat(Graph.graph_from_iter(name=docs_count_state)) \
+        .reduce(operations.Sum(docs_count_column), [], strategy='hash')
+    term_occ = sorted_words.reduce(operations.FirstReducer(), (doc_column, text_column)) \
+        .reduce(operations.Count(term_occ_count_column), [text_column], strategy='hash') \
+        .concat(Graph.graph_from_iter(name=term_occ_state)) \
+        .reduce(operations.Sum(term_occ_count_column), [text_column], strategy='hash')
+    top_tf = sorted_words.reduce(operations.TF(text_column, tf_column), [doc_column]) \
+        .concat(Graph.graph_from_iter(name=top_tf_state)) \
+        .reduce(operations.TopN(tf_column, n=top), [text_column], strategy='hash')
+
+    result = Graph.graph_from_iter(name=top_tf_state) \
+        .join(operations.InnerJoiner(suffix_a="", suffix_b=""), Graph.graph_from_iter(name=term_occ_state),
+              [text_column], strategy='hash') \
+        .join(operations.InnerJoiner(suffix_a="", suffix_b=""), Graph.graph_from_iter(name=docs_count_state), [],
+              strategy='broadcast') \
+        .map(operations.IDF(docs_count_column, term_occ_count_column)) \
+        .map(operations.TF_IDF(tf_column, result_column=result_column)) \
+        .map(operations.Project((doc_column, text_column, result_column)))
+    states = {docs_count_state: docs_count, term_occ_state: term_occ, top_tf_state: top_tf}
+    return incremental.IncrementalGraph(states, result, state_directory)
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import types
+import typing as tp
+
+from . import operations as ops
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph  # noqa
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+ENTRY_SUFFIX = '.rows'
+# Bytes of file read at once when files are identified by hash of their contents
+_HASH_BLOCK_SIZE = 1024 * 1024
+# Run options which may change rows given by graph or their order, with their defaults; the rest (e.g. profile)
+# are not a part of key
+_KEYED_OPTIONS = {'columnar': False, 'optimize': True, 'workers': 1}
+
+_PLAIN_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+
+def fingerprint(value: tp.Any, _seen: tp.Optional[tp.Set[int]] = None) -> tp.Any:
+    """
+    Deterministic description of value made of plain values and tuples, the same in every process for equal values.
+    Objects are described by their type and attributes, functions by their code, defaults and closure, but not by
+    globals they refer to
+    :raise TypeError: if value may not be described, e.g. refers to itself
+    :raise ValueError: if function refers to variable of closure which is not assigned yet
+    """
+    seen = set() if _seen is None else _seen
+    if isinstance(value, _PLAIN_TYPES):
+        return value
+    if id(value) in seen:
+        raise TypeError('Value refers to itself: {!r}'.format(type(value)))
+    seen.add(id(value))
+    try:
+        if isinstance(value, (list, tuple)):
+            return type(value).__name__, tuple(fingerprint(item, seen) for item in value)
+        if isinstance(value, (set, frozenset)):
+            return 'set', tuple(sorted((fingerprint(item, seen) for item in value), key=repr))
+        if isinstance(value, dict):
+            return 'dict', tuple(sorted(((fingerprint(key, seen), fingerprint(item, seen))
+                                         for key, item in value.items()), key=repr))
+        if isinstance(value, types.FunctionType):
+            closure = tuple(cell.cell_contents for cell in value.__closure__ or ())
+            return ('function', value.__module__, value.__qualname__, fingerprint(value.__code__, seen),
+                    fingerprint(value.__defaults__, seen), fingerprint(value.__kwdefaults__, seen),
+                    fingerprint(closure, seen))
+        if isinstance(value, types.CodeType):
+            return 'code', value.co_code, value.co_names, fingerprint(value.co_consts, seen)
+        if isinstance(value, types.MethodType):
+            return 'method', fingerprint(value.__func__, seen), fingerprint(value.__self__, seen)
+        if isinstance(value, (types.BuiltinFunctionType, type)):
+            return 'named', value.__module__, value.__qualname__
+        if hasattr(value, '__dict__'):
+            return 'object', fingerprint(type(value), seen), fingerprint(vars(value), seen)
+        # Objects without attributes, e.g. itemgetter or datetime, are described by how they are pickled
+        return 'reduced', fingerprint(type(value), seen), fingerprint(value.__reduce_ex__(4)[1:], seen)
+    finally:
+        seen.discard(id(value))
+
+
+def describe(graph: 'Graph', source_versions: tp.Mapping[str, tp.Any], hash_files: bool = False) -> tp.Any:
+    """
+    Deterministic description of graph: its structure, fingerprints of its operations and identity of its data
+    sources. Files read by graph (by any source with filename) are identified by path, size and modification time
+    (or by hash of contents), data sources passed to run by versions given by caller
+    :param source_versions: versions of data sources passed to run, by name
+    :param hash_files: identify files by hash of their contents instead of size and modification time
+    :raise TypeError, ValueError: if operation may not be described (see fingerprint)
+    :raise KeyError: if version of data source is not given
+    :raise OSError: if file read by graph may not be identified, e.g. it is missing
+    """
+    described: tp.Dict[int, tp.Any] = {}
+
+    def visit(node: 'Graph') -> tp.Any:
+        if id(node) not in described:
+            operation = node.operation
+            if isinstance(operation, ops.FromIter):
+                source: tp.Any = ('version', fingerprint(source_versions[operation.name]))
+            elif not node.dependencies and isinstance(getattr(operation, 'filename', None), str):
+                # Any source reading file, e.g. FromFile or readers of typed records
+                source = ('file', identify_file(getattr(operation, 'filename'), hash_files))
+            else:
+                source = None
+            described[id(node)] = (fingerprint(operation), source,
+                                   tuple(visit(child_graph) for child_graph in node.dependencies))
+        return described[id(node)]
+
+    return visit(graph)
+
+
+def identify_file(filename: str, hash_files: bool = False) -> tp.Tuple[tp.Any, ...]:
+    """Identity of file: path with size and modification time, or with hash of contents if hash_files"""
+    path = os.path.abspath(filename)
+    if not hash_files:
+        status = os.stat(path)
+        return path, status.st_size, status.st_mtime_ns
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return path, digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Opt-in cache of rows given by graphs, stored in directory on disk. Entries are keyed by hash of structure of
+    graph, parameters of its operations and identity of its data sources (see describe). Rows of graph whose data
+    sources are not all identified are not cached. Entries are read back from disk as they are iterated; the least
+    recently used ones are evicted once the cache takes more than max_bytes
+    """
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, hash_files: bool = False) -> None:
+        """
+        :param directory: directory to keep entries in, created if missing
+        :param max_bytes: disk quota of entries
+        :param hash_files: identify files by hash of their contents instead of size and modification time
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_files = hash_files
+        self.hits = 0
+        self.misses = 0
+        # Runs which were not cached since data sources or operations could not be identified
+        self.bypasses = 0
+
+    def key(self, graph: 'Graph', source_versions: tp.Mapping[str, tp.Any],
+            options: tp.Mapping[str, tp.Any]) -> tp.Optional[str]:
+        """
+        Key of entry of graph rows, None if rows may not be cached
+        :param source_versions: versions of data sources passed to run, by name
+        :param options: run options, see Graph.run
+        """
+        try:
+            description = (describe(graph, source_versions, self.hash_files),
+                           tuple((name, fingerprint(options.get(name, default)))
+                                 for name, default in _KEYED_OPTIONS.items()))
+        except (TypeError, ValueError, KeyError, OSError):
+            return None
+        return hashlib.sha256(repr(description).encode()).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def iter(self, graph: 'Graph', source_versions: tp.Optional[tp.Mapping[str, tp.Any]] = None,
+             **kwargs: tp.Any) -> ops.TRowsGenerator:
+        """
+        Yield rows of graph: stored ones on hit, otherwise rows of graph run which are stored as they go.
+        Entry is stored only if rows were iterated to the end
+        :param source_versions: versions of data sources passed to run, by name, e.g. date of data or its hash
+        :param kwargs: data sources and options of run, see Graph.run
+        """
+        key = self.key(graph, source_versions or {}, kwargs)
+        if key is None:
+            self.bypasses += 1
+            yield from graph._run(**kwargs)
+            return
+        path = self.entry_path(key)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            yield from self._store(path, graph._run(**kwargs))
+            return
+        self.hits += 1
+        with file:
+            # Modification time of entry is the time of its last use
+            os.utime(path)
+            yield from spill.read_rows(file)
+
+    def run(self, graph: 'Graph', source_versions: tp.Optional[tp.Mapping[str, tp.Any]] = None,
+            **kwargs: tp.Any) -> tp.List[ops.TRow]:
+        """Rows of graph, see iter"""
+        return list(self.iter(graph, source_versions, **kwargs))
+
+    def _store(self, path: str, rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        os.makedirs(self.directory, exist_ok=True)
+        yield from spill.store_rows(rows, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits into quota"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                status = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime_ns, status.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all the entries"""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(ENTRY_SUFFIX):
+                    os.remove(os.path.join(self.directory, name))
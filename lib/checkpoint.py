@@ -0,0 +1,81 @@
+import hashlib
+import os
+import typing as tp
+
+from . import cache
+from . import operations as ops
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph  # noqa
+
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+
+class Checkpoint(ops.Operation):
+    """
+    Boundary of stages whose rows are saved to disk when graph runs with checkpoint directory (see Graph.checkpoint),
+    otherwise rows pass as is. Rows are stored as they are yielded (see spill.store_rows), so that run which failed
+    leaves no checkpoint.
+    Once checkpoint of the same rows exists, rows are read back from it and stages before it are not run at all
+    """
+    def __init__(self, name: str = '') -> None:
+        """
+        :param name: name of checkpoint, prefix of its file
+        """
+        self.name = name
+
+    def __call__(self, rows: ops.TRowsIterable, checkpoint_path: tp.Optional[str] = None,
+                 **kwargs: tp.Any) -> ops.TRowsGenerator:
+        """
+        :param checkpoint_path: file of checkpoint (see checkpoint_path), rows pass as is if None
+        """
+        if checkpoint_path is None:
+            yield from rows
+            return
+        try:
+            file = open(checkpoint_path, 'rb')
+        except FileNotFoundError:
+            yield from spill.store_rows(rows, checkpoint_path)
+            return
+        with file:
+            yield from spill.read_rows(file)
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        return inputs_owned[0]
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        return inputs_ordering[0]
+
+
+def checkpoint_path(node: 'Graph', directory: str, source_versions: tp.Mapping[str, tp.Any],
+                    hash_files: bool = False) -> str:
+    """
+    File of checkpoint of rows given by node, named by hash of the graph up to the node and of identity of its data
+    sources (see cache.describe), so that checkpoints of other graphs or other data are never read
+    :param node: node with Checkpoint operation
+    :param directory: directory to keep checkpoints in
+    :param source_versions: versions of data sources passed to run, by name
+    :param hash_files: identify files by hash of their contents instead of size and modification time
+    :raise ValueError: if data sources or operations of the graph may not be identified
+    """
+    operation = node.operation
+    assert isinstance(operation, Checkpoint)
+    try:
+        description = cache.describe(node, source_versions, hash_files)
+    except KeyError as error:
+        raise ValueError('Checkpoint needs version of data source {}'.format(error)) from None
+    except (TypeError, ValueError) as error:
+        raise ValueError('Checkpoint {!r} may not be identified: {}'.format(operation.name, error)) from None
+    key = hashlib.sha256(repr(description).encode()).hexdigest()
+    name = operation.name + '-' + key if operation.name else key
+    return os.path.join(directory, name + CHECKPOINT_SUFFIX)
+
+
+def clear(directory: str) -> None:
+    """Remove all the checkpoints in directory, e.g. once the run they were made for completed"""
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(CHECKPOINT_SUFFIX):
+                os.remove(os.path.join(directory, name))
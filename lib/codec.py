@@ -0,0 +1,130 @@
+import pickle
+import struct
+import typing as tp
+
+from itertools import groupby, repeat
+
+import numpy as np
+
+from . import operations as ops
+
+
+# Batch is either a sequence of segments of rows with the same columns, or a pickled list of arbitrary items
+_FORMAT_SEGMENTS = 0
+_FORMAT_PICKLE = 1
+# Segment header: number of rows and number of columns
+_SEGMENT = struct.Struct('<IH')
+# Column header: length of name, type tag and length of payload; name and payload follow the header
+_COLUMN = struct.Struct('<HcI')
+
+_INT = b'i'
+_FLOAT = b'f'
+_BOOL = b'b'
+_STR = b's'
+_SEPARATED_STR = b't'
+_NONE = b'n'
+_PICKLE = b'p'
+
+_DTYPES = {_INT: np.int64, _FLOAT: np.float64, _BOOL: np.bool_}
+_NATIVE_TAGS = {int: _INT, float: _FLOAT, bool: _BOOL}
+
+# Strings with lone surrogates are kept as they are
+_ERRORS = 'surrogatepass'
+# Strings which do not contain it are stored joined by it, otherwise they are stored with their lengths
+_SEPARATOR = '\x00'
+
+
+def _encode_column(values: tp.List[tp.Any]) -> tp.Tuple[bytes, bytes]:
+    """Type tag and payload of column values"""
+    types = set(map(type, values))
+    if len(types) == 1:
+        value_type = types.pop()
+        if value_type in _NATIVE_TAGS:
+            tag = _NATIVE_TAGS[value_type]
+            try:
+                return tag, np.array(values, dtype=_DTYPES[tag]).tobytes()
+            except OverflowError:
+                pass
+        elif value_type is str:
+            text = _SEPARATOR.join(values)
+            if text.count(_SEPARATOR) == len(values) - 1:
+                return _SEPARATED_STR, text.encode('utf-8', _ERRORS)
+            # Lengths are in characters, so that decoded text is just sliced
+            lengths = np.fromiter(map(len, values), dtype=np.uint32, count=len(values))
+            return _STR, lengths.tobytes() + ''.join(values).encode('utf-8', _ERRORS)
+        elif value_type is type(None):
+            return _NONE, b''
+    return _PICKLE, pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_column(tag: bytes, payload: memoryview, count: int) -> tp.List[tp.Any]:
+    if tag in _DTYPES:
+        values: tp.List[tp.Any] = np.frombuffer(payload, dtype=_DTYPES[tag], count=count).tolist()
+        return values
+    if tag == _SEPARATED_STR:
+        return str(payload, 'utf-8', _ERRORS).split(_SEPARATOR)
+    if tag == _STR:
+        lengths = np.frombuffer(payload, dtype=np.uint32, count=count)
+        text = str(payload[lengths.nbytes:], 'utf-8', _ERRORS)
+        ends = np.cumsum(lengths).tolist()
+        return [text[start:end] for start, end in zip([0] + ends, ends)]
+    if tag == _NONE:
+        return [None] * count
+    values = pickle.loads(payload)
+    return values
+
+
+def _segments(rows: tp.Sequence[tp.Any]) -> tp.Optional[tp.List[tp.Tuple[tp.Tuple[str, ...], tp.List[ops.TRow]]]]:
+    """Split rows into runs of rows with the same columns, None if some item is not a row with string column names"""
+    if not all(type(row) is dict for row in rows):
+        return None
+    segments = [(names, list(segment)) for names, segment in groupby(rows, tuple)]
+    if not all(type(name) is str for names, _ in segments for name in names):
+        return None
+    return segments
+
+
+def encode_batch(rows: tp.Sequence[tp.Any]) -> bytes:
+    """
+    Encode rows column by column: consecutive rows with the same columns form a segment, where names of columns
+    are stored once and values of every column are packed by their type. Columns of mixed types are pickled,
+    and so are batches of items which are not rows with string names of columns
+    """
+    segments = _segments(rows)
+    if segments is None:
+        return bytes([_FORMAT_PICKLE]) + pickle.dumps(list(rows), protocol=pickle.HIGHEST_PROTOCOL)
+    parts = [bytes([_FORMAT_SEGMENTS])]
+    for names, segment in segments:
+        parts.append(_SEGMENT.pack(len(segment), len(names)))
+        for name in names:
+            tag, payload = _encode_column([row[name] for row in segment])
+            encoded_name = name.encode('utf-8', _ERRORS)
+            parts += [_COLUMN.pack(len(encoded_name), tag, len(payload)), encoded_name, payload]
+    return b''.join(parts)
+
+
+def decode_batch(data: tp.Union[bytes, memoryview]) -> tp.List[ops.TRow]:
+    """Decode rows encoded by encode_batch, payload is not copied if it is a memoryview"""
+    view = memoryview(data)
+    if view[0] == _FORMAT_PICKLE:
+        batch: tp.List[ops.TRow] = pickle.loads(view[1:])
+        return batch
+    rows: tp.List[ops.TRow] = []
+    offset = 1
+    while offset < len(view):
+        count, column_count = _SEGMENT.unpack_from(view, offset)
+        offset += _SEGMENT.size
+        names = []
+        columns = []
+        for _ in range(column_count):
+            name_length, tag, payload_length = _COLUMN.unpack_from(view, offset)
+            offset += _COLUMN.size
+            names.append(str(view[offset:offset + name_length], 'utf-8', _ERRORS))
+            offset += name_length
+            columns.append(_decode_column(tag, view[offset:offset + payload_length], count))
+            offset += payload_length
+        if columns:
+            rows.extend(map(dict, map(zip, repeat(names), zip(*columns))))
+        else:
+            rows.extend({} for _ in range(count))
+    return rows
@@ -0,0 +1,381 @@
+import typing as tp
+
+from abc import abstractmethod, ABC
+from itertools import islice
+
+import numpy as np
+
+from . import operations as ops
+from . import parallel
+
+
+DEFAULT_BATCH_SIZE = 4096
+
+TColumns = tp.Dict[str, np.ndarray]
+TBatchesIterable = tp.Iterable['RecordBatch']
+TBatchesGenerator = tp.Generator['RecordBatch', None, None]
+
+
+class _Missing:
+    """Marker of absent value for columns which are not present in every row of the batch"""
+    def __repr__(self) -> str:
+        return 'MISSING'
+
+    def __reduce__(self) -> str:
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+def make_column(values: tp.List[tp.Any]) -> np.ndarray:
+    """Build column from python values: numeric columns are stored natively, everything else as python objects"""
+    types = set(map(type, values))
+    try:
+        if types == {int}:
+            return np.array(values, dtype=np.int64)
+        if types == {float}:
+            return np.array(values, dtype=np.float64)
+        if types == {bool}:
+            return np.array(values, dtype=np.bool_)
+    except OverflowError:
+        pass
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+class BatchSource(ABC):
+    """Data source which can produce column batches on its own, instead of rows converted to batches"""
+    @abstractmethod
+    def batches(self, batch_size: int) -> 'TBatchesGenerator':
+        """
+        :param batch_size: number of rows in batch
+        """
+        pass
+
+
+class RecordBatch:
+    """
+    Rows stored column by column. Numeric columns are numpy arrays of native type, other columns are arrays of
+    python objects. Rows of one batch may have different sets of columns: absent values are MISSING
+    """
+    def __init__(self, columns: TColumns) -> None:
+        """
+        :param columns: column name to values, all the arrays have the same length
+        """
+        self.columns = columns
+
+    def __len__(self) -> int:
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def take(self, indices: tp.Union[np.ndarray, slice]) -> 'RecordBatch':
+        """Select rows by indices, boolean mask or slice"""
+        return RecordBatch({name: column[indices] for name, column in self.columns.items()})
+
+    @staticmethod
+    def from_rows(rows: tp.Sequence[ops.TRow]) -> 'RecordBatch':
+        if not rows:
+            return RecordBatch({})
+        first_keys = rows[0].keys()
+        if all(row.keys() == first_keys for row in rows):
+            return RecordBatch({name: make_column([row[name] for row in rows]) for name in first_keys})
+        names: tp.Dict[str, None] = {}
+        for row in rows:
+            names.update(dict.fromkeys(row))
+        return RecordBatch({name: make_column([row.get(name, MISSING) for row in rows]) for name in names})
+
+    def to_rows(self) -> tp.List[ops.TRow]:
+        names = list(self.columns)
+        values = [column.tolist() for column in self.columns.values()]
+        rows = [dict(zip(names, row_values)) for row_values in zip(*values)]
+        if any(column.dtype == object for column in self.columns.values()):
+            rows = [{name: value for name, value in row.items() if value is not MISSING} for row in rows]
+        return rows
+
+    @staticmethod
+    def concat(batches: tp.Sequence['RecordBatch']) -> 'RecordBatch':
+        names: tp.Dict[str, None] = {}
+        for batch in batches:
+            names.update(dict.fromkeys(batch.columns))
+        columns = {}
+        for name in names:
+            parts = []
+            for batch in batches:
+                if name in batch.columns:
+                    parts.append(batch.columns[name])
+                else:
+                    parts.append(make_column([MISSING] * len(batch)))
+            columns[name] = np.concatenate(parts)
+        return RecordBatch(columns)
+
+
+def to_batches(rows: ops.TRowsIterable, batch_size: int = DEFAULT_BATCH_SIZE) -> TBatchesGenerator:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, batch_size))
+        if not chunk:
+            break
+        yield RecordBatch.from_rows(chunk)
+
+
+def to_rows(batches: TBatchesIterable) -> ops.TRowsGenerator:
+    for batch in batches:
+        yield from batch.to_rows()
+
+
+# Vectorized mappers
+
+
+def _with_column(batch: RecordBatch, name: str, values: tp.Any) -> RecordBatch:
+    columns = dict(batch.columns)
+    values = np.asarray(values)
+    if values.ndim == 0:
+        values = np.full(len(batch), values.item())
+    columns[name] = values if values.dtype != object else make_column(values.tolist())
+    return RecordBatch(columns)
+
+
+def _map_apply(mapper: ops.Apply, batch: RecordBatch) -> RecordBatch:
+    arguments = [batch[column] for column in mapper.columns]
+    if mapper.vectorized:
+        return _with_column(batch, mapper.result_column, mapper.function(*arguments))
+    values = [mapper.function(*row_values) for row_values in zip(*[argument.tolist() for argument in arguments])]
+    return _with_column(batch, mapper.result_column, make_column(values))
+
+
+def _map_filter(mapper: ops.Filter, batch: RecordBatch) -> RecordBatch:
+    if mapper.vectorized:
+        mask = np.asarray(mapper.condition(batch.columns), dtype=np.bool_)
+    else:
+        mask = np.fromiter((bool(mapper.condition(row)) for row in batch.to_rows()), dtype=np.bool_, count=len(batch))
+    return batch.take(mask)
+
+
+def _map_project(mapper: ops.Project, batch: RecordBatch) -> RecordBatch:
+    return RecordBatch({column: batch[column] for column in mapper.columns})
+
+
+def _map_idf(mapper: ops.IDF, batch: RecordBatch) -> RecordBatch:
+    total = batch[mapper.total_number_column].astype(np.float64)
+    occurrences = batch[mapper.term_occ_number_column].astype(np.float64)
+    return _with_column(batch, mapper.result_column, np.log(total / occurrences))
+
+
+def _map_tf_idf(mapper: ops.TF_IDF, batch: RecordBatch) -> RecordBatch:
+    return _with_column(batch, mapper.result_column, batch[mapper.tf_column] * batch[mapper.idf_column])
+
+
+_MAPPERS: tp.Dict[tp.Type[ops.Mapper], tp.Callable[[tp.Any, RecordBatch], RecordBatch]] = {
+    ops.Apply: _map_apply,
+    ops.Filter: _map_filter,
+    ops.Project: _map_project,
+    ops.IDF: _map_idf,
+    ops.TF_IDF: _map_tf_idf,
+}
+
+
+def _map_rows(mapper: ops.Mapper, batches: TBatchesIterable, batch_size: int) -> TBatchesIterable:
+    # Rows are built from batches right here, so nobody else references them
+    return to_batches(ops.Map(mapper, owns_rows=True)(to_rows(batches)), batch_size)
+
+
+def map_batches(mapper: ops.Mapper, batches: TBatchesIterable,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> TBatchesIterable:
+    """
+    Apply mapper to batches: vectorized if possible, row by row otherwise. Stages of fused mapper are
+    split into vectorized ones and fused chains of the rest
+    """
+    if isinstance(mapper, ops.FusedMapper):
+        row_stages: tp.List[ops.Mapper] = []
+        for stage in mapper.mappers:
+            if type(stage) not in _MAPPERS:
+                row_stages.append(stage)
+                continue
+            if row_stages:
+                batches = _map_rows(ops.FusedMapper(row_stages, owns_rows=True), batches, batch_size)
+                row_stages = []
+            batches = map_batches(stage, batches, batch_size)
+        if row_stages:
+            batches = _map_rows(ops.FusedMapper(row_stages, owns_rows=True), batches, batch_size)
+        return batches
+    vectorized_map = _MAPPERS.get(type(mapper))
+    if vectorized_map is not None:
+        return (vectorized_map(mapper, batch) for batch in batches)
+    return _map_rows(mapper, batches, batch_size)
+
+
+# Vectorized reducers
+
+
+def group_starts(batch: RecordBatch, keys: tp.Sequence[str]) -> np.ndarray:
+    """Indices of rows starting new group of equal keys in batch"""
+    changes = np.zeros(len(batch), dtype=np.bool_)
+    if len(batch):
+        changes[0] = True
+    for key in keys:
+        column = batch[key]
+        changes[1:] |= np.asarray(column[1:] != column[:-1], dtype=np.bool_)
+    return np.flatnonzero(changes)
+
+
+def _group_sizes(batch: RecordBatch, starts: np.ndarray) -> np.ndarray:
+    return np.diff(np.append(starts, len(batch)))
+
+
+class BatchReducer(ABC):
+    """
+    Vectorized counterpart of reducer. Groups may span several batches, so reduction is split into partial
+    reduction of groups within batch and merge of partial results of the same group
+    """
+    @abstractmethod
+    def partial(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        """Reduce every group of batch into partial result, grouped by the same keys"""
+        pass
+
+    @abstractmethod
+    def merge(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        """Merge partial results of every group into single partial result"""
+        pass
+
+    def finalize(self, batch: RecordBatch) -> RecordBatch:
+        """Turn partial results into output rows"""
+        return batch
+
+
+def _keys_of_groups(batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> TColumns:
+    return {key: batch[key][starts] for key in keys}
+
+
+class BatchCount(BatchReducer):
+    def __init__(self, reducer: ops.Count) -> None:
+        self.column = reducer.column
+
+    def partial(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        columns = _keys_of_groups(batch, starts, keys)
+        columns[self.column] = _group_sizes(batch, starts).astype(np.int64)
+        return RecordBatch(columns)
+
+    def merge(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        columns = _keys_of_groups(batch, starts, keys)
+        columns[self.column] = np.add.reduceat(batch[self.column], starts)
+        return RecordBatch(columns)
+
+
+class BatchSum(BatchReducer):
+    def __init__(self, reducer: ops.Sum) -> None:
+        self.column = reducer.column
+
+    def partial(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        columns = _keys_of_groups(batch, starts, keys)
+        columns[self.column] = np.add.reduceat(batch[self.column], starts)
+        return RecordBatch(columns)
+
+    def merge(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        return self.partial(batch, starts, keys)
+
+
+class BatchMean(BatchReducer):
+    _count_column = '__count'
+
+    def __init__(self, reducer: ops.Mean) -> None:
+        self.column = reducer.column
+
+    def partial(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        columns = _keys_of_groups(batch, starts, keys)
+        columns[self.column] = np.add.reduceat(batch[self.column], starts)
+        columns[self._count_column] = _group_sizes(batch, starts)
+        return RecordBatch(columns)
+
+    def merge(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        columns = _keys_of_groups(batch, starts, keys)
+        columns[self.column] = np.add.reduceat(batch[self.column], starts)
+        columns[self._count_column] = np.add.reduceat(batch[self._count_column], starts)
+        return RecordBatch(columns)
+
+    def finalize(self, batch: RecordBatch) -> RecordBatch:
+        columns = dict(batch.columns)
+        counts = columns.pop(self._count_column)
+        columns[self.column] = columns[self.column] / counts
+        return RecordBatch(columns)
+
+
+class BatchTopN(BatchReducer):
+    def __init__(self, reducer: ops.TopN) -> None:
+        self.column = reducer.column_max
+        self.n = reducer.n
+
+    def partial(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        groups = np.repeat(np.arange(len(starts)), _group_sizes(batch, starts))
+        # Dense ranks of values, so that equal values get equal ranks and descending order may be used for any type
+        _, ranks = np.unique(batch[self.column], return_inverse=True)
+        # Stable sort by group, then by value descending: ties keep input order, same as heapq.nlargest
+        order = np.lexsort((-ranks.reshape(-1), groups))
+        rank = np.arange(len(batch)) - np.repeat(starts, _group_sizes(batch, starts))
+        return batch.take(order[rank < self.n])
+
+    def merge(self, batch: RecordBatch, starts: np.ndarray, keys: tp.Sequence[str]) -> RecordBatch:
+        return self.partial(batch, starts, keys)
+
+
+_REDUCERS: tp.Dict[tp.Type[ops.Reducer], tp.Callable[[tp.Any], BatchReducer]] = {
+    ops.Count: BatchCount,
+    ops.Sum: BatchSum,
+    ops.Mean: BatchMean,
+    ops.TopN: BatchTopN,
+}
+
+
+def reduce_batches(batches: TBatchesIterable, keys: tp.Sequence[str], reducer: BatchReducer) -> TBatchesGenerator:
+    """
+    Vectorized reduce of batches sorted by keys. Partial result of the last group of every batch is carried
+    over to the next batch, since the group may continue there
+    """
+    carry: tp.Optional[RecordBatch] = None
+    previous_key: tp.Optional[tp.Tuple[tp.Any, ...]] = None
+    for batch in batches:
+        if not len(batch):
+            continue
+        starts = group_starts(batch, keys)
+        group_keys = list(zip(*[batch[key][starts].tolist() for key in keys]))
+        for group_key in group_keys:
+            if previous_key is not None and group_key < previous_key:
+                raise ValueError('Rows are not sorted by key: {} goes after {}'.format(group_key, previous_key))
+            previous_key = group_key
+        partial = reducer.partial(batch, starts, keys)
+        if carry is not None:
+            partial = RecordBatch.concat([carry, partial])
+            partial = reducer.merge(partial, group_starts(partial, keys), keys)
+        last_starts = group_starts(partial, keys)
+        last = int(last_starts[-1])
+        if last:
+            yield reducer.finalize(partial.take(slice(0, last)))
+        carry = partial.take(slice(last, len(partial)))
+    if carry is not None:
+        yield reducer.finalize(carry)
+
+
+# Execution
+
+
+def execute(operation: ops.Operation, inputs: tp.List[TBatchesIterable], kwargs: tp.Dict[str, tp.Any],
+            batch_size: int = DEFAULT_BATCH_SIZE) -> TBatchesIterable:
+    """
+    Run operation over streams of batches. Built-in mappers and reducers are vectorized, any other operation
+    is run row by row over rows converted from batches
+    """
+    if isinstance(operation, BatchSource):
+        return operation.batches(batch_size)
+    elif isinstance(operation, ops.Map) and not isinstance(operation, parallel.ParallelMap):
+        # Parallel map is run row by row, so that its mapper is still applied in worker processes
+        return map_batches(operation.mapper, inputs[0], batch_size)
+    elif isinstance(operation, ops.Reduce):
+        batch_reducer = _REDUCERS.get(type(operation.reducer))
+        if batch_reducer is not None:
+            return reduce_batches(inputs[0], operation.keys, batch_reducer(operation.reducer))
+    return to_batches(operation(*[to_rows(batches) for batches in inputs], **kwargs), batch_size)
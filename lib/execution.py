@@ -0,0 +1,193 @@
+import os
+import typing as tp
+
+from . import checkpoint
+from . import columnar as columnar_engine
+from . import memory
+from . import operations as ops
+from . import planner
+from . import profiling
+from . import sinks
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph  # noqa
+
+
+TExecute = tp.Callable[[ops.Operation, tp.List[tp.Any], tp.Dict[str, tp.Any]], tp.Iterable[tp.Any]]
+
+
+def _execute_rows(operation: ops.Operation, inputs: tp.List[ops.TRowsIterable],
+                  kwargs: tp.Dict[str, tp.Any]) -> ops.TRowsIterable:
+    return operation(*inputs, **kwargs)
+
+
+class Step(tp.NamedTuple):
+    """Node of plan, in order of execution: dependencies go before their consumers"""
+    node: 'Graph'
+    # Indices of steps giving inputs of the node
+    inputs: tp.Tuple[int, ...]
+    # Number of inputs of other steps the output goes to, output of node with several consumers is fanned out
+    consumers: int
+
+
+class Plan:
+    """
+    Graph prepared for execution (see Graph.prepare): nodes are validated and laid out as steps once, so that
+    executing the plan only creates generators of operations. Nodes which produce the same rows are executed once
+    (see Graph._source_key). Plan may be executed any number of times, with new data sources every time
+    """
+    def __init__(self, graph: 'Graph', columnar: bool = False, lineage: tp.Optional[planner.TLineage] = None) -> None:
+        """
+        :param graph: graph to execute as is, i.e. already optimized
+        :param columnar: pass data between operations as column batches
+        :param lineage: nodes of graph doing work of nodes of graph which was optimized, so that profile is looked up
+            by them too (see profiling.Profile)
+        """
+        self.graph = graph
+        self.columnar = columnar
+        self.lineage = lineage
+        # Names of data sources execution needs
+        self.sources: tp.Tuple[str, ...] = ()
+        # Statistics of the last execution with profile, if any
+        self.last_profile: tp.Optional[profiling.Profile] = None
+        self.steps = self._lay_out(graph)
+
+    def _lay_out(self, graph: 'Graph') -> tp.List[Step]:
+        """Validate graph and order its nodes so that every node goes after its dependencies"""
+        nodes: tp.List['Graph'] = []
+        inputs: tp.List[tp.Tuple[int, ...]] = []
+        consumers: tp.List[int] = []
+        indices: tp.Dict[tp.Hashable, int] = {}
+        visiting: tp.Set[int] = set()
+        sources: tp.List[str] = []
+
+        def visit(node: 'Graph') -> int:
+            if not isinstance(node.operation, ops.Operation):
+                raise TypeError('Node of graph has no operation: {!r}'.format(node.operation))
+            key = node._source_key()
+            if key in indices:
+                return indices[key]
+            if id(node) in visiting:
+                raise ValueError('Graph has a cycle through {!r}'.format(node.operation))
+            visiting.add(id(node))
+            node_inputs = tuple(visit(child_graph) for child_graph in node.dependencies)
+            visiting.remove(id(node))
+            for index in node_inputs:
+                consumers[index] += 1
+            if isinstance(node.operation, ops.FromIter):
+                sources.append(node.operation.name)
+            indices[key] = len(nodes)
+            nodes.append(node)
+            inputs.append(node_inputs)
+            consumers.append(0)
+            return indices[key]
+
+        visit(graph)
+        self.sources = tuple(sources)
+        return [Step(*step) for step in zip(nodes, inputs, consumers)]
+
+    def _run(self, profile: bool = False, memory_limit: tp.Optional[int] = None,
+             checkpoint_directory: tp.Optional[str] = None,
+             source_versions: tp.Optional[tp.Mapping[str, tp.Any]] = None, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        missing = [name for name in self.sources if name not in kwargs]
+        if missing:
+            raise ValueError('Missing data sources: {}'.format(', '.join(missing)))
+        checkpoint_paths = {}
+        if checkpoint_directory is not None:
+            checkpoint_paths = self._checkpoint_paths(checkpoint_directory, source_versions or {})
+        profiler = profiling.Profiler(self.graph, self.lineage) if profile else None
+        if profiler is not None:
+            profiler.start()
+        try:
+            yield from memory.bound(self._rows(profiler, checkpoint_paths, kwargs), memory_limit)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+                self.last_profile = profiler.profile
+
+    def _rows(self, profiler: tp.Optional[profiling.Profiler], checkpoint_paths: tp.Dict[int, str],
+              kwargs: tp.Dict[str, tp.Any]) -> ops.TRowsGenerator:
+        """Rows of the last step; generators of steps are created once the first row is asked for"""
+        if self.columnar:
+            yield from columnar_engine.to_rows(self._outputs(columnar_engine.execute, False, profiler,
+                                                             checkpoint_paths, kwargs))
+        else:
+            yield from self._outputs(_execute_rows, True, profiler, checkpoint_paths, kwargs)
+
+    def _checkpoint_paths(self, directory: str, source_versions: tp.Mapping[str, tp.Any]) -> tp.Dict[int, str]:
+        """Files of checkpoints of plan by index of their step (see checkpoint.checkpoint_path)"""
+        os.makedirs(directory, exist_ok=True)
+        return {index: checkpoint.checkpoint_path(step.node, directory, source_versions)
+                for index, step in enumerate(self.steps) if isinstance(step.node.operation, checkpoint.Checkpoint)}
+
+    def _outputs(self, execute: TExecute, copy_shared: bool, profiler: tp.Optional[profiling.Profiler],
+                 checkpoint_paths: tp.Dict[int, str], kwargs: tp.Dict[str, tp.Any]) -> tp.Iterable[tp.Any]:
+        """
+        Create generators of all the steps and return output of the last one. Steps whose rows are read from
+        checkpoints instead (see checkpoint.Checkpoint) get no input, so steps before them are not run at all
+        """
+        resumed = {index for index, path in checkpoint_paths.items() if os.path.exists(path)}
+        readers = self._readers(resumed)
+        # Output of every step for each of its readers in turn
+        outputs: tp.List[tp.Iterator[tp.Iterable[tp.Any]]] = []
+        for index, (node, inputs, _) in enumerate(self.steps):
+            if not readers[index]:
+                outputs.append(iter(()))
+                continue
+            step_kwargs = kwargs
+            if index in checkpoint_paths:
+                step_kwargs = dict(kwargs, checkpoint_path=checkpoint_paths[index])
+            if index in resumed:
+                step_inputs: tp.List[tp.Iterable[tp.Any]] = [() for _ in inputs]
+            else:
+                step_inputs = [next(outputs[input_index]) for input_index in inputs]
+            output = execute(node.operation, step_inputs, step_kwargs)
+            if profiler is not None:
+                output = profiler.wrap(node, output)
+            if readers[index] > 1:
+                # Output of node is fanned out to all of its readers instead of being recomputed for each of them
+                outputs.append(iter(spill.tee(output, readers[index], copy_rows=copy_shared)))
+            else:
+                outputs.append(iter((output,)))
+        return next(outputs[-1])
+
+    def _readers(self, resumed: tp.Set[int]) -> tp.List[int]:
+        """
+        Number of inputs of other steps which read output of every step, the last step is read by the caller.
+        Unlike Step.consumers, inputs of steps which are resumed from checkpoints or are not read themselves are
+        not counted, so that tee does not keep rows for them
+        """
+        readers = [0] * len(self.steps)
+        readers[-1] = 1
+        for index in reversed(range(len(self.steps))):
+            if readers[index] and index not in resumed:
+                for input_index in self.steps[index].inputs:
+                    readers[input_index] += 1
+        return readers
+
+    def execute(self, profile: bool = False, memory_limit: tp.Optional[int] = None,
+                **sources: tp.Any) -> tp.List[ops.TRow]:
+        """
+        Execute plan over data sources, see Graph.run for the rest of parameters
+        :param sources: data sources by name, functions returning iterators of rows
+        """
+        return list(self._run(profile=profile, memory_limit=memory_limit, **sources))
+
+    def iter(self, profile: bool = False, memory_limit: tp.Optional[int] = None,
+             **sources: tp.Any) -> ops.TRowsGenerator:
+        """Execute plan and yield rows as they are produced, see execute"""
+        return self._run(profile=profile, memory_limit=memory_limit, **sources)
+
+    def write(self, sink: sinks.Sink, profile: bool = False, memory_limit: tp.Optional[int] = None,
+              **sources: tp.Any) -> int:
+        """
+        Execute plan and write rows to file as they are produced, see execute
+        :param sink: writer of rows to file, e.g. sinks.NDJSONSink
+        :return: number of rows written
+        """
+        return sink.write(self._run(profile=profile, memory_limit=memory_limit, **sources))
+
+    def describe(self) -> str:
+        """Text tree of operations of plan"""
+        return self.graph.describe()
@@ -1,49 +1,236 @@
+import heapq
+import os
+import tempfile
 import typing as tp
 
+from contextlib import ExitStack
+from itertools import groupby
 from multiprocessing import Pipe, Process, connection
 from operator import itemgetter
 
+from . import memory
 from . import operations as ops
+from . import pool
+from . import spill
+from . import transport
 
 
-def do_sort(endpoint: connection.Connection, keys: tp.Tuple[str, ...]) -> None:
-    rows = []
-    while True:
-        row = endpoint.recv()
-        if row is None:
-            break
-        rows.append(row)
-    rows.sort(key=itemgetter(*keys))
-    for row in rows:
-        endpoint.send(row)
-    endpoint.send(None)
+DEFAULT_MAX_ROWS_IN_MEMORY = 1_000_000
+DEFAULT_MAX_BYTES_IN_MEMORY = 256 * 1024 * 1024
+# Number of runs merged at once, so that number of files open during the merge is bounded
+DEFAULT_MAX_MERGE_FAN_IN = 64
+
+
+def _write_run(rows: tp.List[ops.TRow], directory: str) -> str:
+    """Dump already sorted rows to new temporary file and return its name"""
+    with tempfile.NamedTemporaryFile(mode='wb', dir=directory, suffix='.run', delete=False) as run_file:
+        spill.write_rows(rows, run_file)
+        return run_file.name
+
+
+def _read_run(filename: str) -> ops.TRowsGenerator:
+    """Stream rows back from file written by _write_run"""
+    with open(filename, 'rb') as run_file:
+        yield from spill.read_rows(run_file)
+
+
+def _merge_runs(runs: tp.List[str], key: tp.Callable[[ops.TRow], tp.Any], directory: str) -> str:
+    """Merge sorted runs into new run in the same directory, remove them and return name of the new one"""
+    with tempfile.NamedTemporaryFile(mode='wb', dir=directory, suffix='.run', delete=False) as run_file:
+        # heapq.merge prefers earlier iterables on ties, so the merge of consecutive runs is stable
+        spill.write_rows(heapq.merge(*[_read_run(run) for run in runs], key=key), run_file)
+    for run in runs:
+        os.remove(run)
+    return run_file.name
+
+
+def sort_rows(rows: ops.TRowsIterable, keys: tp.Sequence[str],
+              max_rows_in_memory: int = DEFAULT_MAX_ROWS_IN_MEMORY,
+              max_bytes_in_memory: int = DEFAULT_MAX_BYTES_IN_MEMORY,
+              max_merge_fan_in: int = DEFAULT_MAX_MERGE_FAN_IN) -> ops.TRowsGenerator:
+    """
+    External merge sort: rows are accumulated until one of the budgets is exceeded, then the buffer is sorted and
+    written to temporary file as a sorted run. Finally all runs are lazily merged with k-way merge. If there are
+    more runs than max_merge_fan_in, consecutive runs are first merged into longer runs in several passes.
+    Buffer is also spilled when memory budget of the process (see memory.limited) is exhausted.
+    Sort is stable, same as list.sort
+    :param rows: rows to sort
+    :param keys: sorting keys
+    :param max_rows_in_memory: maximum number of rows to hold in memory before spilling a run to disk
+    :param max_bytes_in_memory: approximate maximum size of buffered rows before spilling a run to disk
+    :param max_merge_fan_in: maximum number of runs merged at once, at least 2
+    """
+    if not keys:
+        yield from rows
+        return
+    key = itemgetter(*keys)
+    with ExitStack() as stack:
+        # Directory for runs is created only once the first run is spilled
+        directory: tp.Optional[str] = None
+        runs: tp.List[str] = []
+        buffer: tp.List[ops.TRow] = []
+        buffer_bytes = 0
+        reservation = memory.Reservation()
+        stack.callback(reservation.release)
+        for row in rows:
+            buffer.append(row)
+            size = memory.row_size(row)
+            buffer_bytes += size
+            pressure = not reservation.grow(size) and len(buffer) >= memory.MIN_SPILL_ROWS
+            if len(buffer) >= max_rows_in_memory or buffer_bytes >= max_bytes_in_memory or pressure:
+                if directory is None:
+                    directory = stack.enter_context(tempfile.TemporaryDirectory(prefix='comp_graph_sort_'))
+                buffer.sort(key=key)
+                runs.append(_write_run(buffer, directory))
+                buffer = []
+                buffer_bytes = 0
+                reservation.release()
+        buffer.sort(key=key)
+        if not runs:
+            yield from buffer
+            return
+        assert directory is not None
+        # The in-memory buffer takes one of the inputs of the final merge
+        while len(runs) >= max_merge_fan_in:
+            merged = []
+            for start in range(0, len(runs), max_merge_fan_in):
+                group = runs[start:start + max_merge_fan_in]
+                merged.append(_merge_runs(group, key, directory) if len(group) > 1 else group[0])
+            runs = merged
+        # The last run is merged straight from memory; heapq.merge prefers earlier iterables on ties
+        yield from heapq.merge(*[_read_run(run) for run in runs], buffer, key=key)
+
+
+def do_sort(endpoint: connection.Connection, keys: tp.Tuple[str, ...],
+            input_channel: transport.Channel, output_channel: transport.Channel,
+            max_rows_in_memory: int = DEFAULT_MAX_ROWS_IN_MEMORY,
+            max_bytes_in_memory: int = DEFAULT_MAX_BYTES_IN_MEMORY) -> None:
+    rows = input_channel.recv_rows(endpoint)
+    output_channel.send_rows(endpoint, sort_rows(rows, keys, max_rows_in_memory, max_bytes_in_memory))
+
+
+def _sort_job(endpoint: connection.Connection, input_channel: transport.Channel,
+              output_channel: transport.Channel, keys: tp.Tuple[str, ...],
+              max_rows_in_memory: int, max_bytes_in_memory: int) -> None:
+    """Job of pooled worker, see pool.WorkerPool"""
+    do_sort(endpoint, keys, input_channel, output_channel, max_rows_in_memory, max_bytes_in_memory)
 
 
 class ExternalSort(ops.Operation):
     """
     In order to not account materialization during sorting in main process memory consumption, we delegate
     sorting to a separate process.
+    The separate process does not hold all the rows either: once the memory budget is exceeded, sorted runs are
+    spilled to temporary files and merged back with k-way merge.
+    Sorting processes are warm workers of pool.default_pool, reused across sorts and graph runs. Under memory
+    budget (see memory.limited) a new process is started instead, so that it shares the budget.
     This class illustrates cross-process streaming.
     """
 
-    def __init__(self, keys: tp.Sequence[str]):
+    def __init__(self, keys: tp.Sequence[str],
+                 max_rows_in_memory: int = DEFAULT_MAX_ROWS_IN_MEMORY,
+                 max_bytes_in_memory: int = DEFAULT_MAX_BYTES_IN_MEMORY,
+                 batch_size: int = transport.DEFAULT_BATCH_SIZE,
+                 use_shared_memory: bool = False) -> None:
+        """
+        :param keys: sorting keys
+        :param max_rows_in_memory: maximum number of rows the sorting process keeps in memory
+        :param max_bytes_in_memory: approximate maximum size of rows the sorting process keeps in memory
+        :param batch_size: number of rows passed between processes at once
+        :param use_shared_memory: pass batches through shared memory ring buffer instead of pipe
+        """
         self.keys = keys
+        self.max_rows_in_memory = max_rows_in_memory
+        self.max_bytes_in_memory = max_bytes_in_memory
+        self.batch_size = batch_size
+        self.use_shared_memory = use_shared_memory
 
     def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        if not self.keys:
+            # Sorting process would stream rows back while they are still sent to it, and neither side would read
+            yield from rows
+            return
+        if memory.budget() is not None:
+            yield from self._sort_in_new_process(rows)
+            return
+        worker_pool = pool.default_pool()
+        worker = worker_pool.acquire(self.use_shared_memory)
+        completed = False
+        try:
+            worker.start_job(_sort_job, self.batch_size, tuple(self.keys), self.max_rows_in_memory,
+                             self.max_bytes_in_memory)
+            row_count_before = worker.input_channel.send_rows(worker.endpoint, rows)
+            row_count_after = 0
+            for row in worker.output_channel.recv_rows(worker.endpoint):
+                yield row
+                row_count_after += 1
+            assert row_count_before == row_count_after
+            completed = True
+        finally:
+            # Worker left in the middle of the job (e.g. output was not consumed to the end) is terminated
+            worker_pool.release(worker, reusable=completed)
+
+    def _sort_in_new_process(self, rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        input_channel = transport.make_channel(self.batch_size, self.use_shared_memory)
+        output_channel = transport.make_channel(self.batch_size, self.use_shared_memory)
         local_endpoint, remote_endpoint = Pipe()
-        process = Process(target=do_sort, args=(remote_endpoint, self.keys))
+        process = Process(target=do_sort, args=(remote_endpoint, tuple(self.keys), input_channel, output_channel,
+                                                self.max_rows_in_memory, self.max_bytes_in_memory))
         process.start()
-        row_count_before = 0
-        for row in rows:
-            local_endpoint.send(row)
-            row_count_before += 1
-        local_endpoint.send(None)
-        row_count_after = 0
-        while True:
-            local_endpoint_row = local_endpoint.recv()
-            if local_endpoint_row is None:
-                break
-            yield local_endpoint_row
-            row_count_after += 1
-        assert row_count_before == row_count_after
-        process.join()
+        try:
+            row_count_before = input_channel.send_rows(local_endpoint, rows)
+            row_count_after = 0
+            for row in output_channel.recv_rows(local_endpoint):
+                yield row
+                row_count_after += 1
+            assert row_count_before == row_count_after
+            process.join()
+        finally:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            input_channel.close()
+            output_channel.close()
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Rows are unpickled from another process, unless there are no keys and rows are passed as is
+        return inputs_owned[0] if not self.keys else True
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        return tuple(self.keys)
+
+
+class PartialSort(ops.Operation):
+    """
+    Sort of rows which are already sorted by prefix of keys: rows with equal prefix go in a row, so every such group
+    is sorted by the rest of keys on its own, in the current process. Gives the same rows as ExternalSort by keys.
+    With empty prefix it is just a sort in the current process
+    """
+    def __init__(self, keys: tp.Sequence[str], sorted_prefix: int,
+                 max_rows_in_memory: int = DEFAULT_MAX_ROWS_IN_MEMORY,
+                 max_bytes_in_memory: int = DEFAULT_MAX_BYTES_IN_MEMORY) -> None:
+        """
+        :param keys: sorting keys
+        :param sorted_prefix: number of first keys rows are already sorted by
+        :param max_rows_in_memory: maximum number of rows of group to hold in memory
+        :param max_bytes_in_memory: approximate maximum size of rows of group to hold in memory
+        """
+        self.keys = keys
+        self.sorted_prefix = sorted_prefix
+        self.max_rows_in_memory = max_rows_in_memory
+        self.max_bytes_in_memory = max_bytes_in_memory
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        if not self.sorted_prefix:
+            yield from sort_rows(rows, self.keys, self.max_rows_in_memory, self.max_bytes_in_memory)
+            return
+        rest_keys = self.keys[self.sorted_prefix:]
+        for _, group in groupby(rows, itemgetter(*self.keys[:self.sorted_prefix])):
+            yield from sort_rows(group, rest_keys, self.max_rows_in_memory, self.max_bytes_in_memory)
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Rows of groups which fit into memory are passed as is
+        return inputs_owned[0]
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        return tuple(self.keys)
@@ -1,6 +1,20 @@
 import typing as tp
+from . import checkpoint
+from . import execution
 from . import operations as ops
+from . import parallel
+from . import planner
+from . import profiling
+from . import readers
 from . import external_sort as sort
+from . import hash_join
+from . import hash_reduce
+from . import sinks
+from . import transport
+
+
+# Reducers which give single row per group
+_SINGLE_ROW_REDUCERS = (ops.Count, ops.Sum, ops.Mean, ops.FirstReducer)
 
 
 class Graph:
@@ -11,6 +25,13 @@ class Graph:
                  dependencies: tp.List['Graph']) -> None:
         self.dependencies = dependencies
         self.operation = operation
+        # Whether rows produced by the graph are referenced by nobody else and may be modified in place
+        self.owns_rows: bool = operation.output_owned([child_graph.owns_rows for child_graph in dependencies])
+        # Columns rows produced by the graph are known to be sorted by
+        self.ordering: tp.Tuple[str, ...] = operation.output_ordering(
+            [child_graph.ordering for child_graph in dependencies])
+        # Statistics of the last run with profile, if any
+        self.last_profile: tp.Optional[profiling.Profile] = None
 
     @staticmethod
     def graph_from_iter(name: str) -> 'Graph':
@@ -22,49 +43,256 @@ class Graph:
         return graph
 
     @staticmethod
-    def graph_from_file(filename: str, parser: tp.Callable[[str], ops.TRow]) -> 'Graph':
+    def graph_from_file(filename: str, parser: tp.Callable[[str], ops.TRow], workers: int = 1, ordered: bool = True,
+                        block_size: int = parallel.DEFAULT_BLOCK_SIZE) -> 'Graph':
         """Construct new graph extended with operation for reading rows from file
         :param filename: filename to read from
         :param parser: parser from string to Row
+        :param workers: number of processes to parse lines in, more than one means pool of worker processes
+        :param ordered: with workers, keep order of lines; otherwise rows are yielded as soon as they are parsed
+        :param block_size: with workers, approximate size of newline aligned block of file parsed at once in bytes
         """
-        # TODO: graph from file
-        pass
+        if workers > 1:
+            operation: ops.Operation = parallel.ParallelFromFile(filename, parser, workers, ordered=ordered,
+                                                                 block_size=block_size)
+        else:
+            operation = ops.FromFile(filename, parser)
+        graph = Graph(dependencies=[], operation=operation)
+        return graph
 
-    def map(self, mapper: ops.Mapper) -> 'Graph':
+    @staticmethod
+    def graph_from_ndjson(filename: str, schema: tp.Optional[readers.TSchema] = None,
+                          columns: tp.Optional[tp.Sequence[str]] = None) -> 'Graph':
+        """Construct new graph which reads rows from file with JSON object on every line
+        :param filename: filename to read from
+        :param schema: types of columns, e.g. {'doc_id': int, 'text': str}
+        :param columns: columns to read, all the columns of schema by default
+        """
+        return Graph(dependencies=[], operation=readers.FromNDJSON(filename, schema=schema, columns=columns))
+
+    @staticmethod
+    def graph_from_csv(filename: str, schema: tp.Optional[readers.TSchema] = None,
+                       columns: tp.Optional[tp.Sequence[str]] = None, delimiter: str = ',',
+                       header: bool = True) -> 'Graph':
+        """Construct new graph which reads rows from file of comma (or delimiter) separated values
+        :param filename: filename to read from
+        :param schema: types of columns, e.g. {'doc_id': int, 'text': str}
+        :param columns: columns to read, all the columns of schema by default
+        :param delimiter: values separator
+        :param header: whether the first line of file contains names of columns
+        """
+        operation = readers.FromCSV(filename, schema=schema, columns=columns, delimiter=delimiter, header=header)
+        return Graph(dependencies=[], operation=operation)
+
+    @staticmethod
+    def graph_from_tsv(filename: str, schema: tp.Optional[readers.TSchema] = None,
+                       columns: tp.Optional[tp.Sequence[str]] = None, header: bool = True) -> 'Graph':
+        """Construct new graph which reads rows from file of tab separated values
+        :param filename: filename to read from
+        :param schema: types of columns, e.g. {'doc_id': int, 'text': str}
+        :param columns: columns to read, all the columns of schema by default
+        :param header: whether the first line of file contains names of columns
+        """
+        operation = readers.FromTSV(filename, schema=schema, columns=columns, header=header)
+        return Graph(dependencies=[], operation=operation)
+
+    def map(self, mapper: ops.Mapper, workers: int = 1, ordered: bool = True,
+            chunk_size: int = parallel.DEFAULT_CHUNK_SIZE, max_chunks_in_flight: tp.Optional[int] = None) -> 'Graph':
         """Construct new graph extended with map operation with particular mapper
         :param mapper: mapper to use
+        :param workers: number of processes to run mapper in, more than one means pool of worker processes
+        :param ordered: with workers, keep order of rows; otherwise rows are yielded as soon as they are mapped
+        :param chunk_size: with workers, number of rows sent to worker at once
+        :param max_chunks_in_flight: with workers, maximal number of chunks being mapped and not yet yielded
         """
-        # TODO: map operating
-        pass
+        if workers > 1:
+            operation: ops.Operation = parallel.ParallelMap(mapper, workers, ordered=ordered, chunk_size=chunk_size,
+                                                            max_chunks_in_flight=max_chunks_in_flight,
+                                                            owns_rows=self.owns_rows)
+        else:
+            operation = ops.Map(mapper, owns_rows=self.owns_rows)
+        return Graph(dependencies=[self], operation=operation)
 
-    def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> 'Graph':
+    def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str], strategy: str = 'sort',
+               max_keys_in_memory: int = hash_reduce.DEFAULT_MAX_KEYS_IN_MEMORY) -> 'Graph':
         """Construct new graph extended with reduce operation with particular reducer
         :param reducer: reducer to use
         :param keys: keys for grouping
+        :param strategy: 'sort' - rows must be sorted by keys, groups are reduced one by one in keys order;
+            'hash' - rows may go in any order, groups are aggregated in hash table, output is not sorted;
+            'auto' - 'sort' if rows are sorted by keys or reducer has to keep all rows of group, 'hash' otherwise
+        :param max_keys_in_memory: number of keys in hash table after which rows are spilled to disk
         """
-        # TODO: reduct operation
-        pass
+        if strategy == 'auto':
+            strategy = 'sort' if self._sorted_by(keys) or not hash_reduce.has_accumulator(reducer) else 'hash'
+        if strategy == 'sort':
+            operation: ops.Operation = ops.Reduce(reducer, keys)
+        elif strategy == 'hash':
+            operation = hash_reduce.HashReduce(reducer, keys, max_keys_in_memory=max_keys_in_memory)
+        else:
+            raise ValueError('Unknown reduce strategy: {}'.format(strategy))
+        return Graph(dependencies=[self], operation=operation)
 
-    def sort(self, keys: tp.Sequence[str]) -> 'Graph':
+    def sort(self, keys: tp.Sequence[str],
+             max_rows_in_memory: int = sort.DEFAULT_MAX_ROWS_IN_MEMORY,
+             max_bytes_in_memory: int = sort.DEFAULT_MAX_BYTES_IN_MEMORY,
+             batch_size: int = transport.DEFAULT_BATCH_SIZE,
+             use_shared_memory: bool = False) -> 'Graph':
         """Construct new graph extended with sort operation
         :param keys: sorting keys (typical is tuple of strings)
+        :param max_rows_in_memory: number of rows after which sorted run is spilled to disk
+        :param max_bytes_in_memory: approximate size of rows after which sorted run is spilled to disk
+        :param batch_size: number of rows passed to and from sorting process at once
+        :param use_shared_memory: pass batches to and from sorting process through shared memory
         """
-        # TODO: sort operation
+        operation = sort.ExternalSort(keys, max_rows_in_memory=max_rows_in_memory,
+                                      max_bytes_in_memory=max_bytes_in_memory,
+                                      batch_size=batch_size, use_shared_memory=use_shared_memory)
+        return Graph(dependencies=[self], operation=operation)
 
-    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str]) -> 'Graph':
+    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str], strategy: str = 'sort') -> 'Graph':
         """Construct new graph extended with join operation with another graph
         :param joiner: join strategy to use
         :param join_graph: other graph to join with
         :param keys: keys for grouping
+        :param strategy: 'sort' - both graphs must be sorted by keys, output is sorted by keys too;
+            'hash' - graphs may go in any order, the one which turns out to be smaller is kept in hash table;
+            'broadcast' - join_graph is small (e.g. single row of totals) and kept in memory, this graph is streamed;
+            'auto' - 'broadcast' if join_graph is known to give single row, 'sort' if both graphs are sorted by keys,
+            'hash' otherwise
+        """
+        if strategy == 'auto':
+            if join_graph._single_row():
+                strategy = 'broadcast'
+            elif self._sorted_by(keys) and join_graph._sorted_by(keys):
+                strategy = 'sort'
+            else:
+                strategy = 'hash'
+        if strategy == 'sort':
+            operation: ops.Operation = ops.Join(joiner, keys)
+        elif strategy == 'hash':
+            operation = hash_join.HashJoin(joiner, keys)
+        elif strategy == 'broadcast':
+            operation = hash_join.HashJoin(joiner, keys, build_side=hash_join.RIGHT)
+        else:
+            raise ValueError('Unknown join strategy: {}'.format(strategy))
+        return Graph(dependencies=[self, join_graph], operation=operation)
+
+    def concat(self, *graphs: 'Graph') -> 'Graph':
+        """Construct new graph which gives rows of this graph followed by rows of other graphs
+        :param graphs: graphs to append rows of
         """
-        # TODO: join operation
+        return Graph(dependencies=[self, *graphs], operation=ops.Concat())
 
-    def _run(self, **kwargs: tp.Any) -> ops.TRowsGenerator:
+    def checkpoint(self, name: str = '') -> 'Graph':
+        """Construct new graph extended with checkpoint of rows of this graph: when graph runs with
+        checkpoint_directory, the rows are saved there once they are all computed, and run over the same data sources
+        which is restarted after failure reads them back instead of running operations before the checkpoint
+        (see checkpoint.Checkpoint)
+        :param name: name of checkpoint, prefix of its file
+        """
+        return Graph(dependencies=[self], operation=checkpoint.Checkpoint(name))
+
+    def _sorted_by(self, keys: tp.Sequence[str]) -> bool:
+        """Whether rows of graph are known to be sorted by keys"""
+        return self.ordering[:len(keys)] == tuple(keys)
+
+    def _single_row(self) -> bool:
+        """Whether graph is known to give at most one row"""
+        operation = self.operation
+        if isinstance(operation, (ops.Reduce, hash_reduce.HashReduce)):
+            return not operation.keys and isinstance(operation.reducer, _SINGLE_ROW_REDUCERS)
+        return False
+
+    def _count_consumers(self) -> tp.Dict[tp.Hashable, int]:
+        """Number of operations consuming output of every node reachable from this graph, keyed by node source key"""
+        consumers: tp.Dict[tp.Hashable, int] = {}
+        visited: tp.Set[int] = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            for child_graph in node.dependencies:
+                key = child_graph._source_key()
+                consumers[key] = consumers.get(key, 0) + 1
+                stack.append(child_graph)
+        return consumers
+
+    def _source_key(self) -> tp.Hashable:
+        """Nodes with equal keys produce the same rows, so they are executed once"""
+        if isinstance(self.operation, ops.FromIter):
+            return ops.FromIter, self.operation.name
+        return id(self)
+
+    def optimize(self) -> 'Graph':
+        """Construct equivalent graph with optimized plan (see planner), the graph itself is not changed"""
+        return planner.optimize(self)
+
+    def describe(self) -> str:
+        """Text tree of graph operations"""
+        return planner.describe(self)
+
+    def explain(self) -> str:
+        """Text trees of graph operations before and after optimization"""
+        return planner.explain(self)
+
+    def prepare(self, columnar: bool = False, optimize: bool = True, workers: int = 1) -> execution.Plan:
+        """Validate graph and build its plan once, so that it is executed many times without repeating that
+        :param columnar: pass data between operations as column batches, built-in operations are vectorized
+        :param optimize: execute optimized plan (see optimize)
+        :param workers: run sorts, reduces and joins by keys on hash partitions of rows in that many worker processes
+        """
+        lineage = planner.identity_lineage(self)
+        graph = planner.optimize(self, lineage) if optimize else self
+        if workers > 1:
+            graph = planner.partition_stages(graph, workers, lineage)
+        return execution.Plan(graph, columnar=columnar, lineage=lineage)
+
+    def _run(self, columnar: bool = False, optimize: bool = True, workers: int = 1, profile: bool = False,
+             memory_limit: tp.Optional[int] = None, checkpoint_directory: tp.Optional[str] = None,
+             source_versions: tp.Optional[tp.Mapping[str, tp.Any]] = None, **kwargs: tp.Any) -> ops.TRowsGenerator:
         """Single method to start execution; data sources passed as kwargs, returns iterable object"""
-        dependencies = [child_graph._run(**kwargs) for child_graph in self.dependencies]
-        current_generator = self.operation(*dependencies, **kwargs)
-        return current_generator
+        plan = self.prepare(columnar=columnar, optimize=optimize, workers=workers)
+        try:
+            yield from plan._run(profile=profile, memory_limit=memory_limit, checkpoint_directory=checkpoint_directory,
+                                 source_versions=source_versions, **kwargs)
+        finally:
+            if profile:
+                self.last_profile = plan.last_profile
+
+    def run(self, columnar: bool = False, optimize: bool = True, workers: int = 1, profile: bool = False,
+            memory_limit: tp.Optional[int] = None, checkpoint_directory: tp.Optional[str] = None,
+            source_versions: tp.Optional[tp.Mapping[str, tp.Any]] = None, **kwargs: tp.Any) -> tp.List[ops.TRow]:
+        """Single method to start execution; data sources passed as kwargs
+        :param columnar: pass data between operations as column batches, built-in operations are vectorized
+        :param optimize: run optimized plan (see optimize)
+        :param workers: run sorts, reduces and joins by keys on hash partitions of rows in that many worker processes
+        :param profile: collect statistics of every node of executed plan, they are kept in last_profile
+            (see profiling.Profile)
+        :param memory_limit: approximate number of bytes of rows which sorts, reduces, joins and tees may hold in
+            memory together, they spill rows to disk once it is exceeded (see memory.limited); no limit if None
+        :param checkpoint_directory: directory to save rows of checkpoints of graph in (see checkpoint), created if
+            missing; checkpoints are not used if None. Checkpoints are kept after run, remove them with
+            checkpoint.clear once they are not needed
+        :param source_versions: with checkpoint_directory, versions of data sources passed as kwargs, by name, e.g.
+            date of data or its hash; every data source checkpoints depend on must have one
+        """
+        return list(self._run(columnar=columnar, optimize=optimize, workers=workers, profile=profile,
+                              memory_limit=memory_limit, checkpoint_directory=checkpoint_directory,
+                              source_versions=source_versions, **kwargs))
+
+    def iter(self, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        """Start execution and yield rows as they are produced, so that output need not fit into memory;
+        data sources and options are the same as of run. Profile is complete once rows are iterated to the end
+        """
+        return self._run(**kwargs)
 
-    def run(self, **kwargs: tp.Any) -> tp.List[ops.TRow]:
-        """Single method to start execution; data sources passed as kwargs"""
-        return list(self._run(**kwargs))
+    def write(self, sink: sinks.Sink, **kwargs: tp.Any) -> int:
+        """Execute graph and write rows to file as they are produced
+        :param sink: writer of rows to file, e.g. sinks.NDJSONSink
+        :param kwargs: data sources and options, the same as of run
+        :return: number of rows written
+        """
+        return sink.write(self._run(**kwargs))
@@ -0,0 +1,156 @@
+import tempfile
+import typing as tp
+
+from itertools import chain, groupby, takewhile
+from operator import itemgetter
+
+from . import memory
+from . import operations as ops
+from . import spill
+
+
+LEFT = 'left'
+RIGHT = 'right'
+AUTO = 'auto'
+# Number of partitions of both sides when build side does not fit into memory budget
+DEFAULT_PARTITIONS = 16
+# Partitions are split again with another hash seed, this limits the number of times it happens
+MAX_SPILL_DEPTH = 8
+
+
+def _pick_build_side(rows_a: ops.TRowsIterable,
+                     rows_b: ops.TRowsIterable) -> tp.Tuple[str, ops.TRowsIterable, ops.TRowsIterable]:
+    """
+    Pull rows from both sides in turn until one of them ends, that side is the smaller one.
+    At most as many rows of the larger side as the smaller side has are read ahead. If memory budget of the process
+    is exhausted before that, the left side is built
+    :return: build side, the rows of build side and the rows of the other side
+    """
+    iterator_a, iterator_b = iter(rows_a), iter(rows_b)
+    buffer_a: tp.List[ops.TRow] = []
+    buffer_b: tp.List[ops.TRow] = []
+    reservation = memory.Reservation()
+    try:
+        while True:
+            row = next(iterator_a, None)
+            if row is None:
+                return LEFT, buffer_a, chain(buffer_b, iterator_b)
+            buffer_a.append(row)
+            row_b = next(iterator_b, None)
+            if row_b is None:
+                return RIGHT, buffer_b, chain(buffer_a, iterator_a)
+            buffer_b.append(row_b)
+            if (reservation.limited and not reservation.grow(memory.row_size(row) + memory.row_size(row_b))
+                    and len(buffer_a) >= memory.MIN_SPILL_ROWS):
+                return LEFT, chain(buffer_a, iterator_a), chain(buffer_b, iterator_b)
+    finally:
+        reservation.release()
+
+
+class HashJoin(ops.Operation):
+    """
+    Join which does not need sorted inputs: rows of build side are put into hash table by keys, rows of the other
+    (probe) side are streamed and looked up in it. Rows of build side whose keys were never probed are passed to
+    joiner at the end, so all the joiners give the same rows as with sort-merge Join, though in different order.
+    If build side does not fit into memory budget of the process (see memory.limited), both sides are partitioned
+    by hash of keys into temporary files and partitions are joined one by one (grace hash join). That is not done
+    for join without keys and for join which keeps order of left side (see output_ordering), e.g. broadcast join
+    """
+    def __init__(self, joiner: ops.Joiner, keys: tp.Sequence[str], build_side: str = AUTO,
+                 partitions: int = DEFAULT_PARTITIONS) -> None:
+        """
+        :param joiner: join strategy to use
+        :param keys: join keys
+        :param build_side: side kept in memory - 'left', 'right' or 'auto' for the one which turns out to be smaller
+        :param partitions: number of partitions sides are split into when build side does not fit into memory
+        """
+        if build_side not in (LEFT, RIGHT, AUTO):
+            raise ValueError('Unknown build side: {}'.format(build_side))
+        self.joiner = joiner
+        self.keys = keys
+        self.build_side = build_side
+        self.partitions = partitions
+        self._keeps_order = (build_side == RIGHT and joiner.keeps_keys
+                             and isinstance(joiner, (ops.InnerJoiner, ops.LeftJoiner)))
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        """
+        :param rows: left rows to be joined
+        :param args: contains right rows to be joined as a first element
+        """
+        build_side = self.build_side
+        if build_side == AUTO:
+            build_side, build_rows, probe_rows = _pick_build_side(rows, args[0])
+        elif build_side == LEFT:
+            build_rows, probe_rows = rows, args[0]
+        else:
+            build_rows, probe_rows = args[0], rows
+        yield from self._join(build_side, build_rows, probe_rows, 0)
+
+    def _join(self, build_side: str, build_rows: ops.TRowsIterable, probe_rows: ops.TRowsIterable,
+              depth: int) -> ops.TRowsGenerator:
+        get_key = itemgetter(*self.keys) if self.keys else (lambda row: ())
+        table: tp.Dict[tp.Any, tp.List[ops.TRow]] = {}
+        reservation = memory.Reservation()
+        partitioned = bool(self.keys) and not self._keeps_order and depth < MAX_SPILL_DEPTH
+        build_iterator = iter(build_rows)
+        del build_rows
+        for count, row in enumerate(build_iterator, 1):
+            table.setdefault(get_key(row), []).append(row)
+            if (reservation.limited and not reservation.grow(memory.row_size(row))
+                    and count >= memory.MIN_SPILL_ROWS and partitioned):
+                # Rows of every key keep their order, that is all joiners need
+                rest = chain(chain.from_iterable(table.values()), build_iterator)
+                table = {}
+                reservation.release()
+                yield from self._join_partitions(build_side, rest, probe_rows, depth)
+                return
+
+        no_rows: tp.List[ops.TRow] = []
+        probed = set()
+        # Consecutive probe rows with equal keys are passed to joiner at once
+        for key, group in groupby(probe_rows, get_key):
+            build_group = table.get(key, no_rows)
+            if build_group:
+                probed.add(key)
+            if build_side == RIGHT:
+                yield from self.joiner(self.keys, group, build_group)
+            else:
+                yield from self.joiner(self.keys, build_group, group)
+
+        for key, build_group in table.items():
+            if key in probed:
+                continue
+            if build_side == RIGHT:
+                yield from self.joiner(self.keys, no_rows, build_group)
+            else:
+                yield from self.joiner(self.keys, build_group, no_rows)
+        reservation.release()
+
+    def _join_partitions(self, build_side: str, build_rows: ops.TRowsIterable, probe_rows: ops.TRowsIterable,
+                         depth: int) -> ops.TRowsGenerator:
+        """Partition both sides by hash of keys into temporary files and join pairs of partitions one by one"""
+        get_key = itemgetter(*self.keys) if self.keys else (lambda row: ())
+        sides = []
+        for rows in (build_rows, probe_rows):
+            writers = [spill.BatchWriter(tempfile.TemporaryFile(prefix='comp_graph_join_'))
+                       for _ in range(self.partitions)]
+            for row in rows:
+                writers[hash((depth, get_key(row))) % self.partitions].write(row)
+            for writer in writers:
+                writer.flush()
+                writer.file.seek(0)
+            sides.append([writer.file for writer in writers])
+        for build_file, probe_file in zip(*sides):
+            with build_file, probe_file:
+                yield from self._join(build_side, spill.read_rows(build_file), spill.read_rows(probe_file), depth + 1)
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Joiners always build new rows
+        return True
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        # Rows of streamed left side are joined in their order. Other columns may be overwritten by the right side
+        if self._keeps_order:
+            return tuple(takewhile(lambda column: column in self.keys, inputs_ordering[0]))
+        return ()
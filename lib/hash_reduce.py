@@ -0,0 +1,394 @@
+import heapq
+import tempfile
+import typing as tp
+
+from abc import abstractmethod, ABC
+from collections import defaultdict
+from operator import itemgetter
+
+from . import memory
+from . import operations as ops
+from . import spill
+
+
+DEFAULT_MAX_KEYS_IN_MEMORY = 1_000_000
+DEFAULT_PARTITIONS = 16
+# Partitions are split again with another hash seed, this limits the number of times it happens
+MAX_SPILL_DEPTH = 8
+DEFAULT_COMBINE_MAX_KEYS = 100_000
+# Column of partial rows yielded by Combine which holds partial state of group
+PARTIAL_STATE_COLUMN = '__partial_state'
+# Approximate size of hash table entry besides its key row: the entry list, hash table slot and small state
+_ENTRY_SIZE = 256
+
+
+class Accumulator(ABC):
+    """
+    Per key state of reducer which is updated row by row, so that rows of group need not be kept.
+    States of mergeable accumulators may be computed for parts of group independently and merged afterwards
+    """
+    # Whether merge is implemented
+    mergeable = False
+    # Whether state keeps rows of group, so that they are accounted in memory budget
+    keeps_rows = False
+
+    def __init__(self, reducer: ops.Reducer) -> None:
+        self.reducer = reducer
+
+    def max_kept_rows(self) -> tp.Optional[int]:
+        """With keeps_rows, number of rows of group state keeps at most, None if all of them"""
+        return None
+
+    @abstractmethod
+    def create(self) -> tp.Any:
+        """Initial state of group"""
+        pass
+
+    @abstractmethod
+    def update(self, state: tp.Any, row: ops.TRow) -> tp.Any:
+        """Account row in state and return new state"""
+        pass
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        """Account partial state of rows which go after rows of state and return new state"""
+        raise NotImplementedError('{} is not mergeable'.format(type(self).__name__))
+
+    @abstractmethod
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow, state: tp.Any) -> ops.TRowsGenerator:
+        """
+        Yield rows of group, same as reducer does
+        :param group_key: names of key columns
+        :param key_row: values of key columns
+        :param state: state of group
+        """
+        pass
+
+
+class CountAccumulator(Accumulator):
+    reducer: ops.Count
+    mergeable = True
+
+    def create(self) -> int:
+        return 0
+
+    def update(self, state: int, row: ops.TRow) -> int:
+        return state + 1
+
+    def merge(self, state: int, other: int) -> int:
+        return state + other
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow, state: int) -> ops.TRowsGenerator:
+        result = dict(key_row)
+        result[self.reducer.column] = state
+        yield result
+
+
+class SumAccumulator(Accumulator):
+    reducer: ops.Sum
+    mergeable = True
+
+    def create(self) -> tp.Any:
+        return 0
+
+    def update(self, state: tp.Any, row: ops.TRow) -> tp.Any:
+        return state + row[self.reducer.column]
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        return state + other
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow, state: tp.Any) -> ops.TRowsGenerator:
+        result = dict(key_row)
+        result[self.reducer.column] = state
+        yield result
+
+
+class MeanAccumulator(Accumulator):
+    reducer: ops.Mean
+    mergeable = True
+
+    def create(self) -> tp.List[tp.Any]:
+        return [0, 0]
+
+    def update(self, state: tp.List[tp.Any], row: ops.TRow) -> tp.List[tp.Any]:
+        state[0] += row[self.reducer.column]
+        state[1] += 1
+        return state
+
+    def merge(self, state: tp.List[tp.Any], other: tp.List[tp.Any]) -> tp.List[tp.Any]:
+        state[0] += other[0]
+        state[1] += other[1]
+        return state
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow,
+                 state: tp.List[tp.Any]) -> ops.TRowsGenerator:
+        result = dict(key_row)
+        result[self.reducer.column] = state[0] / state[1]
+        yield result
+
+
+class TFAccumulator(Accumulator):
+    reducer: ops.TF
+    mergeable = True
+
+    def create(self) -> tp.Dict[tp.Any, int]:
+        return defaultdict(int)
+
+    def update(self, state: tp.Dict[tp.Any, int], row: ops.TRow) -> tp.Dict[tp.Any, int]:
+        state[row[self.reducer.words_column]] += 1
+        return state
+
+    def merge(self, state: tp.Dict[tp.Any, int], other: tp.Dict[tp.Any, int]) -> tp.Dict[tp.Any, int]:
+        # Words new to state are appended, so words keep order of their first appearance in the group
+        for word, count in other.items():
+            state[word] += count
+        return state
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow,
+                 state: tp.Dict[tp.Any, int]) -> ops.TRowsGenerator:
+        total = sum(state.values())
+        for word, count in state.items():
+            result = dict(key_row)
+            result[self.reducer.words_column] = word
+            result[self.reducer.result_column] = count / total
+            yield result
+
+
+class TopNAccumulator(Accumulator):
+    """Keeps heap of n largest rows; among equal values earlier rows win, same as heapq.nlargest"""
+    reducer: ops.TopN
+    keeps_rows = True
+
+    def max_kept_rows(self) -> tp.Optional[int]:
+        # Row pushed out of full heap is replaced by a row of about the same size
+        return self.reducer.n
+
+    def create(self) -> tp.List[tp.Any]:
+        # Heap of (value, -sequence number, row) and sequence counter as the last element
+        return [0]
+
+    def update(self, state: tp.List[tp.Any], row: ops.TRow) -> tp.List[tp.Any]:
+        sequence = state.pop()
+        item = (row[self.reducer.column_max], -sequence, row)
+        if len(state) < self.reducer.n:
+            heapq.heappush(state, item)
+        elif self.reducer.n:
+            heapq.heappushpop(state, item)
+        state.append(sequence + 1)
+        return state
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow,
+                 state: tp.List[tp.Any]) -> ops.TRowsGenerator:
+        for _, _, row in sorted(state[:-1], key=itemgetter(0, 1), reverse=True):
+            yield row
+
+
+class FirstAccumulator(Accumulator):
+    keeps_rows = True
+
+    def max_kept_rows(self) -> tp.Optional[int]:
+        return 1
+
+    def create(self) -> tp.Optional[ops.TRow]:
+        return None
+
+    def update(self, state: tp.Optional[ops.TRow], row: ops.TRow) -> ops.TRow:
+        return row if state is None else state
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow, state: ops.TRow) -> ops.TRowsGenerator:
+        yield state
+
+
+class GroupAccumulator(Accumulator):
+    """Fallback for arbitrary reducer: rows of group are collected and passed to reducer at the end"""
+    keeps_rows = True
+
+    def create(self) -> tp.List[ops.TRow]:
+        return []
+
+    def update(self, state: tp.List[ops.TRow], row: ops.TRow) -> tp.List[ops.TRow]:
+        state.append(row)
+        return state
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow,
+                 state: tp.List[ops.TRow]) -> ops.TRowsGenerator:
+        yield from self.reducer(group_key, state)
+
+
+class MergePartials(ops.Reducer):
+    """Reducer of partial rows yielded by Combine: merges partial states of group and yields what reducer would"""
+    def __init__(self, reducer: ops.Reducer) -> None:
+        """
+        :param reducer: reducer partial states are computed for, must be mergeable
+        """
+        self.reducer = reducer
+        self.keeps_keys = reducer.keeps_keys
+        self._accumulator = ACCUMULATORS[type(reducer)](reducer)
+
+    def __call__(self, group_key: tp.Tuple[str, ...], rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        state: tp.Any = None
+        for index, row in enumerate(rows):
+            partial = row[PARTIAL_STATE_COLUMN]
+            state = partial if index == 0 else self._accumulator.merge(state, partial)
+        yield from self._accumulator.finalize(group_key, {key: row[key] for key in group_key}, state)
+
+
+class MergeAccumulator(Accumulator):
+    """Accumulator of MergePartials, so that partial rows are merged by HashReduce too"""
+    reducer: MergePartials
+
+    def create(self) -> tp.Any:
+        return None
+
+    def update(self, state: tp.Any, row: ops.TRow) -> tp.Any:
+        partial = row[PARTIAL_STATE_COLUMN]
+        return partial if state is None else self.reducer._accumulator.merge(state, partial)
+
+    def finalize(self, group_key: tp.Tuple[str, ...], key_row: ops.TRow, state: tp.Any) -> ops.TRowsGenerator:
+        yield from self.reducer._accumulator.finalize(group_key, key_row, state)
+
+
+ACCUMULATORS: tp.Dict[tp.Type[ops.Reducer], tp.Type[Accumulator]] = {
+    ops.Count: CountAccumulator,
+    ops.Sum: SumAccumulator,
+    ops.Mean: MeanAccumulator,
+    ops.TF: TFAccumulator,
+    ops.TopN: TopNAccumulator,
+    ops.FirstReducer: FirstAccumulator,
+    MergePartials: MergeAccumulator,
+}
+
+
+def has_accumulator(reducer: ops.Reducer) -> bool:
+    """Whether reducer is aggregated without keeping rows of groups"""
+    return type(reducer) in ACCUMULATORS
+
+
+def is_mergeable(reducer: ops.Reducer) -> bool:
+    """Whether partial states of reducer may be merged, i.e. rows may be pre-aggregated by Combine"""
+    accumulator = ACCUMULATORS.get(type(reducer))
+    return accumulator is not None and accumulator.mergeable
+
+
+class Combine(ops.Operation):
+    """
+    Map side pre-aggregation: rows are aggregated into partial states per key, which are yielded as partial rows
+    of key columns and PARTIAL_STATE_COLUMN, to be merged by MergePartials after shuffle or sort. At most
+    max_keys_in_memory states are kept, once there are that many all of them are yielded and aggregation starts over,
+    so keys may have several partial rows; the same happens when memory budget of the process is exhausted.
+    Partial rows are yielded in order of first appearance of their keys
+    """
+    def __init__(self, reducer: ops.Reducer, keys: tp.Sequence[str],
+                 max_keys_in_memory: int = DEFAULT_COMBINE_MAX_KEYS) -> None:
+        """
+        :param reducer: reducer to pre-aggregate for, must be mergeable
+        :param keys: keys for grouping
+        :param max_keys_in_memory: number of keys after which partial states are yielded
+        """
+        self.reducer = reducer
+        self.keys = tuple(keys)
+        self.max_keys_in_memory = max_keys_in_memory
+        self._accumulator = ACCUMULATORS[type(reducer)](reducer)
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        accumulator = self._accumulator
+        get_key = itemgetter(*self.keys) if self.keys else (lambda row: ())
+        table: tp.Dict[tp.Any, tp.List[tp.Any]] = {}
+        reservation = memory.Reservation()
+        pressure = False
+        for row in rows:
+            key = get_key(row)
+            entry = table.get(key)
+            if entry is None:
+                if len(table) >= self.max_keys_in_memory or pressure:
+                    yield from self._partial_rows(table)
+                    table = {}
+                    reservation.release()
+                    pressure = False
+                entry = table[key] = [{name: row[name] for name in self.keys}, accumulator.create()]
+                if reservation.limited:
+                    pressure = (not reservation.grow(memory.row_size(entry[0]) + _ENTRY_SIZE)
+                                and len(table) >= memory.MIN_SPILL_ROWS)
+            entry[1] = accumulator.update(entry[1], row)
+        reservation.release()
+        yield from self._partial_rows(table)
+
+    @staticmethod
+    def _partial_rows(table: tp.Dict[tp.Any, tp.List[tp.Any]]) -> ops.TRowsGenerator:
+        for key_row, state in table.values():
+            key_row[PARTIAL_STATE_COLUMN] = state
+            yield key_row
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        return True
+
+
+class HashReduce(ops.Operation):
+    """
+    Reduce which does not need sorted input: rows are aggregated into hash table of per key states.
+    Once the table has max_keys_in_memory keys or memory budget of the process (see memory.limited) is exhausted,
+    rows of new keys are partitioned by hash into temporary files, which are aggregated one by one afterwards
+    (hybrid hash aggregation). Rows of keys which are in the table already stay in memory, so reducers without
+    accumulator may still exceed the budget with large groups.
+    Groups are yielded in order of first appearance of their keys within each partition, not sorted
+    """
+    def __init__(self, reducer: ops.Reducer, keys: tp.Sequence[str],
+                 max_keys_in_memory: int = DEFAULT_MAX_KEYS_IN_MEMORY, partitions: int = DEFAULT_PARTITIONS) -> None:
+        """
+        :param reducer: reducer to use, reducers without accumulator keep all rows of group until the end
+        :param keys: keys for grouping
+        :param max_keys_in_memory: number of keys in hash table after which rows of new keys are spilled
+        :param partitions: number of partitions spilled rows are split into
+        """
+        self.reducer = reducer
+        self.keys = tuple(keys)
+        self.max_keys_in_memory = max_keys_in_memory
+        self.partitions = partitions
+        self._accumulator = ACCUMULATORS.get(type(reducer), GroupAccumulator)(reducer)
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        yield from self._aggregate(rows, 0)
+
+    def _aggregate(self, rows: ops.TRowsIterable, depth: int) -> ops.TRowsGenerator:
+        accumulator = self._accumulator
+        get_key = itemgetter(*self.keys) if self.keys else (lambda row: ())
+        table: tp.Dict[tp.Any, tp.List[tp.Any]] = {}
+        limit = self.max_keys_in_memory if depth < MAX_SPILL_DEPTH else None
+        partitions: tp.Dict[int, spill.BatchWriter] = {}
+        reservation = memory.Reservation()
+        keeps_rows = accumulator.keeps_rows
+        max_kept_rows = accumulator.max_kept_rows()
+        pressure = False
+        for row in rows:
+            key = get_key(row)
+            entry = table.get(key)
+            size = 0
+            if entry is None:
+                if limit is not None and (len(table) >= limit or pressure):
+                    index = hash((depth, key)) % self.partitions
+                    if index not in partitions:
+                        partitions[index] = spill.BatchWriter(tempfile.TemporaryFile(prefix='comp_graph_hash_'))
+                    partitions[index].write(row)
+                    continue
+                # Key row, state and number of rows accounted as kept by state
+                entry = table[key] = [{name: row[name] for name in self.keys}, accumulator.create(), 0]
+                size = memory.row_size(entry[0]) + _ENTRY_SIZE
+            entry[1] = accumulator.update(entry[1], row)
+            if reservation.limited and (size or keeps_rows):
+                if keeps_rows and (max_kept_rows is None or entry[2] < max_kept_rows):
+                    entry[2] += 1
+                    size += memory.row_size(row)
+                pressure = not reservation.grow(size) and len(table) >= memory.MIN_SPILL_ROWS
+        for key_row, state, _ in table.values():
+            yield from accumulator.finalize(self.keys, key_row, state)
+        table.clear()
+        reservation.release()
+        for index in sorted(partitions):
+            writer = partitions[index]
+            writer.flush()
+            with writer.file as partition:
+                partition.seek(0)
+                yield from self._aggregate(spill.read_rows(partition), depth + 1)
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Some reducers yield rows of the group itself
+        return inputs_owned[0]
@@ -0,0 +1,143 @@
+import os
+import shutil
+import typing as tp
+
+from contextlib import ExitStack
+from functools import partial
+from itertools import groupby
+
+from . import operations as ops
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph  # noqa
+
+
+STATE_SUFFIX = '.state'
+# File naming directory of the current generation of states
+MANIFEST_NAME = 'CURRENT'
+GENERATION_PREFIX = 'generation-'
+# Column naming state of row while new rows of all the states are computed together
+STATE_COLUMN = '__state'
+
+
+class _TagState(ops.RowMapper):
+    """Name state of every row by STATE_COLUMN"""
+    def __init__(self, name: str) -> None:
+        """
+        :param name: name of state
+        """
+        self.name = name
+
+    def map_row(self, row: ops.TRow) -> ops.TRow:
+        row[STATE_COLUMN] = self.name
+        return row
+
+
+def _pop_state(row: ops.TRow) -> str:
+    """Remove name of state from row and return it"""
+    return tp.cast(str, row.pop(STATE_COLUMN))
+
+
+class IncrementalGraph:
+    """
+    Computation over input which only grows by appends. Instead of the whole input, aggregate state is kept between
+    runs: every state is computed by its graph from the new part of input and from previous rows of the state,
+    which are passed to the graph as data source named as the state itself (empty on the first run).
+    The result is computed from the new states only, so history of input is never read again.
+    States are stored in directory, encoded by codec. Every run writes all the states into directory of new
+    generation, which becomes current by single rename of manifest, so that run which fails or crashes at any point
+    leaves states of the previous run as they were.
+    All the states are computed by one graph, so that input they share is read once
+    """
+    def __init__(self, states: tp.Mapping[str, 'Graph'], result: 'Graph', directory: str) -> None:
+        """
+        :param states: graph computing new rows of every state
+        :param result: graph computing result from states, data sources are named as states
+        :param directory: directory to keep states in, created if missing
+        """
+        self.states = dict(states)
+        self.result = result
+        self.directory = directory
+
+    def _current_generation(self) -> tp.Optional[str]:
+        """Name of directory of the current states, None if states were never saved"""
+        try:
+            with open(os.path.join(self.directory, MANIFEST_NAME)) as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def state_path(self, name: str) -> tp.Optional[str]:
+        """File of the current rows of state, None if states were never saved"""
+        generation = self._current_generation()
+        if generation is None:
+            return None
+        return os.path.join(self.directory, generation, name + STATE_SUFFIX)
+
+    def read_state(self, name: str) -> ops.TRowsGenerator:
+        """Yield saved rows of state, none if state was never saved"""
+        path = self.state_path(name)
+        if path is None:
+            return
+        with open(path, 'rb') as file:
+            yield from spill.read_rows(file)
+
+    def _states_graph(self) -> 'Graph':
+        """Graph computing new rows of all the states, state of every row is named by STATE_COLUMN"""
+        graphs = [graph.map(_TagState(name)) for name, graph in self.states.items()]
+        return graphs[0].concat(*graphs[1:])
+
+    def run(self, **kwargs: tp.Any) -> tp.List[ops.TRow]:
+        """
+        Merge new part of input into states and compute result
+        :param kwargs: data sources with rows appended since the previous run
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        current = self._current_generation()
+        number = int(current[len(GENERATION_PREFIX):]) + 1 if current is not None else 1
+        generation = GENERATION_PREFIX + str(number)
+        generation_path = os.path.join(self.directory, generation)
+        # Leftover of run which crashed before its generation became current
+        shutil.rmtree(generation_path, ignore_errors=True)
+        os.makedirs(generation_path)
+        sources: tp.Dict[str, tp.Any] = {name: partial(self.read_state, name) for name in self.states}
+        try:
+            with ExitStack() as stack:
+                files = {name: stack.enter_context(open(os.path.join(generation_path, name + STATE_SUFFIX), 'wb'))
+                         for name in self.states}
+                # Concat gives rows of every state in a row
+                for name, rows in groupby(self._states_graph()._run(**kwargs, **sources), _pop_state):
+                    spill.write_rows(rows, files[name])
+                for state_file in files.values():
+                    state_file.flush()
+                    os.fsync(state_file.fileno())
+            manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+            with open(manifest_path + '.new', 'w') as file:
+                file.write(generation)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(manifest_path + '.new', manifest_path)
+        except BaseException:
+            shutil.rmtree(generation_path, ignore_errors=True)
+            raise
+        self._remove_stale_states(generation)
+        return self.result.run(**sources)
+
+    def _remove_stale_states(self, generation: str) -> None:
+        """Remove states of all the generations but the given one"""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(GENERATION_PREFIX) and name != generation:
+                shutil.rmtree(path, ignore_errors=True)
+            elif name == MANIFEST_NAME + '.new':
+                os.remove(path)
+
+    def reset(self) -> None:
+        """Drop saved states, so that the next run starts from scratch"""
+        if not os.path.isdir(self.directory):
+            return
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        self._remove_stale_states('')
@@ -0,0 +1,152 @@
+import multiprocessing
+import sys
+import typing as tp
+
+from contextlib import contextmanager
+
+
+# Bytes are taken from budget in quanta, so that shared counter is touched once per quantum, not once per row
+RESERVATION_QUANTUM = 1024 * 1024
+T = tp.TypeVar('T')
+
+# Operator under memory pressure spills only once it holds at least that many rows, so that spilled runs and
+# batches are not degenerate when budget is taken by others
+MIN_SPILL_ROWS = 1024
+
+
+def row_size(row: tp.Dict[str, tp.Any]) -> int:
+    """Cheap estimate of memory occupied by row: the dict itself plus its values (keys are usually interned)"""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+class MemoryBudget:
+    """
+    Limit of memory for rows held by operators, shared by all of them. Counter of used bytes is in shared memory,
+    so processes forked while budget is set (sorting process, workers) share the budget too
+    """
+    def __init__(self, limit: int) -> None:
+        """
+        :param limit: number of bytes operators may hold together
+        """
+        self.limit = limit
+        self._used = multiprocessing.Value('q', 0)
+
+    @property
+    def used(self) -> int:
+        return int(self._used.value)
+
+    def try_reserve(self, size: int) -> bool:
+        """Take size bytes from budget if there are that many left"""
+        with self._used.get_lock():
+            if self._used.value + size > self.limit:
+                return False
+            self._used.value += size
+            return True
+
+    def release(self, size: int) -> None:
+        with self._used.get_lock():
+            self._used.value -= size
+
+
+_budget: tp.Optional[MemoryBudget] = None
+
+
+def budget() -> tp.Optional[MemoryBudget]:
+    """Budget of the current process, None if memory is not limited"""
+    return _budget
+
+
+@contextmanager
+def limited(limit: tp.Optional[int]) -> tp.Iterator[tp.Optional[MemoryBudget]]:
+    """
+    Set budget of the current process for the duration of context. If limit is None, the current budget is kept,
+    so that graphs run by operations of limited graph (e.g. stages in worker processes) share its budget.
+    Context must not be left open across yields of generator, streams of rows are limited by bound instead
+    """
+    global _budget
+    previous = _budget
+    if limit is not None:
+        _budget = MemoryBudget(limit)
+    try:
+        yield _budget
+    finally:
+        _budget = previous
+
+
+def bound(items: tp.Iterable[T], limit: tp.Optional[int]) -> tp.Iterator[T]:
+    """
+    Iterate items (e.g. rows of graph run) under budget of their own: budget is set only while the next item is
+    computed, and budget of the caller is back whenever an item is yielded, so that streams consumed interleaved
+    never see budgets of each other. If limit is None, items are iterated under the current budget
+    """
+    global _budget
+    if limit is None:
+        yield from items
+        return
+    budget = MemoryBudget(limit)
+    iterator = iter(items)
+    try:
+        while True:
+            previous = _budget
+            _budget = budget
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _budget = previous
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            previous = _budget
+            _budget = budget
+            try:
+                close()
+            finally:
+                _budget = previous
+
+
+class Reservation:
+    """
+    Memory held by one operator, taken from budget of the process which is current when reservation is created.
+    Operator accounts rows it keeps with grow; once grow reports that budget is exhausted, operator should spill
+    the rows to disk and release the reservation. Without budget nothing is accounted at all
+    """
+    def __init__(self) -> None:
+        self.budget = _budget
+        self.size = 0
+        self._reserved = 0
+
+    @property
+    def limited(self) -> bool:
+        """Whether rows should be accounted, callers check it to skip estimating size of rows"""
+        return self.budget is not None
+
+    def grow(self, size: int) -> bool:
+        """
+        Account size bytes more held by operator
+        :return: False if budget is exhausted, the bytes are accounted anyway
+        """
+        self.size += size
+        if self.budget is None:
+            return True
+        while self.size > self._reserved:
+            if not self.budget.try_reserve(RESERVATION_QUANTUM):
+                return False
+            self._reserved += RESERVATION_QUANTUM
+        return True
+
+    def shrink(self, size: int) -> None:
+        """Account size bytes no longer held by operator"""
+        self.size -= size
+        if self.budget is not None and self._reserved - self.size > RESERVATION_QUANTUM:
+            surplus = (self._reserved - self.size) // RESERVATION_QUANTUM * RESERVATION_QUANTUM
+            self.budget.release(surplus)
+            self._reserved -= surplus
+
+    def release(self) -> None:
+        """Return all the memory to budget, e.g. after rows are spilled"""
+        if self.budget is not None:
+            self.budget.release(self._reserved)
+        self.size = self._reserved = 0
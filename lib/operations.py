@@ -3,17 +3,19 @@ import typing as tp
 from operator import itemgetter
 from string import punctuation
 from heapq import nlargest
-from itertools import groupby
+from itertools import groupby, takewhile
 from collections import defaultdict
 from datetime import datetime as dt
 from math import sin, cos, atan2, radians, log
-import copy
+from copy import copy
+
+from . import memory
 
 
 TRow = tp.Dict[str, tp.Any]
 TRowsIterable = tp.Iterable[TRow]
 TRowsGenerator = tp.Generator[TRow, None, None]
-TGroupGenerator = tp.Generator[tp.Tuple[tp.Any, TRowsGenerator], None, None]
+TGroupGenerator = tp.Generator[tp.Tuple[tp.Any, TRowsIterable], None, None]
 Coord = tp.Tuple[float, float]
 Length = float
 
@@ -25,13 +27,32 @@ def groupby_with_precheck(rows: TRowsIterable, key: tp.Any = None) -> TGroupGene
     :param rows: rows to be grouped
     :param key: key on which rows are grouped
     """
-    # TODO: write extended groupby and several tests for it in file test_operations
-    pass
+    previous_key: tp.Any = None
+    for group_key, group in groupby(rows, key):
+        if previous_key is not None and group_key < previous_key:
+            raise ValueError('Rows are not sorted by key: {} goes after {}'.format(group_key, previous_key))
+        previous_key = group_key
+        yield group_key, group
+
+
+def ordering_prefix(ordering: tp.Sequence[str], changed_columns: tp.Container[str]) -> tp.Tuple[str, ...]:
+    """
+    Ordering which still holds after some columns are changed: longest prefix of ordering without changed columns
+    :param ordering: columns rows are sorted by
+    :param changed_columns: columns whose values are changed or removed
+    """
+    return tuple(takewhile(lambda column: column not in changed_columns, ordering))
 
 
 # Table Slice
 
 
+def _repr(obj: tp.Any) -> str:
+    """Representation of operation building block by its public attributes, used for printing plans"""
+    fields = ('{}={!r}'.format(name, value) for name, value in vars(obj).items() if not name.startswith('_'))
+    return '{}({})'.format(type(obj).__name__, ', '.join(fields))
+
+
 class Operation(ABC):
     """
     Base Class (https://docs.python.org/3/library/abc.html) for every operation
@@ -43,6 +64,24 @@ class Operation(ABC):
         """
         pass
 
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        """
+        Whether rows yielded by the operation are owned by the graph, i.e. are referenced by nobody outside and
+        may be modified in place. Conservative default is no
+        :param inputs_owned: ownership of rows passed to the operation, one value per input
+        """
+        return False
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        """
+        Columns rows yielded by the operation are known to be sorted by. Conservative default is none
+        :param inputs_ordering: columns rows passed to the operation are sorted by, one value per input
+        """
+        return ()
+
+    def __repr__(self) -> str:
+        return _repr(self)
+
 
 # Operations
 
@@ -64,7 +103,11 @@ class FromIter(Operation):
         :param kwargs: contains iterator containing data with key self.name
         :return: generator of input data rows
         """
-        return copy.deepcopy(self.itergetter(kwargs)())
+        # Rows are passed as is, they belong to the caller, so mappers copy them before modifying (see Map)
+        return self.itergetter(kwargs)()
+
+    def __repr__(self) -> str:
+        return 'FromIter(name={!r})'.format(self.name)
 
 
 class FromFile(Operation):
@@ -85,12 +128,19 @@ class FromFile(Operation):
         :param kwargs: None
         :return: generator of input data rows
         """
-        # TODO: read the self.filename file and parse each string in the file using self.parser
-        pass
+        with open(self.filename) as file:
+            for line in file:
+                yield self.parser(line)
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        return True
 
 
 class Mapper(ABC):
     """Base class for mappers"""
+    # Whether mapper may modify the row passed in place; built-in mappers which never do it override this
+    in_place: bool = True
+
     @abstractmethod
     def __call__(self, row: TRow) -> TRowsGenerator:
         """
@@ -98,18 +148,154 @@ class Mapper(ABC):
         """
         pass
 
+    def output_owned(self, input_owned: bool) -> bool:
+        """
+        Whether rows yielded are owned by the graph (see Operation.output_owned)
+        :param input_owned: whether rows passed are owned by the graph
+        """
+        return input_owned or self.in_place
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        """
+        Columns rows yielded are sorted by (see Operation.output_ordering). Conservative default is none
+        :param input_ordering: columns rows passed are sorted by
+        """
+        return ()
+
+    def __repr__(self) -> str:
+        return _repr(self)
+
+
+class RowMapper(Mapper):
+    """Base class for mappers which turn every row into exactly one row"""
+    @abstractmethod
+    def map_row(self, row: TRow) -> TRow:
+        """
+        :param row: one table row
+        :return: resulting row
+        """
+        pass
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        yield self.map_row(row)
+
+
+class FusedMapper(Mapper):
+    """
+    Chain of mappers applied in a single pass. Python function specialized for the chain is generated once:
+    mappers yielding exactly one row are called directly, filters are inlined as conditions, and only the rest
+    are iterated over. Rows which are not owned are copied right before the first mapper modifying them
+    """
+    def __init__(self, mappers: tp.Sequence[Mapper], owns_rows: bool = False) -> None:
+        """
+        :param mappers: mappers to apply one after another
+        :param owns_rows: whether rows passed are owned by the graph
+        """
+        self.mappers = list(mappers)
+        self.owns_rows = owns_rows
+        # Rows which are not owned are copied inside, so rows passed are modified only if they are owned
+        self.in_place = owns_rows and any(mapper.in_place for mapper in self.mappers)
+        self.source, self._function = self._compile()
+
+    def _compile(self) -> tp.Tuple[str, tp.Callable[[TRow], TRowsGenerator]]:
+        namespace: tp.Dict[str, tp.Any] = {}
+        lines = ['def fused(row_0):']
+        indent = 1
+        owned = self.owns_rows
+        row = 'row_0'
+        for index, mapper in enumerate(self.mappers):
+            padding = '    ' * indent
+            if mapper.in_place and not owned:
+                lines.append('{}{} = dict({})'.format(padding, row, row))
+                owned = True
+            name = 'stage_{}'.format(index)
+            next_row = 'row_{}'.format(index + 1)
+            if isinstance(mapper, Filter):
+                namespace[name] = mapper.condition
+                lines.append('{}if not {}({}):'.format(padding, name, row))
+                # Nothing to skip to on the outermost level, so the generator just ends
+                lines.append('{}    {}'.format(padding, 'continue' if indent > 1 else 'return'))
+                continue
+            if isinstance(mapper, RowMapper):
+                namespace[name] = mapper.map_row
+                lines.append('{}{} = {}({})'.format(padding, next_row, name, row))
+            else:
+                namespace[name] = mapper
+                lines.append('{}for {} in {}({}):'.format(padding, next_row, name, row))
+                indent += 1
+            row = next_row
+        lines.append('{}yield {}'.format('    ' * indent, row))
+        source = '\n'.join(lines)
+        exec(compile(source, '<fused mapper>', 'exec'), namespace)
+        return source, namespace['fused']
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        return self._function(row)
+
+    def output_owned(self, input_owned: bool) -> bool:
+        return input_owned or any(mapper.in_place for mapper in self.mappers)
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        for mapper in self.mappers:
+            input_ordering = mapper.output_ordering(input_ordering)
+        return input_ordering
+
+    def __repr__(self) -> str:
+        return 'FusedMapper({})'.format(' -> '.join(map(repr, self.mappers)))
+
 
 class Map(Operation):
-    def __init__(self, mapper: Mapper) -> None:
+    def __init__(self, mapper: Mapper, owns_rows: bool = False) -> None:
+        """
+        :param mapper: mapper to apply
+        :param owns_rows: whether rows passed are owned by the graph; if not, in place mappers get copies of them
+        """
         self.mapper = mapper
+        self.owns_rows = owns_rows
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        # TODO: Apply the self.mapper to each row in rows. To simplify code use yield from
-        pass
+        if self.owns_rows or not self.mapper.in_place:
+            for row in rows:
+                yield from self.mapper(row)
+        else:
+            # Copy on write: row is copied only because mapper is going to modify it
+            for row in rows:
+                yield from self.mapper(dict(row))
+
+    def fused(self, mappers: tp.Sequence[Mapper], owns_rows: bool) -> 'Map':
+        """
+        Map of the same kind which applies mappers one after another in a single pass (see FusedMapper)
+        :param mappers: mappers to apply
+        :param owns_rows: whether rows passed are owned by the graph
+        """
+        return Map(FusedMapper(mappers, owns_rows=owns_rows), owns_rows=owns_rows)
+
+    def with_owns_rows(self, owns_rows: bool) -> 'Map':
+        """
+        The same map over rows with other ownership, e.g. once the planner rewrote operations before it
+        :param owns_rows: whether rows passed are owned by the graph
+        """
+        if owns_rows == self.owns_rows:
+            return self
+        if isinstance(self.mapper, FusedMapper):
+            # Fused mapper decides where to copy rows by their ownership, so it is generated anew
+            return self.fused(self.mapper.mappers, owns_rows)
+        rebound = copy(self)
+        rebound.owns_rows = owns_rows
+        return rebound
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        return self.mapper.output_owned(inputs_owned[0])
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        return self.mapper.output_ordering(inputs_ordering[0])
 
 
 class Reducer(ABC):
     """Base class for reducers"""
+    # Whether rows yielded keep values of key columns of their group; built-in reducers which do it override this
+    keeps_keys: bool = False
+
     @abstractmethod
     def __call__(self, group_key: tp.Tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         """
@@ -117,6 +303,9 @@ class Reducer(ABC):
         """
         pass
 
+    def __repr__(self) -> str:
+        return _repr(self)
+
 
 class Reduce(Operation):
     def __init__(self, reducer: Reducer, keys: tp.Sequence[str]) -> None:
@@ -125,14 +314,25 @@ class Reduce(Operation):
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
         if self.keys:
-            # TODO: use groupby_with_precheck for grouping rows by self.keys and then apply self.reducer to each group
-            pass
+            for _, group in groupby_with_precheck(rows, itemgetter(*self.keys)):
+                yield from self.reducer(self.keys, group)
         else:
             yield from self.reducer(self.keys, rows)
 
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Reducers may yield rows of the group itself
+        return inputs_owned[0]
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        # Groups are reduced in order of keys, though rows yielded are sorted by them only if reducer keeps keys
+        return self.keys if self.reducer.keeps_keys else ()
+
 
 class Joiner(ABC):
     """Base class for joiners"""
+    # Whether rows yielded keep values of key columns of their group; built-in joiners which do it override this
+    keeps_keys: bool = False
+
     def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2') -> None:
         self._a_suffix = suffix_a
         self._b_suffix = suffix_b
@@ -146,6 +346,21 @@ class Joiner(ABC):
         """
         pass
 
+    def __repr__(self) -> str:
+        return _repr(self)
+
+    @staticmethod
+    def _materialize(rows: TRowsIterable) -> tp.Collection[TRow]:
+        """
+        Rows of group which is iterated several times. They are kept in memory, unless memory budget of the process
+        is set (see memory.limited): then rows above the budget are spilled to disk
+        """
+        if memory.budget() is None:
+            return list(rows)
+        # Spill module depends on this one
+        from .spill import SpillableList
+        return SpillableList(rows)
+
     def _cross_join(self, a: TRow, b: TRow, keys: tp.Sequence[str]) -> TRow:
         res = {}
         for a_key, a_value in a.items():
@@ -178,44 +393,72 @@ class Join(Operation):
             left_groups = groupby_with_precheck(rows, itemgetter(*self.keys))
             right_groups = groupby_with_precheck(args[0], itemgetter(*self.keys))
             # Empty generator will be useful lately
-            enpty_gen: TRowsIterable = iter(())
-
-            lgroup_keys, l_gen = next(left_groups)
-            rgroup_keys, r_gen = next(right_groups)
-            while True:
-                # TODO: fill all the "pass" lines with code such that all the tests on join pass successfully
-                try:
-                    if rgroup_keys < lgroup_keys:
-                        pass
-                    elif rgroup_keys == lgroup_keys:
-                        pass
-                    elif rgroup_keys > lgroup_keys:
-                        pass
-                except StopIteration:
-                    break
-            if rgroup_keys > lgroup_keys:
-                pass
-            elif rgroup_keys < lgroup_keys:
-                pass
-
+            empty_gen: TRowsIterable = iter(())
+
+            left_group = next(left_groups, None)
+            right_group = next(right_groups, None)
+            while left_group is not None and right_group is not None:
+                lgroup_keys, l_gen = left_group
+                rgroup_keys, r_gen = right_group
+                if rgroup_keys < lgroup_keys:
+                    yield from self.joiner(self.keys, empty_gen, r_gen)
+                    right_group = next(right_groups, None)
+                elif rgroup_keys == lgroup_keys:
+                    yield from self.joiner(self.keys, l_gen, r_gen)
+                    left_group = next(left_groups, None)
+                    right_group = next(right_groups, None)
+                else:
+                    yield from self.joiner(self.keys, l_gen, empty_gen)
+                    left_group = next(left_groups, None)
+
+            if right_group is not None:
+                yield from self.joiner(self.keys, empty_gen, right_group[1])
+            if left_group is not None:
+                yield from self.joiner(self.keys, left_group[1], empty_gen)
             for rgroup_keys, r_gen in right_groups:
-                pass
+                yield from self.joiner(self.keys, empty_gen, r_gen)
             for lgroup_keys, l_gen in left_groups:
-                pass
+                yield from self.joiner(self.keys, l_gen, empty_gen)
         else:
             yield from self.joiner(self.keys, rows, args[0])
 
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Joiners always build new rows
+        return True
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        # Groups are joined in order of keys, though rows yielded are sorted by them only if joiner keeps keys
+        return tuple(self.keys) if self.joiner.keeps_keys else ()
+
+
+class Concat(Operation):
+    """Yield rows of all the inputs one input after another"""
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        yield from rows
+        for other_rows in args:
+            yield from other_rows
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        return all(inputs_owned)
+
 # Dummy operators
 
 
-class DummyMapper(Mapper):
+class DummyMapper(RowMapper):
     """Yield exactly the row passed"""
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        yield row
+    in_place = False
+
+    def map_row(self, row: TRow) -> TRow:
+        return row
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return input_ordering
 
 
 class FirstReducer(Reducer):
     """Yield only first row from passed ones"""
+    keeps_keys = True
+
     def __call__(self, group_key: tp.Tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         for row in rows:
             yield row
@@ -225,7 +468,7 @@ class FirstReducer(Reducer):
 # Mappers
 
 
-class FilterPunctuation(Mapper):
+class FilterPunctuation(RowMapper):
     """Left only non-punctuation symbols"""
     def __init__(self, column: str):
         """
@@ -233,17 +476,21 @@ class FilterPunctuation(Mapper):
         """
         self.column = column
 
+    _punctuation_table = str.maketrans('', '', punctuation)
+
     @staticmethod
     def _filter_punctuation(txt: str) -> str:
-        # TODO: filter all the punctuation in text
-        pass
+        return txt.translate(FilterPunctuation._punctuation_table)
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def map_row(self, row: TRow) -> TRow:
         row[self.column] = self._filter_punctuation(row[self.column])
-        yield row
+        return row
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return ordering_prefix(input_ordering, (self.column,))
 
 
-class LowerCase(Mapper):
+class LowerCase(RowMapper):
     """Replace column value with value in lower case"""
     def __init__(self, column: str):
         """
@@ -253,16 +500,20 @@ class LowerCase(Mapper):
 
     @staticmethod
     def _lower_case(txt: str) -> str:
-        # TODO: lowercase
-        pass
+        return txt.lower()
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def map_row(self, row: TRow) -> TRow:
         row[self.column] = self._lower_case(row[self.column])
-        yield row
+        return row
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return ordering_prefix(input_ordering, (self.column,))
 
 
 class Split(Mapper):
     """Split row on multiple rows by separator"""
+    in_place = False
+
     def __init__(self, column: str, separator: tp.Optional[str] = None) -> None:
         """
         :param column: name of column to split
@@ -272,54 +523,76 @@ class Split(Mapper):
         self.separator = separator
 
     def __call__(self, row: TRow) -> TRowsGenerator:
-        # TODO: splits text in row by the self.separator on words and next yield rows with word in self.separator
-       pass
+        for word in row[self.column].split(self.separator):
+            word_row = dict(row)
+            word_row[self.column] = word
+            yield word_row
 
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return ordering_prefix(input_ordering, (self.column,))
 
-class Apply(Mapper):
+
+class Apply(RowMapper):
     """Apply function f(x_1, x_2, x_3, .... x_N) to N columns"""
     def __init__(self, function: tp.Callable[..., tp.Any],
-                 columns: tp.Sequence[str], result_column: str = 'product') -> None:
+                 columns: tp.Sequence[str], result_column: str = 'product', vectorized: bool = False) -> None:
         """
         :param columns: column names to apply function
         :param result_column: column name to store the result
+        :param vectorized: function may also be applied to numpy arrays of column values (see columnar execution)
         """
         self.function = function
         self.columns = columns
         self.result_column = result_column
+        self.vectorized = vectorized
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def map_row(self, row: TRow) -> TRow:
         row[self.result_column] = self.function(*[row[col] for col in self.columns])
-        yield row
+        return row
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return ordering_prefix(input_ordering, (self.result_column,))
 
 
 class Filter(Mapper):
     """Remove records that don't satisfy some condition"""
-    def __init__(self, condition: tp.Callable[[TRow], bool]) -> None:
+    in_place = False
+
+    def __init__(self, condition: tp.Callable[[TRow], bool], vectorized: bool = False) -> None:
         """
         :param condition: if condition is not true - remove record
+        :param vectorized: condition may also be applied to mapping from column names to numpy arrays of values
+            and returns boolean array (see columnar execution)
         """
         self.condition = condition
+        self.vectorized = vectorized
 
     def __call__(self, row: TRow) -> TRowsGenerator:
-        # TODO: filter by the self.condition
-        pass
+        if self.condition(row):
+            yield row
 
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return input_ordering
 
-class Project(Mapper):
+
+class Project(RowMapper):
     """Leave only mentioned columns"""
+    in_place = False
+
     def __init__(self, columns: tp.Sequence[str]) -> None:
         """
         :param columns: names of columns
         """
         self.columns = columns
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        # TODO: project self.columns
-        pass
+    def map_row(self, row: TRow) -> TRow:
+        return {column: row[column] for column in self.columns}
 
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return tuple(takewhile(lambda column: column in self.columns, input_ordering))
 
-class IDF(Mapper):
+
+class IDF(RowMapper):
     """
     Compute inverce document frequency according to the formula:
     log( total number of docs / number of docs where term appears )
@@ -334,12 +607,15 @@ class IDF(Mapper):
         self.term_occ_number_column = term_occ_number_column
         self.result_column = result_column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        # TODO: IDF
-        pass
+    def map_row(self, row: TRow) -> TRow:
+        row[self.result_column] = log(row[self.total_number_column] / row[self.term_occ_number_column])
+        return row
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return ordering_prefix(input_ordering, (self.result_column,))
 
 
-class TF_IDF(Mapper):
+class TF_IDF(RowMapper):
     """
     Compute term frequency according to the formula:
     number of times term appears in serten doc / total number of terms in serten doc
@@ -354,15 +630,20 @@ class TF_IDF(Mapper):
         self.idf_column = idf_column
         self.result_column = result_column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        # TODO: TF_IDF
-        pass
+    def map_row(self, row: TRow) -> TRow:
+        row[self.result_column] = row[self.tf_column] * row[self.idf_column]
+        return row
+
+    def output_ordering(self, input_ordering: tp.Tuple[str, ...]) -> tp.Tuple[str, ...]:
+        return ordering_prefix(input_ordering, (self.result_column,))
 
 # Reducers
 
 
 class FilterGroup(Reducer):
     """Apply function f(x) to certain columns"""
+    keeps_keys = True
+
     def __init__(self, filter_: tp.Callable[..., tp.Any], column: str) -> None:
         """
         :param filter_: filter function which is applying inside the group
@@ -382,6 +663,8 @@ class FilterGroup(Reducer):
 
 class TopN(Reducer):
     """Calculate top N by value"""
+    keeps_keys = True
+
     def __init__(self, column: str, n: int) -> None:
         """
         :param column: column name to get top by
@@ -391,12 +674,13 @@ class TopN(Reducer):
         self.n = n
 
     def __call__(self, group_key: tp.Tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        # TODO: the best way to do it is using heapq.nlargest
-        pass
+        yield from nlargest(self.n, rows, key=itemgetter(self.column_max))
 
 
 class TF(Reducer):
     """Calculate frequency of values in column"""
+    keeps_keys = True
+
     def __init__(self, words_column: str, result_column: str = 'tf') -> None:
         """
         :param words_column: name for column with words
@@ -406,12 +690,23 @@ class TF(Reducer):
         self.result_column = result_column
 
     def __call__(self, group_key: tp.Tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        # TODO: TF
-        pass
+        total = 0
+        counts: tp.Dict[tp.Any, int] = defaultdict(int)
+        for row in rows:
+            counts[row[self.words_column]] += 1
+            total += 1
+        key_values = {key: row[key] for key in group_key}
+        for word, count in counts.items():
+            word_row = dict(key_values)
+            word_row[self.words_column] = word
+            word_row[self.result_column] = count / total
+            yield word_row
 
 
 class Mean(Reducer):
     """Mean values in column passed and yield single row as a result"""
+    keeps_keys = True
+
     def __init__(self, column: str) -> None:
         """
         :param column: name of column to sum
@@ -419,12 +714,20 @@ class Mean(Reducer):
         self.column = column
 
     def __call__(self, group_key: tp.Tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        # TODO: Mean value
-        pass
+        number = 0
+        total = 0
+        for row in rows:
+            total += row[self.column]
+            number += 1
+        mean_row = {key: row[key] for key in group_key}
+        mean_row[self.column] = total / number
+        yield mean_row
 
 
 class Count(Reducer):
     """Count rows passed and yield single row as a result"""
+    keeps_keys = True
+
     def __init__(self, column: str) -> None:
         """
         :param column: name of column to count
@@ -442,6 +745,8 @@ class Count(Reducer):
 
 class Sum(Reducer):
     """Sum values in column passed and yield single row as a result"""
+    keeps_keys = True
+
     def __init__(self, column: str) -> None:
         """
         :param column: name of column to sum
@@ -449,8 +754,12 @@ class Sum(Reducer):
         self.column = column
 
     def __call__(self, group_key: tp.Tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        # TODO: Sum
-        pass
+        total = 0
+        for row in rows:
+            total += row[self.column]
+        sum_row = {key: row[key] for key in group_key}
+        sum_row[self.column] = total
+        yield sum_row
 
 
 # Joiners
@@ -458,8 +767,10 @@ class Sum(Reducer):
 
 class InnerJoiner(Joiner):
     """Join with inner strategy"""
+    keeps_keys = True
+
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        rows_b = list(rows_b)
+        rows_b = self._materialize(rows_b)
         for a in rows_a:
             for b in rows_b:
                 yield self._cross_join(a, b, keys)
@@ -467,20 +778,43 @@ class InnerJoiner(Joiner):
 
 class OuterJoiner(Joiner):
     """Join with outer strategy"""
+    keeps_keys = True
+
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        # TODO: OuterJoiner
-        pass
+        rows_b = self._materialize(rows_b)
+        has_rows_a = False
+        for a in rows_a:
+            has_rows_a = True
+            if not rows_b:
+                yield dict(a)
+            for b in rows_b:
+                yield self._cross_join(a, b, keys)
+        if not has_rows_a:
+            for b in rows_b:
+                yield dict(b)
 
 
 class LeftJoiner(Joiner):
     """Join with left strategy"""
+    keeps_keys = True
+
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        # TODO: LeftJoiner
-        pass
+        rows_b = self._materialize(rows_b)
+        for a in rows_a:
+            if not rows_b:
+                yield dict(a)
+            for b in rows_b:
+                yield self._cross_join(a, b, keys)
 
 
 class RightJoiner(Joiner):
     """Join with right strategy"""
+    keeps_keys = True
+
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        # TODO: RightJoiner
-        pass
+        rows_a = self._materialize(rows_a)
+        for b in rows_b:
+            if not rows_a:
+                yield dict(b)
+            for a in rows_a:
+                yield self._cross_join(a, b, keys)
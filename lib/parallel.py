@@ -0,0 +1,166 @@
+import io
+import mmap
+import multiprocessing
+import os
+import typing as tp
+
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import operations as ops
+from . import transport
+
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+# Chunks in flight per worker when no explicit bound is given: one being mapped and one waiting
+DEFAULT_CHUNKS_PER_WORKER = 2
+
+# Workers are forked where possible, so that mapper is inherited and need not be picklable (e.g. lambdas in Apply)
+MP_CONTEXT = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+
+# Mapper or parser of the current worker process, set once by pool initializer instead of being sent with every task
+_worker_function: tp.Optional[tp.Callable[..., tp.Any]] = None
+
+
+def _init_worker(function: tp.Callable[..., tp.Any]) -> None:
+    global _worker_function
+    _worker_function = function
+
+
+def _map_chunk(chunk: tp.List[ops.TRow]) -> tp.List[ops.TRow]:
+    mapper = _worker_function
+    assert mapper is not None
+    return [result_row for row in chunk for result_row in mapper(row)]
+
+
+def _parse_block(filename: str, offset: int, length: int) -> tp.List[ops.TRow]:
+    parser = _worker_function
+    assert parser is not None
+    with open(filename, 'rb') as file:
+        file.seek(offset)
+        block = file.read(length)
+    # Lines are decoded the same way as by text file FromFile reads
+    return [parser(line) for line in io.TextIOWrapper(io.BytesIO(block))]
+
+
+def _pool_results(executor: ProcessPoolExecutor, tasks: tp.Iterable[tp.Tuple[tp.Any, ...]], ordered: bool,
+                  max_tasks_in_flight: int) -> ops.TRowsGenerator:
+    """
+    Submit tasks to executor and yield rows of their results. At most max_tasks_in_flight tasks are submitted and
+    not yet yielded at a time; results are yielded in order of tasks or as soon as they are ready.
+    Tasks not yet started are cancelled and executor is shut down when generator is closed
+    :param tasks: function followed by its arguments
+    """
+    in_flight: tp.Deque['Future[tp.List[ops.TRow]]'] = deque()
+
+    def next_done() -> tp.List[ops.TRow]:
+        if ordered:
+            return in_flight.popleft().result()
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        future = next(iter(done))
+        in_flight.remove(future)
+        return future.result()
+
+    try:
+        for function, *args in tasks:
+            if len(in_flight) >= max_tasks_in_flight:
+                yield from next_done()
+            in_flight.append(executor.submit(function, *args))
+        while in_flight:
+            yield from next_done()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def newline_aligned_blocks(filename: str, block_size: int) -> tp.Generator[tp.Tuple[int, int], None, None]:
+    """
+    Split file into blocks of about block_size bytes which end right after a newline (or at the end of file).
+    File is memory mapped, so only bytes around block boundaries are actually read
+    :return: offset and length of every block
+    """
+    if os.path.getsize(filename) == 0:
+        return
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        offset = 0
+        while offset < len(mapped):
+            end = mapped.find(b'\n', min(offset + block_size, len(mapped)) - 1) + 1 or len(mapped)
+            yield offset, end - offset
+            offset = end
+
+
+class ParallelMap(ops.Map):
+    """
+    Map which applies mapper in pool of worker processes. Rows are sent to workers in chunks, the number of chunks
+    sent but not yet consumed is bounded, so that fast producer does not flood slow consumer and vice versa.
+    Rows are pickled on the way, so workers always get rows of their own and mapper may modify them in place
+    """
+    def __init__(self, mapper: ops.Mapper, workers: int, ordered: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_chunks_in_flight: tp.Optional[int] = None, owns_rows: bool = False) -> None:
+        """
+        :param mapper: mapper to apply
+        :param workers: number of worker processes
+        :param ordered: yield rows in order of input rows; otherwise chunks are yielded as soon as they are mapped
+        :param chunk_size: number of rows sent to worker at once
+        :param max_chunks_in_flight: maximal number of chunks submitted to workers and not yet yielded,
+            DEFAULT_CHUNKS_PER_WORKER per worker by default
+        :param owns_rows: whether rows passed are owned by the graph, does not matter for workers
+        """
+        super().__init__(mapper, owns_rows=owns_rows)
+        self.workers = workers
+        self.ordered = ordered
+        self.chunk_size = chunk_size
+        self.max_chunks_in_flight = max_chunks_in_flight or DEFAULT_CHUNKS_PER_WORKER * workers
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        executor = ProcessPoolExecutor(self.workers, mp_context=MP_CONTEXT,
+                                       initializer=_init_worker, initargs=(self.mapper,))
+        tasks = ((_map_chunk, chunk) for chunk in transport.batched(rows, self.chunk_size))
+        yield from _pool_results(executor, tasks, self.ordered, self.max_chunks_in_flight)
+
+    def fused(self, mappers: tp.Sequence[ops.Mapper], owns_rows: bool) -> ops.Map:
+        # Rows are owned by workers, so mappers need not copy them
+        return ParallelMap(ops.FusedMapper(mappers, owns_rows=True), self.workers, ordered=self.ordered,
+                           chunk_size=self.chunk_size, max_chunks_in_flight=self.max_chunks_in_flight,
+                           owns_rows=owns_rows)
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Rows are unpickled from worker processes
+        return True
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        if not self.ordered:
+            return ()
+        return self.mapper.output_ordering(inputs_ordering[0])
+
+
+class ParallelFromFile(ops.FromFile):
+    """
+    FromFile which parses lines in pool of worker processes. File is split into newline aligned blocks, every
+    worker reads and parses whole blocks on its own, so only parsed rows are passed between processes
+    """
+    def __init__(self, filename: str, parser: tp.Callable[[str], ops.TRow], workers: int, ordered: bool = True,
+                 block_size: int = DEFAULT_BLOCK_SIZE, max_blocks_in_flight: tp.Optional[int] = None) -> None:
+        """
+        :param filename: name of file to read
+        :param parser: parser from line to row
+        :param workers: number of worker processes
+        :param ordered: yield rows in order of lines; otherwise blocks are yielded as soon as they are parsed
+        :param block_size: approximate size of block parsed at once in bytes
+        :param max_blocks_in_flight: maximal number of blocks being parsed and not yet yielded,
+            DEFAULT_CHUNKS_PER_WORKER per worker by default
+        """
+        super().__init__(filename, parser)
+        self.workers = workers
+        self.ordered = ordered
+        self.block_size = block_size
+        self.max_blocks_in_flight = max_blocks_in_flight or DEFAULT_CHUNKS_PER_WORKER * workers
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        executor = ProcessPoolExecutor(self.workers, mp_context=MP_CONTEXT,
+                                       initializer=_init_worker, initargs=(self.parser,))
+        tasks = ((_parse_block, self.filename, offset, length)
+                 for offset, length in newline_aligned_blocks(self.filename, self.block_size))
+        yield from _pool_results(executor, tasks, self.ordered, self.max_blocks_in_flight)
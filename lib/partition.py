@@ -0,0 +1,124 @@
+import heapq
+import tempfile
+import typing as tp
+
+from functools import partial
+from multiprocessing import connection
+from operator import itemgetter
+
+from . import operations as ops
+from . import parallel
+from . import spill
+from . import transport
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph  # noqa
+
+
+def input_name(index: int) -> str:
+    """Name of data source of stage graph which reads index-th input of partitioned stage"""
+    return '__partition_input_{}'.format(index)
+
+
+def _run_partition(endpoint: connection.Connection, channel: transport.Channel, stage: 'Graph', inputs: int) -> None:
+    """
+    Worker process: receive rows of partition, run stage over them and send result back.
+    Every input is spilled to disk while it is received, so that the result is sent only after all the rows of
+    partition are received, whatever the stage does, and sending and receiving never wait for each other
+    """
+    files: tp.List[tp.IO[bytes]] = []
+    try:
+        for _ in range(inputs):
+            file = tempfile.TemporaryFile(prefix='comp_graph_partition_')
+            files.append(file)
+            spill.write_rows(channel.recv_rows(endpoint), file)
+            file.seek(0)
+        sources: tp.Dict[str, tp.Any] = {input_name(index): partial(spill.read_rows, spilled)
+                                         for index, spilled in enumerate(files)}
+        channel.send_rows(endpoint, stage._run(optimize=False, **sources))
+    finally:
+        for spilled in files:
+            spilled.close()
+
+
+class Partitioned(ops.Operation):
+    """
+    MapReduce style shuffle: rows of every input are hash partitioned by keys among worker processes, each worker
+    runs the stage over rows of its partition and results are merged back. Rows with equal keys get into the same
+    partition, so for stages grouping rows by keys (sort, reduce, join) the result is the same as of the stage
+    over all the rows. If the stage yields rows sorted, partition results are merged by the same columns
+    """
+    def __init__(self, stage: 'Graph', keys: tp.Sequence[str], workers: int,
+                 batch_size: int = transport.DEFAULT_BATCH_SIZE) -> None:
+        """
+        :param stage: graph to run on every partition, its data sources are named by input_name
+        :param keys: partitioning keys, the same for all inputs
+        :param workers: number of partitions and worker processes
+        :param batch_size: number of rows passed to and from workers at once
+        """
+        self.stage = stage
+        self.keys = keys
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        inputs = [rows, *args]
+        channel = transport.Channel(self.batch_size)
+        endpoints: tp.List[connection.Connection] = []
+        processes: tp.List[tp.Any] = []
+        try:
+            for _ in range(self.workers):
+                local_endpoint, remote_endpoint = parallel.MP_CONTEXT.Pipe()
+                process = parallel.MP_CONTEXT.Process(target=_run_partition,
+                                                      args=(remote_endpoint, channel, self.stage, len(inputs)))
+                process.start()
+                # Only the worker holds its end, so that reading fails instead of hanging if the worker dies
+                remote_endpoint.close()
+                endpoints.append(local_endpoint)
+                processes.append(process)
+
+            for input_rows in inputs:
+                self._shuffle(input_rows, channel, endpoints)
+
+            outputs = [channel.recv_rows(endpoint) for endpoint in endpoints]
+            if self.stage.ordering:
+                yield from heapq.merge(*outputs, key=itemgetter(*self.stage.ordering))
+            else:
+                for output in outputs:
+                    yield from output
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            for endpoint in endpoints:
+                endpoint.close()
+
+    def _shuffle(self, rows: ops.TRowsIterable, channel: transport.Channel,
+                 endpoints: tp.List[connection.Connection]) -> None:
+        """Send every row to the worker of its partition, followed by end of stream mark"""
+        get_key = itemgetter(*self.keys)
+        batches: tp.List[tp.List[ops.TRow]] = [[] for _ in endpoints]
+        for row in rows:
+            index = hash(get_key(row)) % len(endpoints)
+            batch = batches[index]
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                channel.send_batch(endpoints[index], batch)
+                batches[index] = []
+        for endpoint, batch in zip(endpoints, batches):
+            if batch:
+                channel.send_batch(endpoint, batch)
+            channel.send_end(endpoint)
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        # Rows are unpickled from worker processes
+        return True
+
+    def output_ordering(self, inputs_ordering: tp.Sequence[tp.Tuple[str, ...]]) -> tp.Tuple[str, ...]:
+        return self.stage.ordering
+
+    def __repr__(self) -> str:
+        return 'Partitioned(workers={}, keys={!r}, stage={!r})'.format(self.workers, self.keys, self.stage.operation)
@@ -0,0 +1,274 @@
+import typing as tp
+
+from . import external_sort as sort
+from . import hash_join
+from . import hash_reduce
+from . import operations as ops
+from . import parallel
+from . import partition
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph  # noqa
+
+
+TRewrite = tp.Callable[['Graph', tp.List['Graph']], 'Graph']
+# Node of rewritten graph which does work of node of original graph, keyed by id of the original node, which is kept
+# along, so that the id stays valid
+TLineage = tp.Dict[int, tp.Tuple['Graph', 'Graph']]
+
+
+def rewrite(graph: 'Graph', rewrite_node: TRewrite, lineage: tp.Optional[TLineage] = None) -> 'Graph':
+    """
+    Build new graph by rewriting every node bottom-up, original graph is left untouched. Nodes shared by several
+    consumers stay shared. Maps over rewritten nodes learn anew whether rows passed are owned by the graph (see
+    rebind_map), so that they never modify rows of the caller
+    :param graph: graph to rewrite
+    :param rewrite_node: gets original node and already rewritten dependencies, returns rewritten node
+    :param lineage: nodes of graph doing work of nodes of user graph (see identity_lineage), updated to nodes of new
+        graph. Rewritten dependency which is left out of the new graph (e.g. map fused into its consumer, sort done
+        within partitions) is done by the node which left it out
+    """
+    rewritten: tp.Dict[int, 'Graph'] = {}
+    # Rewritten nodes by id of rewritten dependency they were built from
+    consumers: tp.Dict[int, 'Graph'] = {}
+
+    def visit(node: 'Graph') -> 'Graph':
+        if id(node) not in rewritten:
+            dependencies = [visit(child_graph) for child_graph in node.dependencies]
+            rewritten[id(node)] = rebind_map(rewrite_node(node, dependencies))
+            for dependency in dependencies:
+                consumers.setdefault(id(dependency), rewritten[id(node)])
+        return rewritten[id(node)]
+
+    result = visit(graph)
+    if lineage is not None:
+        kept = _node_ids(result)
+        for key, (original, node) in lineage.items():
+            target = rewritten[id(node)]
+            while id(target) not in kept:
+                target = consumers[id(target)]
+            lineage[key] = original, target
+    return result
+
+
+def identity_lineage(graph: 'Graph') -> TLineage:
+    """Lineage of graph which is not rewritten yet: every node does its own work"""
+    return {id(node): (node, node) for node in _nodes(graph)}
+
+
+def _nodes(graph: 'Graph') -> tp.List['Graph']:
+    nodes: tp.Dict[int, 'Graph'] = {}
+    stack = [graph]
+    while stack:
+        node = stack.pop()
+        if id(node) not in nodes:
+            nodes[id(node)] = node
+            stack.extend(node.dependencies)
+    return list(nodes.values())
+
+
+def _node_ids(graph: 'Graph') -> tp.Set[int]:
+    return {id(node) for node in _nodes(graph)}
+
+
+def rebind_map(node: 'Graph') -> 'Graph':
+    """
+    Node itself, or the same map node with ownership of rows passed taken from its dependency: owns_rows of map is
+    computed once the map is added to graph, so it is stale once the planner rewrote operations before the map
+    """
+    operation = node.operation
+    if not isinstance(operation, ops.Map) or operation.owns_rows == node.dependencies[0].owns_rows:
+        return node
+    return type(node)(operation=operation.with_owns_rows(node.dependencies[0].owns_rows),
+                      dependencies=node.dependencies)
+
+
+def with_dependencies(node: 'Graph', dependencies: tp.List['Graph']) -> 'Graph':
+    """Same node over new dependencies, or node itself if dependencies are the same"""
+    if all(new is old for new, old in zip(dependencies, node.dependencies)):
+        return node
+    return type(node)(operation=node.operation, dependencies=dependencies)
+
+
+def fuse_maps(graph: 'Graph', lineage: tp.Optional[TLineage] = None) -> 'Graph':
+    """Collapse chains of map operations into single map with fused mapper"""
+    consumers = graph._count_consumers()
+
+    def fuse(node: 'Graph', dependencies: tp.List['Graph']) -> 'Graph':
+        if not isinstance(node.operation, ops.Map) or not dependencies:
+            return with_dependencies(node, dependencies)
+        child_graph = dependencies[0]
+        # Output of map consumed by somebody else must be computed anyway
+        if not isinstance(child_graph.operation, ops.Map) or consumers.get(node.dependencies[0]._source_key()) != 1:
+            return with_dependencies(node, dependencies)
+        child_mapper = child_graph.operation.mapper
+        if isinstance(child_mapper, ops.FusedMapper):
+            mappers = child_mapper.mappers
+        else:
+            mappers = [child_mapper]
+        # Fused map runs in worker processes if either of maps does
+        kind = node.operation if isinstance(node.operation, parallel.ParallelMap) else child_graph.operation
+        operation = kind.fused(mappers + [node.operation.mapper], owns_rows=child_graph.operation.owns_rows)
+        return type(node)(operation=operation, dependencies=child_graph.dependencies)
+
+    return rewrite(graph, fuse, lineage)
+
+
+def remove_redundant_sorts(graph: 'Graph', lineage: tp.Optional[TLineage] = None) -> 'Graph':
+    """
+    Drop sorts of rows which are already sorted by sort keys, and replace sorts of rows which are already sorted
+    by prefix of sort keys with sorts within groups of equal prefix (see Graph.ordering)
+    """
+    def remove(node: 'Graph', dependencies: tp.List['Graph']) -> 'Graph':
+        if not isinstance(node.operation, sort.ExternalSort):
+            return with_dependencies(node, dependencies)
+        keys = tuple(node.operation.keys)
+        ordering = dependencies[0].ordering
+        if ordering[:len(keys)] == keys:
+            return dependencies[0]
+        sorted_prefix = 0
+        while sorted_prefix < min(len(keys), len(ordering)) and keys[sorted_prefix] == ordering[sorted_prefix]:
+            sorted_prefix += 1
+        if not sorted_prefix:
+            return with_dependencies(node, dependencies)
+        operation = sort.PartialSort(keys, sorted_prefix, max_rows_in_memory=node.operation.max_rows_in_memory,
+                                     max_bytes_in_memory=node.operation.max_bytes_in_memory)
+        return type(node)(operation=operation, dependencies=dependencies)
+
+    return rewrite(graph, remove, lineage)
+
+
+def insert_combiners(graph: 'Graph', lineage: tp.Optional[TLineage] = None) -> 'Graph':
+    """
+    Pre-aggregate rows before sorts consumed only by reduces with mergeable reducers (see hash_reduce.Combine),
+    so that partial rows are sorted instead of all the rows, and reduce merges them
+    """
+    consumers = graph._count_consumers()
+
+    def combine(node: 'Graph', dependencies: tp.List['Graph']) -> 'Graph':
+        operation = node.operation
+        if not isinstance(operation, ops.Reduce) or not hash_reduce.is_mergeable(operation.reducer):
+            return with_dependencies(node, dependencies)
+        child_graph = dependencies[0]
+        child_operation = child_graph.operation
+        # Partial rows have key columns only, so sort by more columns can not be kept
+        if not isinstance(child_operation, sort.ExternalSort) or \
+                tuple(child_operation.keys) != tuple(operation.keys) or \
+                consumers.get(node.dependencies[0]._source_key()) != 1:
+            return with_dependencies(node, dependencies)
+        combined = type(node)(operation=hash_reduce.Combine(operation.reducer, operation.keys),
+                              dependencies=child_graph.dependencies)
+        sorted_partials = type(node)(operation=child_operation, dependencies=[combined])
+        return type(node)(operation=ops.Reduce(hash_reduce.MergePartials(operation.reducer), operation.keys),
+                          dependencies=[sorted_partials])
+
+    return rewrite(graph, combine, lineage)
+
+
+_KEYED_STAGES = (ops.Reduce, ops.Join, hash_reduce.HashReduce, hash_join.HashJoin)
+
+
+# Sorts are removed first, so that maps around them are fused and only sorts really done get combiners
+PASSES: tp.List[tp.Callable[['Graph', tp.Optional[TLineage]], 'Graph']] = [
+    remove_redundant_sorts, insert_combiners, fuse_maps]
+
+
+def optimize(graph: 'Graph', lineage: tp.Optional[TLineage] = None) -> 'Graph':
+    """
+    Apply all the optimization passes
+    :param lineage: nodes of graph doing work of nodes of user graph, updated to nodes of optimized graph (see rewrite)
+    """
+    for optimization_pass in PASSES:
+        graph = optimization_pass(graph, lineage)
+    return graph
+
+
+def describe(graph: 'Graph', annotate: tp.Optional[tp.Callable[['Graph'], str]] = None) -> str:
+    """
+    Text tree of graph operations, from the final operation down to data sources. Nodes shared by several
+    consumers are printed once and referenced by number afterwards
+    :param annotate: gives text appended to line of node
+    """
+    consumers = graph._count_consumers()
+    numbers: tp.Dict[tp.Hashable, int] = {}
+    lines: tp.List[str] = []
+
+    def visit(node: 'Graph', prefix: str, child_prefix: str) -> None:
+        key = node._source_key()
+        label = repr(node.operation)
+        if key in numbers:
+            lines.append('{}[#{}] (shared, see above)'.format(prefix, numbers[key]))
+            return
+        if consumers.get(key, 0) > 1:
+            numbers[key] = len(numbers) + 1
+            label = '[#{}] {}'.format(numbers[key], label)
+        if node.ordering:
+            label += '  -- sorted by {}'.format(', '.join(node.ordering))
+        if annotate is not None:
+            label += annotate(node)
+        lines.append(prefix + label)
+        for index, child_graph in enumerate(node.dependencies):
+            last = index == len(node.dependencies) - 1
+            visit(child_graph, child_prefix + ('└─ ' if last else '├─ '), child_prefix + ('   ' if last else '│  '))
+
+    visit(graph, '', '')
+    return '\n'.join(lines)
+
+
+def partition_stages(graph: 'Graph', workers: int, lineage: tp.Optional[TLineage] = None) -> 'Graph':
+    """
+    Run sorts, reduces and joins by keys in worker processes, each on its own hash partition of rows (see
+    partition.Partitioned). Sort consumed only by reduce or join is done within partitions too. Rows of hash reduces
+    with mergeable reducers are pre-aggregated before they are sent to partitions
+    :param graph: graph to rewrite
+    :param workers: number of partitions and worker processes
+    :param lineage: nodes of graph doing work of nodes of user graph, updated to nodes of new graph (see rewrite)
+    """
+    consumers = graph._count_consumers()
+
+    def local_sort(index: int, operation: sort.ExternalSort) -> 'Graph':
+        """Stage node which sorts index-th input within partition"""
+        source = type(graph)(operation=ops.FromIter(partition.input_name(index)), dependencies=[])
+        return type(graph)(operation=sort.PartialSort(operation.keys, 0,
+                                                      max_rows_in_memory=operation.max_rows_in_memory,
+                                                      max_bytes_in_memory=operation.max_bytes_in_memory),
+                           dependencies=[source])
+
+    def stage_input(index: int, original: 'Graph', dependency: 'Graph') -> tp.Tuple['Graph', 'Graph']:
+        """Stage node which reads index-th input, and graph producing the input"""
+        operation = dependency.operation
+        if isinstance(operation, sort.ExternalSort) and consumers.get(original._source_key()) == 1:
+            return local_sort(index, operation), dependency.dependencies[0]
+        return type(graph)(operation=ops.FromIter(partition.input_name(index)), dependencies=[]), dependency
+
+    def partition_keyed(node: 'Graph', dependencies: tp.List['Graph']) -> 'Graph':
+        if not isinstance(node.operation, _KEYED_STAGES) or not node.operation.keys:
+            return with_dependencies(node, dependencies)
+        if isinstance(node.operation, hash_reduce.HashReduce) and hash_reduce.is_mergeable(node.operation.reducer):
+            reducer = node.operation.reducer
+            combined = type(node)(operation=hash_reduce.Combine(reducer, node.operation.keys),
+                                  dependencies=dependencies)
+            merge = hash_reduce.HashReduce(hash_reduce.MergePartials(reducer), node.operation.keys,
+                                           max_keys_in_memory=node.operation.max_keys_in_memory,
+                                           partitions=node.operation.partitions)
+            # Merging reduce is not mergeable itself, so it is just partitioned
+            return partition_keyed(type(node)(operation=merge, dependencies=[combined]), [combined])
+        stage_inputs = [stage_input(index, original, dependency)
+                        for index, (original, dependency) in enumerate(zip(node.dependencies, dependencies))]
+        stage = type(node)(operation=node.operation, dependencies=[stage_node for stage_node, _ in stage_inputs])
+        operation = partition.Partitioned(stage, node.operation.keys, workers)
+        return type(node)(operation=operation, dependencies=[input_graph for _, input_graph in stage_inputs])
+
+    def partition_sort(node: 'Graph', dependencies: tp.List['Graph']) -> 'Graph':
+        if not isinstance(node.operation, sort.ExternalSort) or not node.operation.keys:
+            return with_dependencies(node, dependencies)
+        operation = partition.Partitioned(local_sort(0, node.operation), node.operation.keys, workers)
+        return type(node)(operation=operation, dependencies=dependencies)
+
+    # Sorts which are left after reduces and joins took theirs
+    return rewrite(rewrite(graph, partition_keyed, lineage), partition_sort, lineage)
+
+
+def explain(graph: 'Graph') -> str:
+    """Text trees of graph before and after optimization, to check what the optimizer has changed"""
+    return 'Plan:\n{}\n\nOptimized plan:\n{}'.format(describe(graph), describe(optimize(graph)))
@@ -0,0 +1,155 @@
+import atexit
+import os
+import threading
+import typing as tp
+
+from multiprocessing import connection
+
+from . import parallel
+from . import transport
+
+
+# Number of idle workers kept per kind of worker, extra workers are stopped once their job is done
+DEFAULT_MAX_IDLE_WORKERS = 4
+
+# Job gets endpoint of the worker, its input and output channels and arguments sent with the job
+TJob = tp.Callable[..., None]
+
+
+def _serve(endpoint: connection.Connection, input_channel: transport.Channel,
+           output_channel: transport.Channel) -> None:
+    """Worker process: run jobs one after another until None is received or the pool is gone"""
+    while True:
+        try:
+            message = endpoint.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        job, batch_size, args = message
+        input_channel.batch_size = output_channel.batch_size = batch_size
+        job(endpoint, input_channel, output_channel, *args)
+
+
+class Worker:
+    """
+    Process which runs jobs of WorkerPool, one at a time. Rows are streamed to and from the job through its own
+    pair of channels over the same pipe which jobs are sent by
+    """
+    def __init__(self, use_shared_memory: bool) -> None:
+        # Shared memory channels must exist before the process is started
+        self.input_channel = transport.make_channel(use_shared_memory=use_shared_memory)
+        self.output_channel = transport.make_channel(use_shared_memory=use_shared_memory)
+        self.endpoint, remote_endpoint = parallel.MP_CONTEXT.Pipe()
+        self.process = parallel.MP_CONTEXT.Process(target=_serve, daemon=True,
+                                                   args=(remote_endpoint, self.input_channel, self.output_channel))
+        self.process.start()
+        # Only the worker holds its end, so that reading fails instead of hanging if the worker dies
+        remote_endpoint.close()
+
+    def start_job(self, job: TJob, batch_size: int, *args: tp.Any) -> None:
+        """Start job, which must be a module level function to be sent to the worker"""
+        self.input_channel.batch_size = self.output_channel.batch_size = batch_size
+        self.endpoint.send((job, batch_size, args))
+
+    def stop(self) -> None:
+        """Let the worker exit once it is done, or terminate it if it is in the middle of a job"""
+        if self.process.is_alive():
+            try:
+                self.endpoint.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=1)
+        self.terminate()
+
+    def terminate(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.endpoint.close()
+        self.input_channel.close()
+        self.output_channel.close()
+
+
+class WorkerPool:
+    """
+    Pool of warm worker processes, reused by operations across graph runs instead of starting a process per call.
+    Worker is taken for a job and returned when the job completed, so operations running at the same time get
+    workers of their own; new workers are started when there are no idle ones. Workers are forked, so jobs
+    see modules already imported, but not state changed after the worker was started
+    """
+    def __init__(self, max_idle_workers: int = DEFAULT_MAX_IDLE_WORKERS) -> None:
+        """
+        :param max_idle_workers: number of idle workers kept per kind of worker
+        """
+        self.max_idle_workers = max_idle_workers
+        self._idle: tp.Dict[bool, tp.List[Worker]] = {False: [], True: []}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self, use_shared_memory: bool = False) -> Worker:
+        """
+        Take idle worker or start a new one
+        :param use_shared_memory: worker passes rows through shared memory channels
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Worker pool is shut down')
+            idle = self._idle[use_shared_memory]
+            while idle:
+                worker = idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.terminate()
+        return Worker(use_shared_memory)
+
+    def release(self, worker: Worker, reusable: bool = True) -> None:
+        """
+        Return worker taken by acquire
+        :param reusable: whether the job completed, so that the worker waits for the next one; otherwise it is
+            terminated
+        """
+        with self._lock:
+            idle = self._idle[isinstance(worker.input_channel, transport.SharedMemoryChannel)]
+            if reusable and not self._closed and len(idle) < self.max_idle_workers:
+                idle.append(worker)
+                return
+        if reusable:
+            worker.stop()
+        else:
+            worker.terminate()
+
+    @property
+    def idle_workers(self) -> int:
+        return sum(len(idle) for idle in self._idle.values())
+
+    def shutdown(self) -> None:
+        """Stop idle workers; workers busy with jobs are stopped when they are released"""
+        with self._lock:
+            self._closed = True
+            workers = [worker for idle in self._idle.values() for worker in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self) -> 'WorkerPool':
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        self.shutdown()
+
+
+_default_pool: tp.Optional[WorkerPool] = None
+_default_pool_pid: tp.Optional[int] = None
+
+
+def default_pool() -> WorkerPool:
+    """Pool shared by all the graphs run by the current process, it is shut down at exit"""
+    global _default_pool, _default_pool_pid
+    # Forked process (e.g. partition worker) must not use workers of its parent
+    if _default_pool is None or _default_pool_pid != os.getpid():
+        _default_pool = WorkerPool()
+        _default_pool_pid = os.getpid()
+        atexit.register(_default_pool.shutdown)
+    return _default_pool
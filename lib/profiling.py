@@ -0,0 +1,147 @@
+import threading
+import time
+import typing as tp
+
+import psutil
+
+from . import planner
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph  # noqa
+
+
+# Interval of sampling resident set size of the process, in seconds
+RSS_SAMPLING_INTERVAL = 0.005
+
+
+class NodeProfile:
+    """
+    Statistics of one node of graph. Times and spilled bytes are of the node itself, without its dependencies;
+    peak RSS is the largest resident set size of the process seen while the node or its dependencies were running.
+    Work done in other processes (sorting process, worker pools, partitions) counts as time spent waiting for them
+    and is not included in CPU time and spilled bytes
+    """
+    def __init__(self) -> None:
+        self.rows_in = 0
+        self.rows_out = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.spilled_bytes = 0
+        self.peak_rss = 0
+
+    def __repr__(self) -> str:
+        return 'rows {} -> {}, wall {:.3f}s, cpu {:.3f}s, spilled {}B, peak rss {:.1f}MB'.format(
+            self.rows_in, self.rows_out, self.wall_time, self.cpu_time, self.spilled_bytes, self.peak_rss / 2 ** 20)
+
+
+class Profile:
+    """
+    Statistics of every node of executed graph, keyed by node. Nodes of graph which was optimized are looked up by
+    nodes of the executed plan doing their work (see planner.rewrite), e.g. map fused with others gets statistics
+    of the fused map, and sort which was removed gets statistics of the node it was removed after
+    """
+    def __init__(self, graph: 'Graph', lineage: tp.Optional[planner.TLineage] = None) -> None:
+        """
+        :param graph: graph which was executed, i.e. optimized plan if graph was optimized
+        :param lineage: nodes of graph doing work of nodes of graph which was optimized
+        """
+        self.graph = graph
+        self.lineage = lineage or {}
+        self.nodes: tp.Dict[tp.Hashable, NodeProfile] = {}
+
+    def _key(self, node: 'Graph') -> tp.Hashable:
+        origin = self.lineage.get(id(node))
+        if origin is not None and origin[0] is node:
+            node = origin[1]
+        # Nodes which produce the same rows are executed once (see Graph._source_key), so they share statistics
+        return node._source_key()
+
+    def __getitem__(self, node: 'Graph') -> NodeProfile:
+        return self.nodes[self._key(node)]
+
+    def __contains__(self, node: 'Graph') -> bool:
+        return self._key(node) in self.nodes
+
+    def describe(self) -> str:
+        """Text tree of graph operations with statistics of every node"""
+        return planner.describe(self.graph, lambda node: '  -- {!r}'.format(self[node]) if node in self else '')
+
+
+class Profiler:
+    """
+    Collects Profile of single graph execution. Every node output is wrapped, so that time of every step of its
+    generator is measured; time of dependencies pulled during the step is subtracted from it
+    """
+    def __init__(self, graph: 'Graph', lineage: tp.Optional[planner.TLineage] = None) -> None:
+        self.profile = Profile(graph, lineage)
+        self._process = psutil.Process()
+        # Statistics of nodes whose steps are running, innermost last, and time of dependencies of every step
+        self._stack: tp.List[NodeProfile] = []
+        self._dependencies_time: tp.List[tp.List[float]] = []
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Finish collecting, profile is complete afterwards"""
+        self._stopped.set()
+        self._sampler.join()
+        self._count_rows_in()
+
+    def wrap(self, node: 'Graph', items: tp.Iterable[tp.Any]) -> tp.Generator[tp.Any, None, None]:
+        """Yield output items (rows or column batches) of node, accounting the time they take"""
+        stats = self.profile.nodes.setdefault(node._source_key(), NodeProfile())
+        iterator = iter(items)
+        while True:
+            self._enter(stats)
+            wall_start, cpu_start, spilled_start = time.perf_counter(), time.process_time(), spill.spilled_bytes
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit(stats, time.perf_counter() - wall_start, time.process_time() - cpu_start,
+                           spill.spilled_bytes - spilled_start)
+            stats.rows_out += 1 if isinstance(item, dict) else len(item)
+            yield item
+
+    def _enter(self, stats: NodeProfile) -> None:
+        self._stack.append(stats)
+        self._dependencies_time.append([0.0, 0.0, 0])
+
+    def _exit(self, stats: NodeProfile, wall_time: float, cpu_time: float, spilled_bytes: int) -> None:
+        self._stack.pop()
+        dependencies_wall, dependencies_cpu, dependencies_spilled = self._dependencies_time.pop()
+        stats.wall_time += wall_time - dependencies_wall
+        stats.cpu_time += cpu_time - dependencies_cpu
+        stats.spilled_bytes += spilled_bytes - int(dependencies_spilled)
+        if self._dependencies_time:
+            consumer_time = self._dependencies_time[-1]
+            consumer_time[0] += wall_time
+            consumer_time[1] += cpu_time
+            consumer_time[2] += spilled_bytes
+        # Short steps may fall between samples
+        if not stats.peak_rss:
+            stats.peak_rss = self._process.memory_info().rss
+
+    def _sample_rss(self) -> None:
+        while not self._stopped.wait(RSS_SAMPLING_INTERVAL):
+            rss = self._process.memory_info().rss
+            for stats in list(self._stack):
+                stats.peak_rss = max(stats.peak_rss, rss)
+
+    def _count_rows_in(self) -> None:
+        visited: tp.Set[tp.Hashable] = set()
+        stack = [self.profile.graph]
+        while stack:
+            node = stack.pop()
+            key = node._source_key()
+            if key in visited or node not in self.profile:
+                continue
+            visited.add(key)
+            self.profile[node].rows_in = sum(self.profile[child_graph].rows_out
+                                             for child_graph in node.dependencies if child_graph in self.profile)
+            stack.extend(node.dependencies)
@@ -0,0 +1,177 @@
+import csv
+import json
+import typing as tp
+
+from abc import abstractmethod
+from itertools import islice
+
+import numpy as np
+
+from . import columnar
+from . import operations as ops
+
+
+# Column name to its type, e.g. {'doc_id': int, 'text': str}; any callable converting raw value will do
+TSchema = tp.Mapping[str, tp.Callable[[tp.Any], tp.Any]]
+# Names of columns and their values, column by column
+TBlock = tp.Tuple[tp.List[str], tp.List[tp.List[tp.Any]]]
+
+DEFAULT_BLOCK_ROWS = 4096
+
+# Types whose columns are converted by numpy at once in columnar mode
+_DTYPES: tp.Dict[tp.Any, tp.Any] = {int: np.int64, float: np.float64}
+
+
+def _parse_bool(value: str) -> bool:
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
+class Reader(ops.Operation, columnar.BatchSource):
+    """
+    Base class for readers of files of typed records. File is read in blocks of rows, values of every column
+    of block are converted by the type of the column from schema at once. Only projected columns are converted
+    """
+    # Converters of raw values for types which can not be used as converters themselves
+    converters: tp.Dict[tp.Any, tp.Callable[[tp.Any], tp.Any]] = {}
+
+    def __init__(self, filename: str, schema: tp.Optional[TSchema] = None,
+                 columns: tp.Optional[tp.Sequence[str]] = None) -> None:
+        """
+        :param filename: name of file to read
+        :param schema: types of columns, columns not mentioned are left as read
+        :param columns: columns to read, all the columns of schema by default, or all the columns of file
+            if there is no schema either
+        """
+        self.filename = filename
+        self.schema = dict(schema or {})
+        self.columns = list(columns) if columns is not None else (list(self.schema) or None)
+
+    @abstractmethod
+    def read_blocks(self, block_rows: int) -> tp.Generator[TBlock, None, None]:
+        """
+        Yield raw values of projected columns for blocks of rows of file
+        :param block_rows: number of rows in block
+        """
+        pass
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        for names, values in self.read_blocks(DEFAULT_BLOCK_ROWS):
+            converted = [self._convert(name, column) for name, column in zip(names, values)]
+            for row_values in zip(*converted):
+                yield dict(zip(names, row_values))
+
+    def batches(self, batch_size: int) -> columnar.TBatchesGenerator:
+        for names, values in self.read_blocks(batch_size):
+            yield columnar.RecordBatch({name: self._convert_array(name, column)
+                                        for name, column in zip(names, values)})
+
+    def _convert(self, name: str, values: tp.List[tp.Any]) -> tp.List[tp.Any]:
+        column_type = self.schema.get(name)
+        if column_type is None:
+            return values
+        convert = self.converters.get(column_type, column_type)
+        # Missing values stay None whatever the type is
+        return [None if value is None else convert(value) for value in values]
+
+    def _convert_array(self, name: str, values: tp.List[tp.Any]) -> np.ndarray:
+        column_type = self.schema.get(name)
+        if column_type in _DTYPES and None not in values:
+            return np.array(values, dtype=_DTYPES[column_type])
+        return columnar.make_column(self._convert(name, values))
+
+    def output_owned(self, inputs_owned: tp.Sequence[bool]) -> bool:
+        return True
+
+
+class FromNDJSON(Reader):
+    """Read file with JSON object on every line. Values of projected columns absent from object are None"""
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        if self.columns is not None:
+            yield from super().__call__(*args, **kwargs)
+            return
+        # Nothing to project or convert, so decoded objects are rows as they are
+        decode = json.JSONDecoder().decode
+        with open(self.filename) as file:
+            for line in file:
+                if not line.isspace():
+                    yield decode(line)
+
+    def read_blocks(self, block_rows: int) -> tp.Generator[TBlock, None, None]:
+        decode = json.JSONDecoder().decode
+        with open(self.filename) as file:
+            while True:
+                objects = [decode(line) for line in islice(file, block_rows) if not line.isspace()]
+                if not objects:
+                    break
+                names = self.columns
+                if names is None:
+                    names = list(dict.fromkeys(name for obj in objects for name in obj))
+                yield names, [[obj.get(name) for obj in objects] for name in names]
+
+
+class FromCSV(Reader):
+    """Read file of delimiter separated values. Names of columns are taken from header line or from schema"""
+    converters = {bool: _parse_bool}
+    dialect: tp.Dict[str, tp.Any] = {}
+
+    def __init__(self, filename: str, schema: tp.Optional[TSchema] = None,
+                 columns: tp.Optional[tp.Sequence[str]] = None, delimiter: str = ',', header: bool = True) -> None:
+        """
+        :param filename: name of file to read
+        :param schema: types of columns, columns not mentioned are left as strings
+        :param columns: columns to read, all the columns of schema by default, or all the columns of file
+            if there is no schema either
+        :param delimiter: values separator
+        :param header: whether the first line of file contains names of columns, otherwise they are
+            the columns of schema in order
+        """
+        super().__init__(filename, schema, columns)
+        self.delimiter = delimiter
+        self.header = header
+
+    def read_blocks(self, block_rows: int) -> tp.Generator[TBlock, None, None]:
+        with open(self.filename, newline='') as file:
+            records = csv.reader(file, delimiter=self.delimiter, **self.dialect)
+            if self.header:
+                file_columns = next(records, [])
+            elif self.schema:
+                file_columns = list(self.schema)
+            else:
+                raise ValueError('Names of columns are given neither by header nor by schema')
+            names = self.columns if self.columns is not None else file_columns
+            try:
+                indices = [file_columns.index(name) for name in names]
+            except ValueError as error:
+                raise ValueError('Unknown column in {}: {}'.format(self.filename, error))
+            while True:
+                block = []
+                for record in records:
+                    # Blank lines are skipped, as FromNDJSON does
+                    if not record:
+                        continue
+                    if len(record) != len(file_columns):
+                        raise ValueError('Line {} of {} has {} values instead of {}'.format(
+                            records.line_num, self.filename, len(record), len(file_columns)))
+                    block.append(record)
+                    if len(block) >= block_rows:
+                        break
+                if not block:
+                    break
+                yield names, [[record[index] for record in block] for index in indices]
+
+
+class FromTSV(FromCSV):
+    """Read file of tab separated values, values are not quoted"""
+    dialect = {'quoting': csv.QUOTE_NONE}
+
+    def __init__(self, filename: str, schema: tp.Optional[TSchema] = None,
+                 columns: tp.Optional[tp.Sequence[str]] = None, header: bool = True) -> None:
+        """
+        :param filename: name of file to read
+        :param schema: types of columns, columns not mentioned are left as strings
+        :param columns: columns to read, all the columns of schema by default, or all the columns of file
+            if there is no schema either
+        :param header: whether the first line of file contains names of columns, otherwise they are
+            the columns of schema in order
+        """
+        super().__init__(filename, schema, columns, delimiter='\t', header=header)
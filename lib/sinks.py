@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import typing as tp
+
+from abc import abstractmethod, ABC
+
+from . import operations as ops
+from . import spill
+from . import transport
+
+
+DEFAULT_BATCH_SIZE = 1024
+# Size of buffer of output file, in bytes
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+class Sink(ABC):
+    """
+    Writer of stream of rows to file, see Graph.write. Rows are written in batches through large buffer, into
+    temporary file which replaces the file only once all the rows are written, so that failed run leaves
+    previous file as is
+    """
+    def __init__(self, filename: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+        """
+        :param filename: name of file to write
+        :param batch_size: number of rows encoded at once
+        :param buffer_size: size of buffer of file in bytes
+        """
+        self.filename = filename
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+
+    def write(self, rows: ops.TRowsIterable) -> int:
+        """
+        Write all the rows to file
+        :return: number of rows written
+        """
+        temporary_path = self.filename + '.new'
+        try:
+            count = self._write(rows, temporary_path)
+            os.replace(temporary_path, self.filename)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return count
+
+    @abstractmethod
+    def _write(self, rows: ops.TRowsIterable, path: str) -> int:
+        pass
+
+    def __repr__(self) -> str:
+        return ops._repr(self)
+
+
+class NDJSONSink(Sink):
+    """Rows as JSON objects, one per line"""
+    def _write(self, rows: ops.TRowsIterable, path: str) -> int:
+        count = 0
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        with open(path, 'w', encoding='utf-8', buffering=self.buffer_size) as file:
+            for batch in transport.batched(rows, self.batch_size):
+                file.write('\n'.join(map(encode, batch)))
+                file.write('\n')
+                count += len(batch)
+        return count
+
+
+class CSVSink(Sink):
+    """Rows as lines of comma separated values with header; values of columns missing in row are empty"""
+    def __init__(self, filename: str, columns: tp.Optional[tp.Sequence[str]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+        """
+        :param columns: columns to write, columns of the first row by default; other columns of rows are ignored
+        """
+        super().__init__(filename, batch_size, buffer_size)
+        self.columns = columns
+
+    def _write(self, rows: ops.TRowsIterable, path: str) -> int:
+        count = 0
+        with open(path, 'w', encoding='utf-8', newline='', buffering=self.buffer_size) as file:
+            writer: tp.Any = None
+            for batch in transport.batched(rows, self.batch_size):
+                if writer is None:
+                    columns = self.columns if self.columns is not None else list(batch[0])
+                    writer = csv.DictWriter(file, columns, extrasaction='ignore')
+                    writer.writeheader()
+                writer.writerows(batch)
+                count += len(batch)
+            if writer is None and self.columns is not None:
+                csv.DictWriter(file, self.columns).writeheader()
+        return count
+
+
+class BinarySink(Sink):
+    """Rows encoded by codec in the same frames as spill files, to be read back by read_binary"""
+    def _write(self, rows: ops.TRowsIterable, path: str) -> int:
+        with open(path, 'wb', buffering=self.buffer_size) as file:
+            return spill.write_rows(rows, file, self.batch_size)
+
+
+def read_binary(filename: str) -> ops.TRowsGenerator:
+    """Yield rows of file written by BinarySink"""
+    with open(filename, 'rb') as file:
+        yield from spill.read_rows(file)
@@ -0,0 +1,295 @@
+import os
+import struct
+import tempfile
+import typing as tp
+
+from collections import deque
+from itertools import islice
+
+from . import codec
+from . import memory
+from . import operations as ops
+
+
+DEFAULT_TEE_MAX_ROWS_IN_MEMORY = 100_000
+DEFAULT_SPILL_BATCH_SIZE = 1024
+
+# Number of bytes written to spill files by this process so far
+spilled_bytes = 0
+
+# Spill files are sequences of frames: length of encoded batch followed by the batch (see codec)
+_FRAME_HEADER = struct.Struct('<I')
+
+
+def write_batch(batch: tp.Sequence[ops.TRow], file: tp.IO[bytes]) -> None:
+    """Append batch of rows to binary file as a single frame"""
+    global spilled_bytes
+    payload = codec.encode_batch(batch)
+    spilled_bytes += _FRAME_HEADER.size + len(payload)
+    file.write(_FRAME_HEADER.pack(len(payload)))
+    file.write(payload)
+
+
+def read_batch(file: tp.IO[bytes]) -> tp.Optional[tp.List[ops.TRow]]:
+    """Read the next batch written by write_batch, None at the end of file"""
+    header = file.read(_FRAME_HEADER.size)
+    if not header:
+        return None
+    length, = _FRAME_HEADER.unpack(header)
+    return codec.decode_batch(file.read(length))
+
+
+def write_rows(rows: ops.TRowsIterable, file: tp.IO[bytes], batch_size: int = DEFAULT_SPILL_BATCH_SIZE) -> int:
+    """
+    Append rows to binary file in batches
+    :param batch_size: number of rows encoded together
+    :return: number of rows written
+    """
+    iterator = iter(rows)
+    count = 0
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return count
+        write_batch(batch, file)
+        count += len(batch)
+
+
+def store_rows(rows: ops.TRowsIterable, path: str,
+               batch_size: int = DEFAULT_SPILL_BATCH_SIZE) -> ops.TRowsGenerator:
+    """
+    Yield rows and write them to file as write_rows does. Rows are written before they are yielded, so that consumer
+    may modify them. File is written under temporary name in the same directory and takes path only once all the
+    rows are written and yielded, so that file at path is never partial
+    """
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            iterator = iter(rows)
+            while True:
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    break
+                write_batch(batch, file)
+                yield from batch
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def read_rows(file: tp.IO[bytes]) -> ops.TRowsGenerator:
+    """Read all the rows written by write_rows or write_batch, up to the end of file"""
+    while True:
+        batch = read_batch(file)
+        if batch is None:
+            break
+        yield from batch
+
+
+class BatchWriter:
+    """Writer of rows one by one, which are written to file in batches"""
+    def __init__(self, file: tp.IO[bytes], batch_size: int = DEFAULT_SPILL_BATCH_SIZE) -> None:
+        """
+        :param file: file to write to
+        :param batch_size: number of rows encoded together
+        """
+        self.file = file
+        self.batch_size = batch_size
+        self._batch: tp.List[ops.TRow] = []
+
+    def write(self, row: ops.TRow) -> None:
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write rows which are not written yet"""
+        if self._batch:
+            write_batch(self._batch, self.file)
+            self._batch = []
+        self.file.flush()
+
+
+class SpillableQueue:
+    """
+    FIFO queue of rows which keeps at most max_rows_in_memory rows in memory, the rest is appended to temporary
+    file. Rows in memory are always older than rows in file, so the file is read back only when memory is drained.
+    Rows go to the file in batches, the newest rows wait in a batch which is not written yet.
+    Queue also starts spilling when memory budget of the process (see memory.limited) is exhausted
+    """
+    def __init__(self, max_rows_in_memory: int = DEFAULT_TEE_MAX_ROWS_IN_MEMORY) -> None:
+        """
+        :param max_rows_in_memory: maximum number of rows kept in memory
+        """
+        self.max_rows_in_memory = max_rows_in_memory
+        self._memory: tp.Deque[ops.TRow] = deque()
+        # Sizes of rows in memory accounted in reservation, 0 for rows which are not accounted
+        self._sizes: tp.Deque[int] = deque()
+        self._pending: tp.List[ops.TRow] = []
+        self._spilled = 0
+        self._filename: tp.Optional[str] = None
+        self._writer: tp.Optional[tp.IO[bytes]] = None
+        self._reader: tp.Optional[tp.IO[bytes]] = None
+        self._reservation = memory.Reservation()
+
+    def __len__(self) -> int:
+        return len(self._memory) + self._spilled + len(self._pending)
+
+    @property
+    def spilled(self) -> int:
+        """Number of rows currently stored on disk or waiting to be written there"""
+        return self._spilled + len(self._pending)
+
+    def append(self, row: ops.TRow) -> None:
+        if not self.spilled and len(self._memory) < self.max_rows_in_memory:
+            size = self._reserve(row)
+            if size is not None:
+                self._memory.append(row)
+                self._sizes.append(size)
+                return
+        self._pending.append(row)
+        if len(self._pending) >= min(DEFAULT_SPILL_BATCH_SIZE, max(self.max_rows_in_memory, 1)):
+            if self._writer is None:
+                descriptor, self._filename = tempfile.mkstemp(prefix='comp_graph_queue_')
+                self._writer = os.fdopen(descriptor, 'wb')
+                self._reader = open(self._filename, 'rb')
+            write_batch(self._pending, self._writer)
+            self._spilled += len(self._pending)
+            self._pending = []
+
+    def _reserve(self, row: ops.TRow) -> tp.Optional[int]:
+        """Account row kept in memory and return size accounted, None if row should be spilled instead"""
+        if not self._reservation.limited:
+            return 0
+        size = memory.row_size(row)
+        if self._reservation.grow(size) or len(self._memory) < memory.MIN_SPILL_ROWS:
+            return size
+        self._reservation.shrink(size)
+        return None
+
+    def popleft(self) -> ops.TRow:
+        if not self._memory and self._spilled:
+            assert self._writer is not None and self._reader is not None
+            self._writer.flush()
+            batch = read_batch(self._reader)
+            assert batch is not None
+            self._memory.extend(batch)
+            self._sizes.extend([0] * len(batch))
+            self._spilled -= len(batch)
+            if not self._spilled:
+                self._close_file()
+        elif not self._memory and self._pending:
+            self._memory.extend(self._pending)
+            self._sizes.extend([0] * len(self._pending))
+            self._pending = []
+        # Rows read back from disk are not accounted, though rows appended after them may be
+        size = self._sizes.popleft()
+        if size:
+            self._reservation.shrink(size)
+        return self._memory.popleft()
+
+    def close(self) -> None:
+        """Drop spill file; rows stored on disk are lost"""
+        self._pending = []
+        self._close_file()
+        self._reservation.release()
+        self._sizes = deque([0] * len(self._memory))
+
+    def _close_file(self) -> None:
+        if self._writer is not None and self._reader is not None and self._filename is not None:
+            self._writer.close()
+            self._reader.close()
+            os.remove(self._filename)
+        self._writer = self._reader = self._filename = None
+        self._spilled = 0
+
+
+class SpillableList(tp.Collection[ops.TRow]):
+    """
+    Rows which may be iterated several times, e.g. group of rows of join. Rows are kept in memory while memory
+    budget of the process (see memory.limited) allows, the rest is written to temporary file and read back on every
+    iteration. Memory is reserved until the list is dropped
+    """
+    def __init__(self, rows: ops.TRowsIterable) -> None:
+        self._memory: tp.List[ops.TRow] = []
+        self._reservation = memory.Reservation()
+        self._file: tp.Optional[tp.IO[bytes]] = None
+        self._spilled = 0
+        writer: tp.Optional[BatchWriter] = None
+        for row in rows:
+            if writer is None:
+                if (not self._reservation.limited or self._reservation.grow(memory.row_size(row))
+                        or len(self._memory) < memory.MIN_SPILL_ROWS):
+                    self._memory.append(row)
+                    continue
+                writer = BatchWriter(tempfile.TemporaryFile(prefix='comp_graph_list_'))
+            writer.write(row)
+            self._spilled += 1
+        if writer is not None:
+            writer.flush()
+            self._file = writer.file
+
+    def __len__(self) -> int:
+        return len(self._memory) + self._spilled
+
+    def __iter__(self) -> ops.TRowsGenerator:
+        yield from self._memory
+        if self._file is None:
+            return
+        # Every iteration keeps its own position, so that the list may be iterated by several consumers at once
+        position = 0
+        while True:
+            self._file.seek(position)
+            batch = read_batch(self._file)
+            if batch is None:
+                return
+            position = self._file.tell()
+            yield from batch
+
+    def __contains__(self, row: object) -> bool:
+        return any(row == other for other in self)
+
+    def __del__(self) -> None:
+        self._reservation.release()
+        if self._file is not None:
+            self._file.close()
+
+
+def tee(rows: tp.Iterable[tp.Any], n: int, max_rows_in_memory: int = DEFAULT_TEE_MAX_ROWS_IN_MEMORY,
+        copy_rows: bool = True) -> tp.List[tp.Generator[tp.Any, None, None]]:
+    """
+    Split one stream of rows into n independent streams, similar to itertools.tee.
+    Rows read by one of the consumers, but not yet read by the others, are buffered per consumer and spilled to
+    disk when there are too many of them. Consumer which pulls a row first gets the row itself, others get
+    shallow copies, so that in-place mappers of one branch do not affect the rest
+    :param rows: rows to split
+    :param n: number of resulting streams
+    :param max_rows_in_memory: maximum number of rows each consumer buffers in memory
+    :param copy_rows: whether to give shallow copies of rows to other consumers; items which are never modified
+        in place (e.g. record batches) are passed as is
+    """
+    iterator = iter(rows)
+    queues = [SpillableQueue(max_rows_in_memory) for _ in range(n)]
+    alive = [True] * n
+
+    def branch(index: int) -> tp.Generator[tp.Any, None, None]:
+        queue = queues[index]
+        try:
+            while True:
+                if queue:
+                    yield queue.popleft()
+                    continue
+                try:
+                    row = next(iterator)
+                except StopIteration:
+                    return
+                for other_index, other_queue in enumerate(queues):
+                    if other_index != index and alive[other_index]:
+                        other_queue.append(dict(row) if copy_rows else row)
+                yield row
+        finally:
+            alive[index] = False
+            queue.close()
+
+    return [branch(index) for index in range(n)]
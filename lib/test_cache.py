@@ -0,0 +1,96 @@
+import json
+import os
+import typing as tp
+
+import pytest
+
+from . import cache
+from . import operations as ops
+from .graph import Graph
+
+
+def _word_count(source: Graph) -> Graph:
+    return source.map(ops.Split('text')).reduce(ops.Count('count'), ['text'], strategy='hash').sort(['text'])
+
+
+def test_fingerprint_describes_functions_by_code() -> None:
+    def make_filter(threshold: int) -> tp.Callable[[ops.TRow], bool]:
+        return lambda row: row['count'] > threshold
+
+    assert cache.fingerprint(ops.Filter(make_filter(1))) == cache.fingerprint(ops.Filter(make_filter(1)))
+    assert cache.fingerprint(ops.Filter(make_filter(1))) != cache.fingerprint(ops.Filter(make_filter(2)))
+    assert cache.fingerprint(ops.Filter(lambda row: True)) != cache.fingerprint(ops.Filter(lambda row: False))
+    assert cache.fingerprint(ops.InnerJoiner('_a')) != cache.fingerprint(ops.InnerJoiner('_b'))
+
+
+def test_cache_hits_until_file_changes(tmpdir: tp.Any) -> None:
+    filename = str(tmpdir.join('docs.txt'))
+    with open(filename, 'w') as file:
+        file.write(json.dumps({'text': 'hello little world'}) + '\n')
+    graph = _word_count(Graph.graph_from_file(filename, json.loads))
+    result_cache = cache.ResultCache(str(tmpdir.join('cache')))
+
+    expected = graph.run()
+    assert expected == result_cache.run(graph)
+    assert expected == result_cache.run(graph)
+    assert expected == result_cache.run(_word_count(Graph.graph_from_file(filename, json.loads)))
+    assert (2, 1) == (result_cache.hits, result_cache.misses)
+
+    with open(filename, 'a') as file:
+        file.write(json.dumps({'text': 'hello again'}) + '\n')
+    os.utime(filename, ns=(0, 0))
+    assert graph.run() == result_cache.run(graph)
+    assert (2, 2) == (result_cache.hits, result_cache.misses)
+
+
+@pytest.mark.parametrize('extension, read, header, line', [
+    ('ndjson', Graph.graph_from_ndjson, '', '{{"a": {}}}\n'),
+    ('csv', Graph.graph_from_csv, 'a\n', '{}\n'),
+    ('tsv', Graph.graph_from_tsv, 'a\n', '{}\n'),
+])
+def test_cache_misses_once_file_of_reader_changes(tmpdir: tp.Any, extension: str, read: tp.Callable[..., Graph],
+                                                  header: str, line: str) -> None:
+    filename = str(tmpdir.join('rows.' + extension))
+    with open(filename, 'w') as file:
+        file.write(header + line.format(1))
+    graph = read(filename, {'a': int})
+    result_cache = cache.ResultCache(str(tmpdir.join('cache')))
+    assert [{'a': 1}] == result_cache.run(graph)
+
+    with open(filename, 'w') as file:
+        file.write(header + line.format(2) + line.format(3))
+
+    assert [{'a': 2}, {'a': 3}] == result_cache.run(graph)
+    assert (0, 2) == (result_cache.hits, result_cache.misses)
+
+
+def test_cache_of_iterator_sources_needs_versions(tmpdir: tp.Any) -> None:
+    docs = [{'text': 'a b a'}]
+    graph = _word_count(Graph.graph_from_iter('docs'))
+    result_cache = cache.ResultCache(str(tmpdir))
+
+    expected = graph.run(docs=lambda: iter(docs))
+    assert expected == result_cache.run(graph, docs=lambda: iter(docs))
+    assert expected == result_cache.run(graph, {'docs': 1}, docs=lambda: iter(docs))
+    assert expected == result_cache.run(graph, {'docs': 1}, docs=lambda: iter([]))
+    assert [] == result_cache.run(graph, {'docs': 2}, docs=lambda: iter([]))
+    assert (1, 1, 2) == (result_cache.bypasses, result_cache.hits, result_cache.misses)
+
+
+def test_cache_evicts_least_recently_used(tmpdir: tp.Any) -> None:
+    graph = _word_count(Graph.graph_from_iter('docs'))
+    docs = [{'text': ' '.join(str(i) for i in range(1000))}]
+    result_cache = cache.ResultCache(str(tmpdir))
+    paths = []
+    for version in range(3):
+        result_cache.run(graph, {'docs': version}, docs=lambda: iter(docs))
+        paths.append(result_cache.entry_path(tp.cast(str, result_cache.key(graph, {'docs': version}, {}))))
+        os.utime(paths[-1], (version, version))
+
+    # Hit makes the oldest entry the most recently used one
+    result_cache.run(graph, {'docs': 0}, docs=lambda: iter(docs))
+    result_cache.max_bytes = 2 * os.path.getsize(paths[0])
+    result_cache.evict()
+
+    assert [True, False, True] == [os.path.exists(path) for path in paths]
+    assert (1, 3) == (result_cache.hits, result_cache.misses)
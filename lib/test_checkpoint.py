@@ -0,0 +1,147 @@
+import os
+import typing as tp
+
+import pytest
+
+from . import checkpoint
+from . import operations as ops
+from . import spill
+from .graph import Graph
+from ..graphs import inverted_index_graph
+
+
+class _Source:
+    """Data source which counts rows read from it"""
+    def __init__(self, rows: tp.List[ops.TRow]) -> None:
+        self.rows = rows
+        self.rows_read = 0
+
+    def __call__(self) -> ops.TRowsGenerator:
+        for row in self.rows:
+            self.rows_read += 1
+            yield dict(row)
+
+
+class _FailOn(ops.Mapper):
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        if row['key'] == self.value:
+            raise RuntimeError('Stage failed')
+        yield row
+
+
+def _rows(count: int) -> tp.List[ops.TRow]:
+    return [{'id': i, 'key': (i * 7) % 10} for i in range(count)]
+
+
+def _graph(last_mapper: ops.Mapper) -> Graph:
+    return Graph.graph_from_iter('numbers') \
+        .sort(['key', 'id']) \
+        .checkpoint('sorted') \
+        .reduce(ops.Count('count'), ['key'], strategy='auto') \
+        .sort(['count', 'key']) \
+        .map(last_mapper)
+
+
+def test_checkpoint_passes_rows_without_directory() -> None:
+    graph = _graph(ops.DummyMapper())
+    assert ('key', 'id') == graph.dependencies[0].dependencies[0].dependencies[0].ordering
+
+    result = graph.run(numbers=_Source(_rows(100)))
+
+    assert [{'key': key, 'count': 10} for key in range(10)] == result
+
+
+def test_restarted_run_resumes_from_checkpoint(tmp_path: tp.Any) -> None:
+    directory = str(tmp_path)
+    source = _Source(_rows(100))
+    with pytest.raises(RuntimeError):
+        _graph(_FailOn(5)).run(numbers=source, checkpoint_directory=directory, source_versions={'numbers': 1})
+    assert 100 == source.rows_read
+    assert 1 == len([name for name in os.listdir(directory) if name.endswith(checkpoint.CHECKPOINT_SUFFIX)])
+
+    source = _Source(_rows(100))
+    result = _graph(ops.DummyMapper()).run(numbers=source, checkpoint_directory=directory,
+                                           source_versions={'numbers': 1})
+
+    assert 0 == source.rows_read
+    assert [{'key': key, 'count': 10} for key in range(10)] == result
+
+
+def test_checkpoint_of_other_data_is_not_read(tmp_path: tp.Any) -> None:
+    directory = str(tmp_path)
+    graph = _graph(ops.DummyMapper())
+    graph.run(numbers=_Source(_rows(100)), checkpoint_directory=directory, source_versions={'numbers': 1})
+
+    source = _Source(_rows(50))
+    result = graph.run(numbers=source, checkpoint_directory=directory, source_versions={'numbers': 2})
+
+    assert 50 == source.rows_read
+    assert [{'key': key, 'count': 5} for key in range(10)] == result
+
+    checkpoint.clear(directory)
+    assert [] == os.listdir(directory)
+
+
+def test_checkpoint_of_changed_file_is_not_read(tmp_path: tp.Any) -> None:
+    directory = str(tmp_path / 'checkpoints')
+    filename = str(tmp_path / 'numbers.csv')
+    with open(filename, 'w') as file:
+        file.write('key\n2\n1\n')
+    graph = Graph.graph_from_csv(filename, {'key': int}).sort(['key']).checkpoint('sorted')
+    assert [{'key': 1}, {'key': 2}] == graph.run(checkpoint_directory=directory)
+
+    with open(filename, 'w') as file:
+        file.write('key\n3\n')
+
+    assert [{'key': 3}] == graph.run(checkpoint_directory=directory)
+    assert 2 == len(os.listdir(directory))
+
+
+def test_incomplete_stage_leaves_no_checkpoint(tmp_path: tp.Any) -> None:
+    directory = str(tmp_path)
+    graph = Graph.graph_from_iter('numbers').map(_FailOn(5)).checkpoint()
+
+    with pytest.raises(RuntimeError):
+        graph.run(numbers=_Source(_rows(100)), checkpoint_directory=directory, source_versions={'numbers': 1})
+
+    assert [] == os.listdir(directory)
+
+
+def test_resumed_run_keeps_no_rows_for_checkpoints(tmp_path: tp.Any) -> None:
+    directory = str(tmp_path)
+    numbers = Graph.graph_from_iter('numbers')
+    graph = numbers.reduce(ops.Count('count'), []).checkpoint('count').concat(numbers.map(ops.DummyMapper()))
+    rows = _rows(3000)
+    expected = [{'count': 3000}] + rows
+    assert expected == graph.run(numbers=_Source(rows), checkpoint_directory=directory,
+                                 source_versions={'numbers': 1})
+
+    spilled_bytes = spill.spilled_bytes
+    source = _Source(rows)
+    result = graph.run(memory_limit=1, numbers=source, checkpoint_directory=directory, source_versions={'numbers': 1})
+
+    assert expected == result
+    assert 3000 == source.rows_read
+    assert spilled_bytes == spill.spilled_bytes
+
+
+def test_checkpoint_needs_versions_of_data_sources(tmp_path: tp.Any) -> None:
+    with pytest.raises(ValueError, match='numbers'):
+        _graph(ops.DummyMapper()).run(numbers=_Source(_rows(10)), checkpoint_directory=str(tmp_path))
+
+
+def test_inverted_index_resumes_from_checkpoints(tmp_path: tp.Any) -> None:
+    directory = str(tmp_path)
+    rows = [{'doc_id': i, 'text': 'hello world number {} of {}'.format(i % 7, i % 3)} for i in range(50)]
+    expected = inverted_index_graph('texts').run(texts=_Source(rows))
+    graph = inverted_index_graph('texts', checkpoints=True)
+
+    for columnar in (False, True):
+        source = _Source(rows)
+        result = graph.run(columnar=columnar, texts=source, checkpoint_directory=directory,
+                           source_versions={'texts': 'v1'})
+        assert expected == result
+    assert 0 == source.rows_read
@@ -0,0 +1,47 @@
+import io
+import typing as tp
+
+import pytest
+
+from . import codec
+from . import spill
+
+
+@pytest.mark.parametrize('rows', [
+    [],
+    [{}, {}],
+    [{'doc_id': 1, 'score': 0.5, 'flag': True, 'text': 'hello'},
+     {'doc_id': 2, 'score': 1.5, 'flag': False, 'text': ''}],
+    # Rows of different columns, mixed and missing values, big integers
+    [{'a': 1}, {'a': 'x'}, {'b': None}, {'b': None, 'a': 2 ** 70}, {'a': [1, (2, 3)]}],
+    # Strings with separator, lone surrogates and non ascii characters
+    [{'text': 'a\x00b'}, {'text': '\ud800'}, {'text': 'привет'}],
+    # Items which are not rows with string column names
+    [{1: 'one'}],
+    [('a', 1), ('b', 2)],
+])
+def test_codec_round_trip(rows: tp.List[tp.Any]) -> None:
+    encoded = codec.encode_batch(rows)
+
+    assert rows == codec.decode_batch(encoded)
+    assert rows == codec.decode_batch(memoryview(encoded))
+
+
+def test_codec_stores_column_names_once() -> None:
+    rows = [{'long_column_name': index, 'text': 'word'} for index in range(1000)]
+
+    assert 1 == codec.encode_batch(rows).count(b'long_column_name')
+
+
+def test_spill_frames() -> None:
+    rows = [{'doc_id': index, 'text': str(index)} for index in range(10)]
+    file = io.BytesIO()
+
+    assert 10 == spill.write_rows(rows, file, batch_size=3)
+    writer = spill.BatchWriter(file, batch_size=4)
+    for row in rows[:5]:
+        writer.write(row)
+    writer.flush()
+
+    file.seek(0)
+    assert rows + rows[:5] == list(spill.read_rows(file))
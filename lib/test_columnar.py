@@ -0,0 +1,87 @@
+import typing as tp
+from operator import itemgetter
+
+from pytest import approx, raises
+
+from . import columnar
+from . import operations as ops
+from .graph import Graph
+
+
+def _run_batches(operation: ops.Operation, rows: ops.TRowsIterable, batch_size: int = 3) -> tp.List[ops.TRow]:
+    batches = columnar.to_batches(rows, batch_size)
+    return list(columnar.to_rows(columnar.execute(operation, [batches], {}, batch_size)))
+
+
+def test_record_batch_round_trip() -> None:
+    rows: tp.List[ops.TRow] = [
+        {'id': 1, 'score': 0.5, 'text': 'one', 'flag': True},
+        {'id': 2, 'score': 1.5, 'text': 'two', 'flag': False},
+        {'id': 3, 'text': 'three', 'extra': (1, 2)}
+    ]
+
+    batch = columnar.RecordBatch.from_rows(rows)
+
+    assert 'int64' == batch['id'].dtype
+    assert rows == batch.to_rows()
+
+
+def test_vectorized_mappers() -> None:
+    rows: ops.TRowsIterable = [
+        {'doc_id': i, 'total': 10, 'occ': i % 4 + 1, 'tf': 0.25} for i in range(10)
+    ]
+
+    mappers: tp.List[ops.Mapper] = [
+        ops.Apply(lambda x, y: x * y, ['total', 'occ'], 'product', vectorized=True),
+        ops.Apply(lambda x: str(x), ['occ'], 'string'),
+        ops.Filter(lambda row: row['occ'] > 2, vectorized=True),
+        ops.Filter(lambda row: row['occ'] < 2),
+        ops.IDF('total', 'occ'),
+        ops.Project(['doc_id', 'occ']),
+    ]
+    for mapper in mappers:
+        expected = list(ops.Map(mapper)(rows))
+        assert expected == approx(_run_batches(ops.Map(mapper), rows))
+
+    with_idf = list(ops.Map(ops.IDF('total', 'occ'))(rows))
+    expected = list(ops.Map(ops.TF_IDF())(with_idf))
+    assert expected == approx(_run_batches(ops.Map(ops.TF_IDF()), with_idf))
+
+
+def test_vectorized_reducers_across_batches() -> None:
+    rows: ops.TRowsIterable = sorted([
+        {'match_id': i % 3, 'player_id': i, 'rank': (i * 7) % 5, 'name': 'p' + str(i)} for i in range(20)
+    ], key=itemgetter('match_id'))
+
+    reducers: tp.List[ops.Reducer] = [
+        ops.Count('count'), ops.Sum('rank'), ops.Mean('rank'), ops.TopN('rank', 3), ops.TopN('name', 2)
+    ]
+    for reducer in reducers:
+        for keys in (['match_id'], []):
+            expected = list(ops.Reduce(reducer, keys)(rows))
+            assert expected == approx(_run_batches(ops.Reduce(reducer, keys), rows))
+
+
+def test_vectorized_reduce_raises_on_unsorted() -> None:
+    rows: ops.TRowsIterable = [{'key': 2}, {'key': 1}, {'key': 2}, {'key': 3}]
+
+    with raises(ValueError):
+        _run_batches(ops.Reduce(ops.Count('count'), ['key']), rows)
+
+
+def test_columnar_graph_with_row_fallback() -> None:
+    docs = [
+        {'doc_id': 1, 'text': 'hello, my little WORLD'},
+        {'doc_id': 2, 'text': 'Hello, my little little hell'}
+    ]
+
+    graph = Graph.graph_from_iter('docs') \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.LowerCase('text')) \
+        .map(ops.Split('text')) \
+        .map(ops.Filter(lambda row: row['doc_id'] > 0, vectorized=True)) \
+        .sort(['text']) \
+        .reduce(ops.Count('count'), ['text']) \
+        .sort(['count', 'text'])
+
+    assert graph.run(docs=lambda: iter(docs)) == graph.run(columnar=True, docs=lambda: iter(docs))
@@ -0,0 +1,93 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+from . import external_sort as sort
+from . import operations as ops
+
+
+def _make_rows(count: int) -> ops.TRowsIterable:
+    generator = random.Random(42)
+    return [{'id': i, 'key': generator.randint(0, 10), 'text': 'word' + str(generator.randint(0, 100))}
+            for i in range(count)]
+
+
+def test_sort_rows_in_memory() -> None:
+    rows = _make_rows(100)
+
+    result = list(sort.sort_rows(rows, ['key', 'text']))
+
+    assert sorted(rows, key=itemgetter('key', 'text')) == result
+
+
+def test_sort_rows_spills_runs() -> None:
+    rows = _make_rows(1000)
+
+    result = list(sort.sort_rows(rows, ['key'], max_rows_in_memory=7))
+
+    # Stable as list.sort, even though rows were merged from many runs
+    assert sorted(rows, key=itemgetter('key')) == result
+
+
+def test_sort_rows_spills_by_bytes() -> None:
+    rows = _make_rows(300)
+
+    result = list(sort.sort_rows(rows, ['text', 'key'], max_bytes_in_memory=2048))
+
+    assert sorted(rows, key=itemgetter('text', 'key')) == result
+
+
+def test_external_sort_spills_in_separate_process() -> None:
+    rows = _make_rows(500)
+
+    result = list(sort.ExternalSort(['key', 'id'], max_rows_in_memory=50)(iter(rows)))
+
+    assert sorted(rows, key=itemgetter('key', 'id')) == result
+
+
+def test_external_sort_small_batches() -> None:
+    rows = _make_rows(100)
+
+    result = list(sort.ExternalSort(['text'], batch_size=3)(iter(rows)))
+
+    assert sorted(rows, key=itemgetter('text')) == result
+
+
+def test_external_sort_shared_memory() -> None:
+    rows = _make_rows(2000)
+
+    result = list(sort.ExternalSort(['key', 'text'], batch_size=64, use_shared_memory=True)(iter(rows)))
+
+    assert sorted(rows, key=itemgetter('key', 'text')) == result
+
+
+def test_sort_rows_merges_runs_in_passes(monkeypatch: tp.Any) -> None:
+    rows = _make_rows(1000)
+    open_runs: tp.List[str] = []
+    max_open_runs = 0
+    read_run = sort._read_run
+
+    def count_open_runs(filename: str) -> ops.TRowsGenerator:
+        nonlocal max_open_runs
+        open_runs.append(filename)
+        max_open_runs = max(max_open_runs, len(open_runs))
+        try:
+            yield from read_run(filename)
+        finally:
+            open_runs.remove(filename)
+
+    monkeypatch.setattr(sort, '_read_run', count_open_runs)
+    result = list(sort.sort_rows(rows, ['key'], max_rows_in_memory=7, max_merge_fan_in=4))
+
+    # Stable, even though runs were merged in several passes
+    assert sorted(rows, key=itemgetter('key')) == result
+    assert 4 == max_open_runs
+
+
+def test_external_sort_without_keys_passes_large_input() -> None:
+    count = 200_000
+    rows = ({'id': i, 'text': 'x' * 200} for i in range(count))
+
+    result = sort.ExternalSort([])(rows)
+
+    assert list(range(count)) == [row['id'] for row in result]
@@ -0,0 +1,80 @@
+import typing as tp
+
+import pytest
+
+from . import operations as ops
+from .graph import Graph
+
+
+class CountingMapper(ops.Mapper):
+    """Count rows passed through mapper"""
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        self.calls += 1
+        yield row
+
+
+def test_shared_node_runs_once() -> None:
+    rows = [{'key': i % 3, 'value': i} for i in range(10)]
+    source_calls = []
+
+    def source() -> tp.Iterator[ops.TRow]:
+        source_calls.append(1)
+        return iter(rows)
+
+    mapper = CountingMapper()
+    shared = Graph.graph_from_iter('docs').map(mapper)
+    left = shared.sort(['key', 'value'])
+    right = Graph.graph_from_iter('docs').sort(['key', 'value'])
+    graph = left.join(ops.InnerJoiner(), right, [])
+
+    result = graph.run(docs=source)
+
+    assert 100 == len(result)
+    assert 10 == mapper.calls
+    assert 1 == len(source_calls)
+
+
+def test_source_rows_are_not_modified() -> None:
+    docs = [{'doc_id': 1, 'text': 'Hello, World'}]
+
+    graph = Graph.graph_from_iter('docs') \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.LowerCase('text'))
+
+    assert [{'doc_id': 1, 'text': 'hello world'}] == graph.run(docs=lambda: iter(docs))
+    assert [{'doc_id': 1, 'text': 'Hello, World'}] == docs
+    # Only the first mapper has to copy rows, the second one gets rows owned by the graph
+    first_map, second_map = graph.dependencies[0].operation, graph.operation
+    assert isinstance(first_map, ops.Map) and not first_map.owns_rows
+    assert isinstance(second_map, ops.Map) and second_map.owns_rows
+
+
+def test_prepared_plan_is_executed_many_times() -> None:
+    mapper = CountingMapper()
+    docs = Graph.graph_from_iter('docs').map(mapper)
+    counts = docs.sort(['key']).reduce(ops.Count('count'), ['key'])
+    graph = counts.join(ops.InnerJoiner(), docs, ['key'], strategy='hash')
+
+    plan = graph.prepare()
+
+    assert ('docs',) == plan.sources
+    # Shared mapper node is a single step whose output is fanned out
+    assert [2] == [step.consumers for step in plan.steps if step.consumers > 1]
+    for count in (3, 5):
+        rows = [{'key': i % 2} for i in range(count)]
+        expected = graph.run(docs=lambda: iter(rows))
+        assert expected == plan.execute(docs=lambda: iter(rows))
+    assert 2 * (3 + 5) == mapper.calls
+    with pytest.raises(ValueError, match='docs'):
+        plan.execute()
+
+
+def test_prepare_rejects_cycles() -> None:
+    graph = Graph.graph_from_iter('docs').map(ops.DummyMapper())
+    graph.dependencies[0].dependencies.append(graph)
+
+    with pytest.raises(ValueError, match='cycle'):
+        graph.prepare(optimize=False)
@@ -0,0 +1,54 @@
+import random
+import typing as tp
+
+import pytest
+
+from . import hash_join
+from . import operations as ops
+from .graph import Graph
+
+
+def _key(row: ops.TRow) -> tp.Tuple[tp.Any, ...]:
+    return tuple(sorted(row.items()))
+
+
+def _make_rows(count: int, seed: int) -> tp.List[ops.TRow]:
+    generator = random.Random(seed)
+    return [{'key': generator.randint(0, 15), 'value': generator.randint(0, 100)} for _ in range(count)]
+
+
+@pytest.mark.parametrize('joiner', [ops.InnerJoiner(), ops.OuterJoiner(), ops.LeftJoiner(), ops.RightJoiner()])
+@pytest.mark.parametrize('sizes', [(40, 10), (10, 40), (0, 10), (10, 0), (1, 1)])
+def test_hash_join_matches_sort_join(joiner: ops.Joiner, sizes: tp.Tuple[int, int]) -> None:
+    rows_a, rows_b = _make_rows(sizes[0], 1), _make_rows(sizes[1], 2)
+    for keys in (['key'], []):
+        expected = list(ops.Join(joiner, keys)(sorted(rows_a, key=_key), sorted(rows_b, key=_key)))
+        for build_side in (hash_join.LEFT, hash_join.RIGHT, hash_join.AUTO):
+            result = list(hash_join.HashJoin(joiner, keys, build_side=build_side)(rows_a, iter(rows_b)))
+            assert sorted(expected, key=_key) == sorted(result, key=_key)
+
+
+def test_pick_build_side_reads_smaller_side() -> None:
+    side, build_rows, probe_rows = hash_join._pick_build_side([{'a': 1}] * 3, iter([{'b': 1}] * 1000))
+    assert side == hash_join.LEFT
+    assert len(list(build_rows)) == 3
+    assert len(list(probe_rows)) == 1000
+
+
+def test_graph_join_strategies() -> None:
+    docs = Graph.graph_from_iter('docs')
+    totals = docs.reduce(ops.Count('total'), [])
+    joiner = ops.InnerJoiner()
+
+    broadcast = docs.join(joiner, totals, [], strategy='auto').operation
+    assert isinstance(broadcast, hash_join.HashJoin) and broadcast.build_side == hash_join.RIGHT
+    hashed = docs.join(joiner, docs, ['key'], strategy='auto').operation
+    assert isinstance(hashed, hash_join.HashJoin) and hashed.build_side == hash_join.AUTO
+    assert isinstance(docs.sort(['key']).join(joiner, docs.sort(['key']), ['key'], strategy='auto').operation,
+                      ops.Join)
+    with pytest.raises(ValueError):
+        docs.join(joiner, totals, [], strategy='nested_loop')
+
+    rows = _make_rows(50, 3)
+    result = docs.join(joiner, totals, [], strategy='broadcast').run(docs=lambda: iter(rows))
+    assert result == [dict(row, total=50) for row in rows]
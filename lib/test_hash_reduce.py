@@ -0,0 +1,69 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+from pytest import approx
+
+from . import hash_reduce
+from . import operations as ops
+from .graph import Graph
+
+
+def _make_rows(count: int) -> tp.List[ops.TRow]:
+    generator = random.Random(7)
+    return [{'doc_id': generator.randint(0, 30), 'text': 'w' + str(generator.randint(0, 20)),
+             'score': generator.randint(0, 100)} for _ in range(count)]
+
+
+def test_hash_reduce_matches_sort_reduce() -> None:
+    rows = _make_rows(500)
+    reducers: tp.List[ops.Reducer] = [
+        ops.Count('count'), ops.Sum('score'), ops.Mean('score'), ops.TF('text'), ops.TopN('score', 3),
+        ops.FirstReducer(), ops.FilterGroup(lambda *scores: sum(scores) > 1000, 'score')
+    ]
+
+    for reducer in reducers:
+        for keys in (['doc_id'], ['doc_id', 'text'], []):
+            presorted = sorted(rows, key=itemgetter(*keys)) if keys else rows
+            expected = list(ops.Reduce(reducer, keys)(presorted))
+            # Tiny table forces several levels of spilled partitions
+            for max_keys_in_memory in (hash_reduce.DEFAULT_MAX_KEYS_IN_MEMORY, 5):
+                operation = hash_reduce.HashReduce(reducer, keys, max_keys_in_memory=max_keys_in_memory, partitions=4)
+                result = list(operation(rows))
+                order = itemgetter(*keys) if keys else (lambda row: 0)
+                assert sorted(expected, key=order) == approx(sorted(result, key=order))
+
+
+def test_graph_reduce_strategies() -> None:
+    rows = _make_rows(100)
+
+    sorted_graph = Graph.graph_from_iter('docs').sort(['doc_id'])
+    hashed = Graph.graph_from_iter('docs').reduce(ops.Count('count'), ['doc_id'], strategy='auto')
+
+    assert isinstance(hashed.operation, hash_reduce.HashReduce)
+    assert isinstance(sorted_graph.reduce(ops.Count('count'), ['doc_id'], strategy='auto').operation, ops.Reduce)
+    assert isinstance(Graph.graph_from_iter('docs').reduce(ops.TopN('score', 1), [], strategy='hash').operation,
+                      hash_reduce.HashReduce)
+    expected = sorted_graph.reduce(ops.Count('count'), ['doc_id']).run(docs=lambda: iter(rows))
+    assert expected == sorted(hashed.run(docs=lambda: iter(rows)), key=itemgetter('doc_id'))
+
+
+def test_combine_and_merge_partials() -> None:
+    rows = _make_rows(500)
+    reducers: tp.List[ops.Reducer] = [ops.Count('count'), ops.Sum('score'), ops.Mean('score'), ops.TF('text')]
+
+    assert not hash_reduce.is_mergeable(ops.TopN('score', 3))
+    for reducer in reducers:
+        assert hash_reduce.is_mergeable(reducer)
+        for keys in (['doc_id'], ['doc_id', 'text']):
+            expected = list(ops.Reduce(reducer, keys)(sorted(rows, key=itemgetter(*keys))))
+            # Small table makes several partial rows per key
+            partials = list(hash_reduce.Combine(reducer, keys, max_keys_in_memory=5)(rows))
+            assert len(partials) > len(expected)
+
+            merged = ops.Reduce(hash_reduce.MergePartials(reducer), keys)(sorted(partials, key=itemgetter(*keys)))
+            assert expected == approx(list(merged))
+            # Merge updates partial states in place
+            partials = list(hash_reduce.Combine(reducer, keys, max_keys_in_memory=5)(rows))
+            hashed = hash_reduce.HashReduce(hash_reduce.MergePartials(reducer), keys)(partials)
+            assert sorted(expected, key=itemgetter(*keys)) == approx(sorted(hashed, key=itemgetter(*keys)))
@@ -0,0 +1,87 @@
+import os
+import typing as tp
+
+import pytest
+
+from . import incremental
+from . import operations as ops
+from .graph import Graph
+
+
+class _FailOnRun(ops.Mapper):
+    """Mapper which fails once there is no run left before failure"""
+    def __init__(self, runs_before_failure: int) -> None:
+        self.runs_left = runs_before_failure
+
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        if not self.runs_left:
+            raise RuntimeError('State failed')
+        yield row
+
+
+def _counter(directory: str, failing: _FailOnRun) -> incremental.IncrementalGraph:
+    """Number of rows and sum of their values, kept in states of their own"""
+    numbers = Graph.graph_from_iter('numbers')
+    count = numbers.reduce(ops.Count('count'), []).concat(Graph.graph_from_iter('count')) \
+        .reduce(ops.Sum('count'), [], strategy='hash')
+    total = numbers.map(failing).reduce(ops.Sum('value'), []).concat(Graph.graph_from_iter('total')) \
+        .reduce(ops.Sum('value'), [], strategy='hash')
+    result = Graph.graph_from_iter('count').join(ops.InnerJoiner(), Graph.graph_from_iter('total'), [])
+    return incremental.IncrementalGraph({'count': count, 'total': total}, result, directory)
+
+
+def test_failed_run_keeps_all_the_states(tmp_path: tp.Any) -> None:
+    directory = str(tmp_path)
+    failing = _FailOnRun(1)
+    graph = _counter(directory, failing)
+    assert [{'count': 2, 'value': 3}] == graph.run(numbers=lambda: iter([{'value': 1}, {'value': 2}]))
+
+    failing.runs_left = 0
+    with pytest.raises(RuntimeError):
+        graph.run(numbers=lambda: iter([{'value': 10}]))
+
+    failing.runs_left = 1
+    assert [{'count': 3, 'value': 13}] == graph.run(numbers=lambda: iter([{'value': 10}]))
+    assert {incremental.MANIFEST_NAME, 'generation-2'} == set(os.listdir(directory))
+
+    graph.reset()
+    assert [] == os.listdir(directory)
+
+
+@pytest.mark.parametrize('failing_call', [1, 2])
+def test_states_are_replaced_all_at_once(tmp_path: tp.Any, monkeypatch: tp.Any, failing_call: int) -> None:
+    graph = _counter(str(tmp_path), _FailOnRun(2))
+    graph.run(numbers=lambda: iter([{'value': 1}, {'value': 2}]))
+    calls = []
+    replace = os.replace
+
+    def crashing_replace(source: str, destination: str) -> None:
+        calls.append(destination)
+        if len(calls) == failing_call:
+            raise KeyboardInterrupt
+        replace(source, destination)
+
+    monkeypatch.setattr(os, 'replace', crashing_replace)
+    try:
+        graph.run(numbers=lambda: iter([{'value': 10}]))
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.undo()
+
+    states = {name: list(graph.read_state(name)) for name in ('count', 'total')}
+    assert states in ({'count': [{'count': 2}], 'total': [{'value': 3}]},
+                      {'count': [{'count': 3}], 'total': [{'value': 13}]})
+
+
+def test_states_share_one_read_of_input(tmp_path: tp.Any) -> None:
+    graph = _counter(str(tmp_path), _FailOnRun(2))
+    rows_read = []
+
+    def numbers() -> ops.TRowsGenerator:
+        for value in (1, 2, 3):
+            rows_read.append(value)
+            yield {'value': value}
+
+    assert [{'count': 3, 'value': 6}] == graph.run(numbers=numbers)
+    assert [1, 2, 3] == rows_read
+    assert [{'count': 4, 'value': 10}] == graph.run(numbers=lambda: iter([{'value': 4}]))
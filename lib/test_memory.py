@@ -0,0 +1,157 @@
+import random
+import typing as tp
+
+import pytest
+
+from . import external_sort
+from . import hash_join
+from . import hash_reduce
+from . import memory
+from . import operations as ops
+from . import spill
+from .graph import Graph
+
+
+# Budget is exhausted by the first reservation, so operators spill as soon as they hold MIN_SPILL_ROWS rows
+TINY_LIMIT = 1
+ROWS = 5 * memory.MIN_SPILL_ROWS
+
+
+def _make_rows(count: int, seed: int) -> tp.List[ops.TRow]:
+    generator = random.Random(seed)
+    return [{'key': generator.randint(0, count // 4), 'value': generator.randint(0, 100)} for _ in range(count)]
+
+
+def _key(row: ops.TRow) -> tp.Tuple[tp.Any, ...]:
+    return tuple(sorted(row.items()))
+
+
+def test_reservation_takes_quanta_from_budget() -> None:
+    with memory.limited(3 * memory.RESERVATION_QUANTUM) as budget:
+        assert budget is not None
+        first, second = memory.Reservation(), memory.Reservation()
+        assert first.grow(memory.RESERVATION_QUANTUM + 1)
+        assert 2 * memory.RESERVATION_QUANTUM == budget.used
+        # Quantum which was left is taken anyway
+        assert not second.grow(2 * memory.RESERVATION_QUANTUM)
+        assert 3 * memory.RESERVATION_QUANTUM == budget.used
+        first.shrink(memory.RESERVATION_QUANTUM)
+        assert 2 * memory.RESERVATION_QUANTUM == budget.used
+        assert second.grow(0)
+        second.release()
+        first.release()
+        assert 0 == budget.used
+        with memory.limited(None):
+            assert budget is memory.budget()
+    assert memory.budget() is None
+    assert memory.Reservation().grow(10 ** 12)
+
+
+def test_sort_spills_runs_under_pressure() -> None:
+    rows = _make_rows(ROWS, 1)
+    spilled_bytes = spill.spilled_bytes
+    with memory.limited(TINY_LIMIT):
+        result = list(external_sort.sort_rows(rows, ['key']))
+    assert spill.spilled_bytes > spilled_bytes
+    assert sorted(rows, key=lambda row: row['key']) == result
+
+
+def test_hash_reduce_spills_new_keys_under_pressure() -> None:
+    rows = _make_rows(ROWS, 2)
+    expected = list(hash_reduce.HashReduce(ops.Count('count'), ['key'])(rows))
+    spilled_bytes = spill.spilled_bytes
+    with memory.limited(TINY_LIMIT):
+        result = list(hash_reduce.HashReduce(ops.Count('count'), ['key'])(rows))
+        partials = list(hash_reduce.Combine(ops.Count('count'), ['key'])(rows))
+    assert spill.spilled_bytes > spilled_bytes
+    assert sorted(expected, key=_key) == sorted(result, key=_key)
+    assert len(partials) > len(expected)
+
+
+@pytest.mark.parametrize('reducer, kept_rows', [
+    (ops.Count('count'), 0), (ops.FirstReducer(), 1), (ops.TopN('value', 2), 2),
+])
+def test_hash_reduce_accounts_rows_kept_by_states(reducer: ops.Reducer, kept_rows: int) -> None:
+    rows = [{'key': index % 200, 'value': index, 'payload': 'x' * 10000} for index in range(1000)]
+    used = []
+
+    def source() -> ops.TRowsGenerator:
+        yield from rows
+        budget = memory.budget()
+        assert budget is not None
+        used.append(budget.used)
+
+    with memory.limited(10 ** 9):
+        list(hash_reduce.HashReduce(reducer, ['key'])(source()))
+
+    kept_size = 200 * kept_rows * memory.row_size(rows[0])
+    assert kept_size <= used[0] < kept_size + 2 * memory.RESERVATION_QUANTUM
+
+
+@pytest.mark.parametrize('joiner', [ops.InnerJoiner(), ops.OuterJoiner(), ops.LeftJoiner(), ops.RightJoiner()])
+def test_joins_spill_under_pressure(joiner: ops.Joiner) -> None:
+    rows_a, rows_b = _make_rows(ROWS, 3), _make_rows(ROWS // 2, 4)
+    expected = sorted(hash_join.HashJoin(joiner, ['key'])(rows_a, rows_b), key=_key)
+    spilled_bytes = spill.spilled_bytes
+    with memory.limited(TINY_LIMIT):
+        result = list(hash_join.HashJoin(joiner, ['key'])(rows_a, rows_b))
+        # Groups of join without keys are the whole inputs
+        cross = list(ops.Join(joiner, [])(rows_a[:2], rows_b))
+    assert spill.spilled_bytes > spilled_bytes
+    assert expected == sorted(result, key=_key)
+    assert sorted(ops.Join(joiner, [])(rows_a[:2], rows_b), key=_key) == sorted(cross, key=_key)
+
+
+def test_spillable_list_is_iterated_several_times() -> None:
+    rows = _make_rows(ROWS, 5)
+    with memory.limited(TINY_LIMIT):
+        spillable = spill.SpillableList(iter(rows))
+    assert ROWS == len(spillable)
+    first, second = iter(spillable), iter(spillable)
+    assert rows == [row for row, _ in zip(first, second)]
+    assert rows[0] in spillable
+
+
+def test_graph_run_with_memory_limit() -> None:
+    docs = [{'doc_id': doc_id, 'text': 'hello little world {}'.format(doc_id % 3000)} for doc_id in range(ROWS)]
+    split = Graph.graph_from_iter('docs').map(ops.Split('text'))
+    graph = split.sort(['text']).reduce(ops.Count('count'), ['text']) \
+        .join(ops.InnerJoiner(), split.reduce(ops.Count('total'), ['text'], strategy='hash'), ['text'],
+              strategy='hash')
+
+    expected = graph.run(docs=lambda: iter(docs))
+    result = graph.run(memory_limit=TINY_LIMIT, profile=True, docs=lambda: iter(docs))
+
+    assert sorted(expected, key=_key) == sorted(result, key=_key)
+    assert graph.last_profile is not None
+    assert any(stats.spilled_bytes for stats in graph.last_profile.nodes.values())
+    assert memory.budget() is None
+
+
+class _RecordBudget(ops.RowMapper):
+    """Mapper which records budget it runs under"""
+    def __init__(self) -> None:
+        self.budgets: tp.List[tp.Optional[memory.MemoryBudget]] = []
+
+    def map_row(self, row: ops.TRow) -> ops.TRow:
+        self.budgets.append(memory.budget())
+        return row
+
+
+def test_interleaved_streams_keep_their_budgets() -> None:
+    docs = [{'doc_id': doc_id, 'text': 'hello'} for doc_id in range(10)]
+    first_mapper, second_mapper = _RecordBudget(), _RecordBudget()
+    first = Graph.graph_from_iter('docs').map(first_mapper).iter(memory_limit=10 ** 9, docs=lambda: iter(docs))
+    second = Graph.graph_from_iter('docs').map(second_mapper).iter(memory_limit=10 ** 9, docs=lambda: iter(docs))
+
+    result = []
+    for first_row, second_row in zip(first, second):
+        assert memory.budget() is None
+        result.append((first_row, second_row))
+    assert [(row, row) for row in docs] == result
+    assert [] == list(first) == list(second)
+
+    assert memory.budget() is None
+    assert None not in first_mapper.budgets + second_mapper.budgets
+    assert 1 == len(set(map(id, first_mapper.budgets))) == len(set(map(id, second_mapper.budgets)))
+    assert first_mapper.budgets[0] is not second_mapper.budgets[0]
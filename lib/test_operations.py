@@ -784,3 +784,16 @@ def test_simple_join_with_collision() -> None:
                       keys=['player_id'])(presorted_games, presorted_players)
 
     assert etalon == sorted(result, key=itemgetter('game_id'))
+
+
+def test_map_copies_rows_it_does_not_own() -> None:
+    tests: ops.TRowsIterable = [
+        {'test_id': 1, 'text': 'UPPER'}
+    ]
+
+    borrowed = list(ops.Map(ops.LowerCase(column='text'))(tests))
+    assert [{'test_id': 1, 'text': 'UPPER'}] == tests
+    assert [{'test_id': 1, 'text': 'upper'}] == borrowed
+
+    owned = list(ops.Map(ops.LowerCase(column='text'), owns_rows=True)(tests))
+    assert owned[0] is tests[0]
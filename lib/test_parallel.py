@@ -0,0 +1,84 @@
+import os
+import typing as tp
+
+import pytest
+
+from . import operations as ops
+from . import parallel
+from .graph import Graph
+
+
+def _make_docs(count: int) -> tp.List[ops.TRow]:
+    return [{'doc_id': doc_id, 'text': 'Hello, little World! hello {}'.format(doc_id % 7)} for doc_id in range(count)]
+
+
+def _tokenize(source: Graph, **kwargs: tp.Any) -> Graph:
+    return source \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.LowerCase('text')) \
+        .map(ops.Split('text'), **kwargs)
+
+
+def test_parallel_map_ordered() -> None:
+    docs = _make_docs(500)
+    expected = _tokenize(Graph.graph_from_iter('docs')).run(docs=lambda: iter(docs))
+
+    graph = _tokenize(Graph.graph_from_iter('docs'), workers=3, chunk_size=16, max_chunks_in_flight=2)
+
+    assert expected == graph.run(optimize=False, docs=lambda: iter(docs))
+    assert expected == graph.run(docs=lambda: iter(docs))
+    assert docs == _make_docs(500)
+
+
+def test_parallel_map_unordered() -> None:
+    docs = _make_docs(500)
+    graph = Graph.graph_from_iter('docs') \
+        .map(ops.Apply(lambda doc_id: doc_id * 2, ['doc_id'], 'double'), workers=2, ordered=False, chunk_size=7)
+
+    result = graph.run(docs=lambda: iter(docs))
+
+    assert () == graph.ordering
+    assert list(range(0, 1000, 2)) == sorted(row['double'] for row in result)
+
+
+def test_parallel_map_uses_workers_in_columnar_mode() -> None:
+    docs = _make_docs(100)
+    graph = Graph.graph_from_iter('docs').map(ops.Apply(lambda doc_id: os.getpid(), ['doc_id'], 'pid'), workers=2)
+
+    result = graph.run(columnar=True, docs=lambda: iter(docs))
+
+    assert list(range(100)) == [row['doc_id'] for row in result]
+    assert os.getpid() not in {row['pid'] for row in result}
+
+
+def test_parallel_map_is_fused() -> None:
+    optimized = _tokenize(Graph.graph_from_iter('docs'), workers=2).optimize()
+
+    assert isinstance(optimized.operation, parallel.ParallelMap)
+    assert isinstance(optimized.operation.mapper, ops.FusedMapper)
+    # Rows are unpickled in workers, so they are not copied there
+    assert 'dict(' not in optimized.operation.mapper.source
+
+
+def test_parallel_map_error() -> None:
+    graph = Graph.graph_from_iter('docs').map(ops.Apply(lambda text: 1 / 0, ['text']), workers=2)
+
+    with pytest.raises(ZeroDivisionError):
+        graph.run(docs=lambda: iter(_make_docs(10)))
+
+
+def test_parallel_from_file(tmp_path: tp.Any) -> None:
+    path = tmp_path / 'docs.txt'
+    docs = _make_docs(300)
+    path.write_text(''.join(repr(doc) + '\n' for doc in docs[:-1]) + repr(docs[-1]))
+
+    (tmp_path / 'empty.txt').write_text('')
+    assert [] == list(parallel.newline_aligned_blocks(str(tmp_path / 'empty.txt'), 64))
+    blocks = list(parallel.newline_aligned_blocks(str(path), 100))
+    assert path.stat().st_size == sum(length for _, length in blocks)
+    assert all(path.read_bytes()[offset + length - 1:offset + length] == b'\n' for offset, length in blocks[:-1])
+
+    graph = Graph.graph_from_file(str(path), eval, workers=3, block_size=100)
+    assert docs == graph.run()
+    unordered = Graph.graph_from_file(str(path), eval, workers=3, ordered=False, block_size=100)
+    assert sorted(docs, key=repr) == sorted(unordered.run(), key=repr)
@@ -0,0 +1,46 @@
+import random
+import typing as tp
+
+from . import external_sort as sort
+from . import operations as ops
+from . import partition
+from . import planner
+from .graph import Graph
+
+
+def _make_docs(count: int) -> tp.List[ops.TRow]:
+    generator = random.Random(5)
+    return [{'doc_id': generator.randint(0, 20), 'text': 'w' + str(generator.randint(0, 30)),
+             'score': generator.randint(0, 100)} for _ in range(count)]
+
+
+def test_partitioned_stages_match_sequential() -> None:
+    docs = _make_docs(1000)
+    source = Graph.graph_from_iter('docs')
+    sorted_docs = source.sort(['doc_id', 'score'])
+    graphs = [
+        source.sort(['text']).reduce(ops.Count('count'), ['text']),
+        source.reduce(ops.Sum('score'), ['doc_id'], strategy='hash'),
+        sorted_docs.reduce(ops.TopN('score', 2), ['doc_id']).join(ops.LeftJoiner(), sorted_docs, ['doc_id']),
+        source.join(ops.OuterJoiner(), source.map(ops.Project(['text'])), ['text'], strategy='hash'),
+        source.sort(['score', 'text']),
+    ]
+
+    for graph in graphs:
+        expected = graph.run(docs=lambda: iter(docs))
+        result = graph.run(workers=3, docs=lambda: iter(docs))
+        if graph.ordering:
+            assert expected == result
+        else:
+            assert sorted(expected, key=repr) == sorted(result, key=repr)
+
+
+def test_partition_stages_takes_sorts() -> None:
+    graph = Graph.graph_from_iter('docs').sort(['text']).reduce(ops.Count('count'), ['text'])
+
+    partitioned = planner.partition_stages(graph, 4)
+
+    assert isinstance(partitioned.operation, partition.Partitioned)
+    assert isinstance(partitioned.operation.stage.dependencies[0].operation, sort.PartialSort)
+    assert isinstance(partitioned.dependencies[0].operation, ops.FromIter)
+    assert ('text',) == partitioned.ordering
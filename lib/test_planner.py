@@ -0,0 +1,155 @@
+import typing as tp
+
+from . import operations as ops
+from . import planner
+from .graph import Graph
+
+
+def _word_count(source: Graph) -> Graph:
+    return source \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.LowerCase('text')) \
+        .map(ops.Filter(lambda row: row['doc_id'] > 1)) \
+        .map(ops.Split('text')) \
+        .map(ops.Apply(len, ['text'], 'length')) \
+        .sort(['text', 'length']) \
+        .reduce(ops.Count('count'), ['text'])
+
+
+def test_fuse_maps() -> None:
+    docs = [
+        {'doc_id': 1, 'text': 'Hello, World!'},
+        {'doc_id': 2, 'text': 'hello, my little WORLD'},
+        {'doc_id': 3, 'text': 'Hello, my little little hell'}
+    ]
+    graph = _word_count(Graph.graph_from_iter('docs'))
+
+    optimized = graph.optimize()
+
+    fused = optimized.dependencies[0].dependencies[0].operation
+    assert isinstance(fused, ops.Map) and isinstance(fused.mapper, ops.FusedMapper)
+    assert 5 == len(fused.mapper.mappers)
+    assert 'FusedMapper(FilterPunctuation' in optimized.describe()
+    assert graph.run(optimize=False, docs=lambda: iter(docs)) == optimized.run(docs=lambda: iter(docs))
+    assert [{'doc_id': 1, 'text': 'Hello, World!'}] == docs[:1]
+
+
+def test_fused_mapper_copies_once() -> None:
+    row = {'text': 'A, B'}
+
+    mapper = ops.FusedMapper([ops.Filter(lambda row: True), ops.FilterPunctuation('text'), ops.LowerCase('text'),
+                              ops.Split('text')])
+
+    assert [{'text': 'a'}, {'text': 'b'}] == list(mapper(row))
+    assert {'text': 'A, B'} == row
+    assert 1 == mapper.source.count('dict(')
+
+
+def test_shared_map_is_not_fused() -> None:
+    shared = Graph.graph_from_iter('docs').map(ops.LowerCase('text'))
+    graph = shared.map(ops.Split('text')).join(ops.InnerJoiner(), shared.map(ops.DummyMapper()), [])
+
+    optimized = graph.optimize()
+
+    assert 'FusedMapper' not in optimized.describe()
+
+
+def test_remove_redundant_sorts() -> None:
+    docs = [{'doc_id': doc_id % 3, 'text': text} for doc_id, text in enumerate('b a c a b d c a'.split())]
+    graph = Graph.graph_from_iter('docs') \
+        .sort(['doc_id']) \
+        .reduce(ops.Count('count'), ['doc_id']) \
+        .map(ops.Apply(lambda count: count * 2, ['count'], 'double')) \
+        .sort(['doc_id']) \
+        .sort(['doc_id', 'double']) \
+        .map(ops.Apply(str, ['doc_id'], 'doc_id')) \
+        .sort(['doc_id'])
+
+    optimized = graph.optimize()
+
+    plan = optimized.describe()
+    assert 2 == plan.count('ExternalSort(')
+    assert 1 == plan.count('PartialSort(')
+    assert ('doc_id', 'double') == optimized.dependencies[0].dependencies[0].ordering
+    assert 'Optimized plan:' in graph.explain()
+    assert graph.run(optimize=False, docs=lambda: iter(docs)) == optimized.run(docs=lambda: iter(docs))
+
+
+class _NegateKey(ops.Reducer):
+    def __call__(self, group_key: tp.Tuple[str, ...], rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        for row in rows:
+            yield {'k': -row['k']}
+
+
+class _NegateKeyJoiner(ops.InnerJoiner):
+    keeps_keys = False
+
+    def __call__(self, keys: tp.Sequence[str], rows_a: ops.TRowsIterable,
+                 rows_b: ops.TRowsIterable) -> ops.TRowsGenerator:
+        for row in super().__call__(keys, rows_a, rows_b):
+            yield {'k': -row['k']}
+
+
+def test_sorts_after_operations_which_rewrite_keys_are_kept() -> None:
+    numbers = [{'k': k} for k in range(5)]
+    source = Graph.graph_from_iter('numbers').sort(['k'])
+    reduced = source.reduce(_NegateKey(), ['k']).sort(['k'])
+    joined = source.join(_NegateKeyJoiner(), source, ['k']).sort(['k'])
+
+    for graph in (reduced, joined):
+        assert 'ExternalSort(' in graph.optimize().describe().split('\n')[0]
+        assert [{'k': -k} for k in range(4, -1, -1)] == graph.run(numbers=lambda: iter(numbers))
+
+
+def test_map_after_removed_sort_copies_rows() -> None:
+    docs = [{'doc_id': 1, 'text': 'Hello'}, {'doc_id': 2, 'text': 'World'}]
+    graph = Graph.graph_from_iter('docs') \
+        .reduce(ops.FirstReducer(), ['doc_id']) \
+        .sort(['doc_id']) \
+        .map(ops.LowerCase('text'))
+
+    optimized = graph.optimize()
+
+    assert 'ExternalSort(' not in optimized.describe()
+    assert isinstance(optimized.operation, ops.Map) and not optimized.operation.owns_rows
+    assert [{'doc_id': 1, 'text': 'hello'}, {'doc_id': 2, 'text': 'world'}] == graph.run(docs=lambda: iter(docs))
+    assert [{'doc_id': 1, 'text': 'Hello'}, {'doc_id': 2, 'text': 'World'}] == docs
+
+
+def test_insert_combiners() -> None:
+    docs = [{'doc_id': doc_id % 3, 'text': text} for doc_id, text in enumerate('b a c a b d c a'.split())]
+    source = Graph.graph_from_iter('docs')
+    graph = source.sort(['text']).reduce(ops.Count('count'), ['text']) \
+        .join(ops.InnerJoiner(), source.sort(['doc_id', 'text']).reduce(ops.Count('count'), ['doc_id']), [])
+
+    optimized = graph.optimize()
+
+    plan = optimized.describe()
+    assert 1 == plan.count('Combine(')
+    assert 1 == plan.count('MergePartials(')
+    assert graph.run(optimize=False, docs=lambda: iter(docs)) == optimized.run(docs=lambda: iter(docs))
+
+
+def test_maps_after_combiners_and_partial_sorts_copy_rows() -> None:
+    docs = [{'doc_id': index // 3, 'text': text} for index, text in enumerate('B a C a b D c A'.split())]
+    source = Graph.graph_from_iter('docs')
+    counts = source.sort(['text']).reduce(ops.Count('count'), ['text']).map(ops.LowerCase('text'))
+    firsts = source.reduce(ops.FirstReducer(), ['doc_id']).sort(['doc_id']).sort(['doc_id', 'text']) \
+        .map(ops.LowerCase('text'))
+    graph = counts.concat(firsts)
+    expected = graph.run(optimize=False, docs=lambda: [dict(row) for row in docs])
+
+    optimized = graph.optimize()
+    plan = optimized.describe()
+    assert 'Combine(' in plan and 'PartialSort(' in plan
+
+    for workers in (1, 2):
+        executed = planner.partition_stages(optimized, workers) if workers > 1 else optimized
+        maps = [node for node in executed.dependencies if isinstance(node.operation, ops.Map)]
+        assert 2 == len(maps)
+        for node in maps:
+            assert isinstance(node.operation, ops.Map)
+            assert node.dependencies[0].owns_rows == node.operation.owns_rows
+        original = [dict(row) for row in docs]
+        assert expected == graph.run(workers=workers, docs=lambda: iter(docs))
+        assert original == docs
@@ -0,0 +1,61 @@
+from operator import itemgetter
+
+from . import external_sort as sort
+from . import memory
+from . import operations as ops
+from . import pool
+
+
+def _rows(count: int) -> ops.TRowsIterable:
+    return [{'id': i, 'key': (i * 7) % 10} for i in range(count)]
+
+
+def test_sort_workers_are_reused() -> None:
+    rows = _rows(100)
+    worker_pool = pool.default_pool()
+    for use_shared_memory in (False, True):
+        operation = sort.ExternalSort(['key', 'id'], use_shared_memory=use_shared_memory)
+        assert sorted(rows, key=itemgetter('key', 'id')) == list(operation(iter(rows)))
+        worker = worker_pool.acquire(use_shared_memory)
+        worker_pool.release(worker)
+        assert sorted(rows, key=itemgetter('key', 'id')) == list(operation(iter(rows)))
+        assert worker is worker_pool.acquire(use_shared_memory)
+        worker_pool.release(worker)
+
+
+def test_concurrent_sorts_get_workers_of_their_own() -> None:
+    rows = _rows(3000)
+    by_key = sort.ExternalSort(['key', 'id'], batch_size=10)(iter(rows))
+    by_id = sort.ExternalSort(['id'], batch_size=10)(iter(rows))
+
+    result = [(a['key'], b['id']) for a, b in zip(by_key, by_id)]
+
+    assert [(a['key'], b['id']) for a, b in zip(sorted(rows, key=itemgetter('key', 'id')), rows)] == result
+
+
+def test_abandoned_sort_terminates_worker() -> None:
+    with pool.WorkerPool() as worker_pool:
+        worker = worker_pool.acquire()
+        worker.start_job(sort._sort_job, 10, ('key',), sort.DEFAULT_MAX_ROWS_IN_MEMORY,
+                         sort.DEFAULT_MAX_BYTES_IN_MEMORY)
+        worker.input_channel.send_rows(worker.endpoint, _rows(100))
+        next(worker.output_channel.recv_rows(worker.endpoint))
+        worker_pool.release(worker, reusable=False)
+        assert not worker.process.is_alive()
+        assert 0 == worker_pool.idle_workers
+
+        worker = worker_pool.acquire()
+        worker_pool.release(worker)
+        assert 1 == worker_pool.idle_workers
+    assert 0 == worker_pool.idle_workers
+    assert not worker.process.is_alive()
+
+
+def test_sort_under_memory_budget_starts_new_process() -> None:
+    rows = _rows(100)
+    idle_workers = pool.default_pool().idle_workers
+    with memory.limited(10 ** 9):
+        generator = sort.ExternalSort(['key', 'id'])(iter(rows))
+        assert sorted(rows, key=itemgetter('key', 'id'))[0] == next(generator)
+        assert idle_workers == pool.default_pool().idle_workers
+        generator.close()
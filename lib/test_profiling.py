@@ -0,0 +1,42 @@
+from . import operations as ops
+from .graph import Graph
+
+
+def test_profile_counts_rows_and_spills() -> None:
+    docs = [{'doc_id': doc_id, 'text': 'hello little world {}'.format(doc_id)} for doc_id in range(100)]
+    split = Graph.graph_from_iter('docs').map(ops.Split('text'))
+    graph = split.reduce(ops.Count('count'), ['text'], strategy='hash', max_keys_in_memory=10) \
+        .join(ops.InnerJoiner(), split, ['text'], strategy='hash')
+
+    result = graph.run(optimize=False, profile=True, docs=lambda: iter(docs))
+
+    profile = graph.last_profile
+    assert profile is not None
+    assert len(result) == profile[graph].rows_out
+    reduce_stats = profile[graph.dependencies[0]]
+    assert (400, 103) == (reduce_stats.rows_in, reduce_stats.rows_out)
+    assert reduce_stats.spilled_bytes > 0
+    # Split is shared by both branches, so it runs once
+    assert 100 == profile[split].rows_in
+    assert 0 == profile[split].spilled_bytes
+    assert all(stats.wall_time >= 0 and stats.peak_rss > 0 for stats in profile.nodes.values())
+    assert 4 == profile.describe().count('-- rows')
+
+
+def test_profile_of_optimized_graph_is_looked_up_by_nodes_of_graph() -> None:
+    docs = [{'doc_id': doc_id, 'text': 'Hello little World {}'.format(doc_id % 7)} for doc_id in range(100)]
+    lower = Graph.graph_from_iter('docs').map(ops.LowerCase('text'))
+    split = lower.map(ops.Split('text'))
+    counted = split.sort(['text']).reduce(ops.Count('count'), ['text'])
+    graph = counted.sort(['text'])
+
+    for workers in (1, 2):
+        graph.run(profile=True, workers=workers, docs=lambda: iter(docs))
+
+        profile = graph.last_profile
+        assert profile is not None
+        assert all(node in profile for node in (graph, counted, split, lower))
+        # Maps are fused, sort of sorted rows is removed
+        assert profile[lower] is profile[split]
+        assert profile[graph] is profile[counted]
+        assert (10, 400) == (profile[counted].rows_out, profile[split].rows_out)
@@ -0,0 +1,78 @@
+import json
+import pathlib
+
+import numpy as np
+import pytest
+
+from . import columnar
+from . import operations as ops
+from . import readers
+from .graph import Graph
+
+
+ROWS = [
+    {'doc_id': 1, 'score': 0.5, 'text': 'hello, world', 'flag': True},
+    {'doc_id': 2, 'score': 1.5, 'text': 'little "world"', 'flag': False},
+]
+SCHEMA = {'doc_id': int, 'score': float, 'text': str, 'flag': bool}
+
+
+def test_ndjson_reader(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / 'docs.ndjson')
+    with open(path, 'w') as file:
+        file.write('\n'.join(json.dumps(row) for row in ROWS) + '\n\n')
+
+    assert ROWS == Graph.graph_from_ndjson(path).run()
+    assert [{'text': row['text'], 'doc_id': row['doc_id']} for row in ROWS] == \
+        Graph.graph_from_ndjson(path, columns=['text', 'doc_id']).run()
+    assert [{'doc_id': 1, 'missing': None}, {'doc_id': 2, 'missing': None}] == \
+        Graph.graph_from_ndjson(path, {'doc_id': int, 'missing': str}).run()
+
+
+def test_csv_and_tsv_readers(tmp_path: pathlib.Path) -> None:
+    csv_path = str(tmp_path / 'docs.csv')
+    with open(csv_path, 'w') as file:
+        file.write('text,doc_id,flag,score\n"hello, world",1,true,0.5\n"little ""world""",2,false,1.5\n')
+    tsv_path = str(tmp_path / 'docs.tsv')
+    with open(tsv_path, 'w') as file:
+        file.write('hello, world\t1\tTrue\t0.5\nlittle "world"\t2\tFalse\t1.5\n')
+
+    assert ROWS == [{name: row[name] for name in SCHEMA} for row in Graph.graph_from_csv(csv_path, SCHEMA).run()]
+    assert [{'doc_id': '1'}, {'doc_id': '2'}] == Graph.graph_from_csv(csv_path, columns=['doc_id']).run()
+    schema = {'text': str, 'doc_id': int, 'flag': bool, 'score': float}
+    assert ROWS == [{name: row[name] for name in SCHEMA} for row in
+                    Graph.graph_from_tsv(tsv_path, schema, header=False).run()]
+    with pytest.raises(ValueError):
+        Graph.graph_from_csv(csv_path, columns=['unknown']).run()
+
+
+def test_csv_reader_skips_blank_lines(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / 'numbers.csv')
+    with open(path, 'w') as file:
+        file.write('a,b\n1,2\n\n3,4\n\n')
+
+    assert [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}] == Graph.graph_from_csv(path, {'a': int, 'b': int}).run()
+
+
+def test_csv_reader_rejects_records_of_wrong_length(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / 'numbers.csv')
+    with open(path, 'w') as file:
+        file.write('a,b\n1,2\n3\n')
+
+    with pytest.raises(ValueError, match='Line 3 of .*numbers.csv'):
+        Graph.graph_from_csv(path, {'a': int, 'b': int}).run()
+
+
+def test_reader_batches(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / 'docs.csv')
+    with open(path, 'w') as file:
+        file.write('doc_id,score\n' + ''.join('{},{}\n'.format(index, index / 2) for index in range(10)))
+    reader = readers.FromCSV(path, {'doc_id': int, 'score': float})
+
+    batches = list(reader.batches(4))
+
+    assert [4, 4, 2] == list(map(len, batches))
+    assert np.int64 == batches[0]['doc_id'].dtype and np.float64 == batches[0]['score'].dtype
+    assert list(reader()) == list(columnar.to_rows(batches))
+    graph = Graph.graph_from_csv(path, {'doc_id': int, 'score': float}).map(ops.Filter(lambda row: row['doc_id'] > 6))
+    assert graph.run() == graph.run(columnar=True)
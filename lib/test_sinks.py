@@ -0,0 +1,68 @@
+import csv
+import json
+import typing as tp
+
+import pytest
+
+from . import operations as ops
+from . import sinks
+from .graph import Graph
+
+
+DOCS = [{'doc_id': i, 'text': 'hello, little world {}'.format(i % 3)} for i in range(10)]
+
+
+def _graph() -> Graph:
+    return Graph.graph_from_iter('docs').map(ops.Split('text')).sort(['text', 'doc_id'])
+
+
+def test_iter_yields_rows_lazily() -> None:
+    pulled = []
+
+    def docs() -> tp.Iterator[ops.TRow]:
+        for doc in DOCS:
+            pulled.append(doc)
+            yield doc
+
+    rows = Graph.graph_from_iter('docs').map(ops.Split('text')).iter(docs=docs)
+
+    assert {'doc_id': 0, 'text': 'hello,'} == next(rows)
+    assert 1 == len(pulled)
+    assert _graph().run(docs=lambda: iter(DOCS)) == list(_graph().iter(docs=lambda: iter(DOCS)))
+
+
+@pytest.mark.parametrize('batch_size', [3, sinks.DEFAULT_BATCH_SIZE])
+def test_sinks_write_all_rows(tmpdir: tp.Any, batch_size: int) -> None:
+    expected = _graph().run(docs=lambda: iter(DOCS))
+    plan = _graph().prepare()
+
+    ndjson = str(tmpdir.join('rows.ndjson'))
+    assert len(expected) == plan.write(sinks.NDJSONSink(ndjson, batch_size=batch_size), docs=lambda: iter(DOCS))
+    with open(ndjson) as file:
+        assert expected == [json.loads(line) for line in file]
+
+    binary = str(tmpdir.join('rows.bin'))
+    assert len(expected) == _graph().write(sinks.BinarySink(binary, batch_size=batch_size), docs=lambda: iter(DOCS))
+    assert expected == list(sinks.read_binary(binary))
+
+    table = str(tmpdir.join('rows.csv'))
+    assert len(expected) == _graph().write(sinks.CSVSink(table, columns=['text', 'doc_id'], batch_size=batch_size),
+                                           docs=lambda: iter(DOCS))
+    with open(table, newline='') as file:
+        assert [[row['text'], str(row['doc_id'])] for row in expected] == list(csv.reader(file))[1:]
+
+
+def test_failed_run_keeps_previous_file(tmpdir: tp.Any) -> None:
+    filename = str(tmpdir.join('rows.ndjson'))
+    sink = sinks.NDJSONSink(filename, batch_size=1)
+    sink.write(iter(DOCS))
+
+    def failing() -> tp.Iterator[ops.TRow]:
+        yield DOCS[0]
+        raise RuntimeError('source failed')
+
+    with pytest.raises(RuntimeError):
+        _graph().write(sink, docs=failing)
+    with open(filename) as file:
+        assert DOCS == [json.loads(line) for line in file]
+    assert ['rows.ndjson'] == [path.basename for path in tmpdir.listdir()]
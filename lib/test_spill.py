@@ -0,0 +1,79 @@
+import os
+import typing as tp
+
+from . import memory
+from . import operations as ops
+from . import spill
+
+
+def test_spillable_queue_keeps_order() -> None:
+    queue = spill.SpillableQueue(max_rows_in_memory=3)
+    result = []
+
+    for i in range(10):
+        queue.append({'id': i})
+    assert 7 == queue.spilled
+    for _ in range(4):
+        result.append(queue.popleft())
+    for i in range(10, 15):
+        queue.append({'id': i})
+    while queue:
+        result.append(queue.popleft())
+
+    assert list(range(15)) == [row['id'] for row in result]
+    assert 0 == queue.spilled
+
+
+def test_spillable_queue_releases_what_it_reserved() -> None:
+    with memory.limited(1):
+        queue = spill.SpillableQueue()
+        for i in range(2 * memory.MIN_SPILL_ROWS):
+            queue.append({'id': i})
+        assert memory.MIN_SPILL_ROWS == queue.spilled
+        for _ in range(memory.MIN_SPILL_ROWS + 1):
+            queue.popleft()
+        # Rows read back from disk are ahead of the row appended now
+        assert 0 == queue.spilled
+        queue.append({'id': -1, 'payload': 'x' * 10000})
+        while queue:
+            queue.popleft()
+
+        assert 0 == queue._reservation.size
+        queue.close()
+
+
+def test_tee_spills_lagging_branch() -> None:
+    rows: ops.TRowsIterable = [{'id': i} for i in range(100)]
+
+    first, second = spill.tee(iter(rows), 2, max_rows_in_memory=10)
+
+    assert rows == list(first)
+    assert rows == list(second)
+
+
+def test_tee_branches_do_not_share_rows() -> None:
+    rows: ops.TRowsIterable = [{'id': i} for i in range(5)]
+
+    first, second = spill.tee(iter(rows), 2)
+    for row in first:
+        row['id'] = -1
+
+    assert [0, 1, 2, 3, 4] == [row['id'] for row in second]
+
+
+def test_stored_rows_take_path_once_all_are_yielded(tmp_path: tp.Any) -> None:
+    path = str(tmp_path / 'rows')
+    rows = spill.store_rows(({'id': i} for i in range(10)), path, batch_size=3)
+
+    for row in rows:
+        assert not os.path.exists(path)
+        row['id'] = -1
+    assert [path] == [str(tmp_path / name) for name in os.listdir(str(tmp_path))]
+
+    with open(path, 'rb') as file:
+        assert [{'id': i} for i in range(10)] == list(spill.read_rows(file))
+
+    stopped = spill.store_rows(({'id': i} for i in range(10)), path + '.other')
+    next(stopped)
+    stopped.close()
+    assert [path] == [str(tmp_path / name) for name in os.listdir(str(tmp_path))]
@@ -0,0 +1,24 @@
+from multiprocessing import Pipe
+
+from . import operations as ops
+from . import transport
+
+
+def test_batched() -> None:
+    rows: ops.TRowsIterable = [{'id': i} for i in range(7)]
+
+    batches = list(transport.batched(rows, 3))
+
+    assert [[0, 1, 2], [3, 4, 5], [6]] == [[row['id'] for row in batch] for batch in batches]
+
+
+def test_shared_memory_channel_inline_fallback() -> None:
+    rows: ops.TRowsIterable = [{'id': i, 'text': 'x' * 100} for i in range(10)]
+    channel = transport.SharedMemoryChannel(batch_size=5, slots=2, slot_size=128)
+    local_endpoint, remote_endpoint = Pipe()
+    try:
+        # Every batch is larger than a slot, so it has to go through the pipe
+        assert 10 == channel.send_rows(local_endpoint, rows)
+        assert rows == list(channel.recv_rows(remote_endpoint))
+    finally:
+        channel.close()
@@ -0,0 +1,149 @@
+import struct
+import typing as tp
+
+from itertools import islice
+from multiprocessing import connection, shared_memory, Semaphore
+
+from . import codec
+from . import operations as ops
+
+
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_SLOTS = 4
+DEFAULT_SLOT_SIZE = 4 * 1024 * 1024
+
+# Frame header of shared memory channel: slot index and payload length, slot index -1 means inline payload
+_HEADER = struct.Struct('<iI')
+_INLINE_SLOT = -1
+_END_OF_STREAM = b''
+
+
+def batched(rows: ops.TRowsIterable, batch_size: int) -> tp.Generator[tp.List[ops.TRow], None, None]:
+    """Group rows into lists of at most batch_size rows"""
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+class Channel:
+    """
+    One direction of row transport between two processes over multiprocessing connection.
+    Rows are encoded in batches by codec and every batch is sent as a single length-prefixed frame, empty frame marks
+    the end of stream. The channel itself is stateless with respect to endpoints, so the same object is passed
+    to both processes and each of them uses its own end of the pipe.
+    """
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        """
+        :param batch_size: number of rows sent in one frame
+        """
+        self.batch_size = batch_size
+
+    def send_rows(self, endpoint: connection.Connection, rows: ops.TRowsIterable) -> int:
+        """
+        Send all the rows followed by end of stream mark
+        :return: number of rows sent
+        """
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            self.send_batch(endpoint, batch)
+            count += len(batch)
+        self.send_end(endpoint)
+        return count
+
+    def send_batch(self, endpoint: connection.Connection, batch: tp.List[ops.TRow]) -> None:
+        """Send rows as a single frame, for senders which group rows into batches on their own"""
+        self._send_payload(endpoint, codec.encode_batch(batch))
+
+    def send_end(self, endpoint: connection.Connection) -> None:
+        """Send end of stream mark"""
+        endpoint.send_bytes(_END_OF_STREAM)
+
+    def recv_rows(self, endpoint: connection.Connection) -> ops.TRowsGenerator:
+        """Yield rows until end of stream mark is received"""
+        while True:
+            batch = self._recv_batch(endpoint)
+            if batch is None:
+                break
+            yield from batch
+
+    def close(self) -> None:
+        """Release resources owned by channel"""
+        pass
+
+    def _send_payload(self, endpoint: connection.Connection, payload: bytes) -> None:
+        endpoint.send_bytes(payload)
+
+    def _recv_batch(self, endpoint: connection.Connection) -> tp.Optional[tp.List[ops.TRow]]:
+        payload = endpoint.recv_bytes()
+        if payload == _END_OF_STREAM:
+            return None
+        return codec.decode_batch(payload)
+
+
+class SharedMemoryChannel(Channel):
+    """
+    Channel which passes batch payloads through ring of fixed size slots in shared memory, so that only small
+    headers go through the pipe. Free slots are counted by semaphore; since frames are consumed in order, slots are
+    reused round-robin. Batches which do not fit into a slot are sent inline through the pipe.
+    Must be created before the other process is started.
+    """
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE,
+                 slots: int = DEFAULT_SLOTS, slot_size: int = DEFAULT_SLOT_SIZE) -> None:
+        """
+        :param batch_size: number of rows sent in one frame
+        :param slots: number of slots in ring buffer, i.e. maximal number of batches in flight
+        :param slot_size: size of one slot in bytes
+        """
+        super().__init__(batch_size)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.memory = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self.free_slots = Semaphore(slots)
+        self._next_slot = 0
+
+    def close(self) -> None:
+        self.memory.close()
+        self.memory.unlink()
+
+    def _send_payload(self, endpoint: connection.Connection, payload: bytes) -> None:
+        if len(payload) > self.slot_size:
+            endpoint.send_bytes(_HEADER.pack(_INLINE_SLOT, len(payload)))
+            endpoint.send_bytes(payload)
+            return
+        self.free_slots.acquire()
+        slot = self._next_slot
+        self._next_slot = (self._next_slot + 1) % self.slots
+        offset = slot * self.slot_size
+        buffer = self.memory.buf
+        assert buffer is not None
+        buffer[offset:offset + len(payload)] = payload
+        endpoint.send_bytes(_HEADER.pack(slot, len(payload)))
+
+    def _recv_batch(self, endpoint: connection.Connection) -> tp.Optional[tp.List[ops.TRow]]:
+        header = endpoint.recv_bytes()
+        if header == _END_OF_STREAM:
+            return None
+        slot, length = _HEADER.unpack(header)
+        if slot == _INLINE_SLOT:
+            return codec.decode_batch(endpoint.recv_bytes())
+        offset = slot * self.slot_size
+        buffer = self.memory.buf
+        assert buffer is not None
+        view = buffer[offset:offset + length]
+        try:
+            # Rows are decoded straight from shared memory, without copying payload into bytes
+            batch = codec.decode_batch(view)
+        finally:
+            view.release()
+            self.free_slots.release()
+        return batch
+
+
+def make_channel(batch_size: int = DEFAULT_BATCH_SIZE, use_shared_memory: bool = False) -> Channel:
+    """Construct channel of requested kind"""
+    if use_shared_memory:
+        return SharedMemoryChannel(batch_size)
+    return Channel(batch_size)
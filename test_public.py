@@ -1,7 +1,9 @@
 from pytest import approx
 from operator import itemgetter
+import typing as tp
 
 from .graphs import word_count_graph, word_count_graph_from_file, inverted_index_graph
+from .graphs import word_count_incremental_graph, inverted_index_incremental_graph
 
 
 def test_word_count_from_file() -> None:
@@ -91,3 +93,33 @@ def test_tf_idf() -> None:
     result = graph.run(texts=lambda: iter(rows))
 
     assert expected == sorted(result, key=itemgetter('doc_id', 'text'))
+
+
+def test_word_count_incremental(tmp_path: tp.Any) -> None:
+    graph = word_count_incremental_graph('text', str(tmp_path), text_column='text', count_column='count')
+    docs1 = [{'doc_id': 1, 'text': 'hello, my little WORLD'}]
+    docs2 = [{'doc_id': 2, 'text': 'Hello, my little little hell'}]
+
+    assert word_count_graph('text').run(text=lambda: iter(docs1)) == graph.run(text=lambda: iter(docs1))
+    expected = word_count_graph('text').run(text=lambda: iter(docs1 + docs2))
+    assert expected == sorted(graph.run(text=lambda: iter(docs2)), key=itemgetter('count', 'text'))
+
+
+def test_tf_idf_incremental(tmp_path: tp.Any) -> None:
+    graph = inverted_index_incremental_graph('texts', str(tmp_path))
+    rows = [
+        {'doc_id': 1, 'text': 'hello, little world'},
+        {'doc_id': 2, 'text': 'little'},
+        {'doc_id': 3, 'text': 'little little little'},
+        {'doc_id': 4, 'text': 'little? hello little world'},
+        {'doc_id': 5, 'text': 'HELLO HELLO! WORLD...'},
+        {'doc_id': 6, 'text': 'world? world... world!!! WORLD!!! HELLO!!!'}
+    ]
+    expected = inverted_index_graph('texts').run(texts=lambda: iter(rows))
+
+    for start in range(0, len(rows), 2):
+        result = graph.run(texts=lambda: iter(rows[start:start + 2]))
+
+    assert sorted(expected, key=itemgetter('doc_id', 'text')) == sorted(result, key=itemgetter('doc_id', 'text'))
+    graph.reset()
+    assert [] == graph.run(texts=lambda: iter([]))